@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+"""
+Cropping benchmark: the speed and accuracy of finite difference solutions
+on a grid cropped to the loads (CropWavelengths; see Flexure.fd_crop), for
+a small load on a large, otherwise empty F1D or F2D grid. Each cropped
+solution is compared with the solution on the full grid: the largest
+difference, relative to the largest deflection, is reported next to the
+estimated error at the cut and the fraction of the grid that was solved.
+
+Usage:
+  python benchmarks/cropping.py [--size N] [--crop c1,c2,...] [--far-field zero|kernel]
+                                [--json <output.json>]
+
+--size is the number of cells on each side of the 2D grid (default 600);
+the 1D grid has 20 times as many.
+"""
+
+import sys, os, json, time
+import numpy as np
+
+# gFlex from this source tree, rather than any installed copy
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+import gflex
+
+def solve(dimension, n, CropWavelengths, CropFarField):
+  """
+  Solves for a block of loads near one corner of the grid; returns the
+  deflections, the time taken by run(), and the run report
+  """
+  if dimension == 1:
+    flex = gflex.F1D()
+    flex.qs = np.zeros(20*n)
+    flex.qs[n:n+n//10] = 1E7
+    flex.BC_W = flex.BC_E = '0Slope0Shear'
+  else:
+    flex = gflex.F2D()
+    flex.PlateSolutionType = 'vWC1994'
+    flex.qs = np.zeros((n, n))
+    flex.qs[n//6:n//6+n//20, n//3:n//3+n//15] = 1E7
+    flex.BC_W = flex.BC_E = flex.BC_N = flex.BC_S = '0Slope0Shear'
+  flex.Quiet = True
+  flex.Method = 'FD'
+  flex.Solver = 'direct'
+  flex.g = 9.8; flex.E = 65E9; flex.nu = 0.25; flex.rho_m = 3300.; flex.rho_fill = 0.
+  flex.Te = 20000.
+  flex.dx = flex.dy = 5000.
+  flex.CropWavelengths = CropWavelengths
+  flex.CropFarField = CropFarField
+  flex.initialize()
+  start = time.time()
+  flex.run()
+  elapsed = time.time() - start
+  flex.finalize()
+  return flex.w, elapsed, flex.report
+
+def main(argv):
+  n = 600
+  crops = [0.5, 1., 2., 3.]
+  far_field = 'zero'
+  out = None
+  args = list(argv)
+  while args:
+    arg = args.pop(0)
+    if arg == '--size':
+      n = int(args.pop(0))
+    elif arg == '--crop':
+      crops = [float(c) for c in args.pop(0).split(',')]
+    elif arg == '--far-field':
+      far_field = args.pop(0)
+    elif arg == '--json':
+      out = args.pop(0)
+    else:
+      sys.exit(__doc__)
+  results = []
+  print "%-4s  %10s  %10s  %10s  %10s  %10s  %10s" % ('case', 'crop', 'cells [%]', 'time [s]',
+                                                      'speedup', 'error', 'estimate')
+  for dimension in [1, 2]:
+    name = 'F%dD' % dimension
+    w_full, t_full, report = solve(dimension, n, None, far_field)
+    results.append({'case': name, 'CropWavelengths': None, 'cells': w_full.size,
+                    'time': t_full, 'error': 0., 'error_estimate': None})
+    print "%-4s  %10s  %10.1f  %10.3f  %10s  %10s  %10s" % (name, '-', 100., t_full, '-', '-', '-')
+    for crop in crops:
+      w, t, report = solve(dimension, n, crop, far_field)
+      if report['crop_shape'] is None:
+        cells = w.size # Nothing to crop away: the loads reach the edges
+      else:
+        cells = int(np.prod(report['crop_shape']))
+      error = float(np.max(np.abs(w - w_full)) / np.max(np.abs(w_full)))
+      results.append({'case': name, 'CropWavelengths': crop, 'cells': cells, 'time': t,
+                      'error': error, 'error_estimate': report['crop_error_estimate']})
+      print "%-4s  %10g  %10.1f  %10.3f  %10.1f  %10.2e  %10.2e" % (name, crop, 100.*cells/w.size,
+            t, t_full/t, error, report['crop_error_estimate'] or 0.)
+  if out:
+    with open(out, 'w') as f:
+      json.dump({'benchmark': 'cropping', 'python': sys.version.split()[0], 'size': n,
+                 'CropFarField': far_field, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
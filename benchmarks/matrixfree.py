@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+"""
+Matrix-free benchmark: the speed and accuracy of iterative F2D solutions
+with MatrixFree (see F2D.build_stencil_operator), for each boundary
+condition and preconditioner that can be used without the matrix, on the
+synthetic loads and weak-zone elastic thicknesses of synthetic.py. Each
+solution is compared with the direct solution with the sparse matrix: the
+largest difference, relative to the largest deflection, is reported, or
+"failed" if the iterative solver did not converge.
+
+Usage:
+  python benchmarks/matrixfree.py [--size N] [--preconditioners p1,p2,...]
+                                  [--tolerance T] [--json <output.json>]
+
+--size is the number of cells on each side of the grid (default 300).
+"""
+
+import sys, os, json, time
+import numpy as np
+
+# gFlex from this source tree, rather than any installed copy
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+import gflex
+import synthetic
+
+BCs = ['0Displacement0Slope', '0Moment0Shear', '0Slope0Shear', 'Mirror', 'Periodic']
+
+def solve(n, BC, Solver, Preconditioner=None, tolerance=1E-3):
+  """
+  Returns the deflections and the time taken by run(), or None and the time
+  taken if the iterative solver did not converge
+  """
+  flex = gflex.F2D()
+  flex.Quiet = True
+  flex.Method = 'FD'
+  flex.PlateSolutionType = 'vWC1994'
+  flex.Solver = Solver
+  if Solver == 'iterative':
+    flex.MatrixFree = True
+    flex.Preconditioner = Preconditioner
+    flex.ConvergenceTolerance = tolerance
+  flex.g = 9.8; flex.E = 65E9; flex.nu = 0.25; flex.rho_m = 3300.; flex.rho_fill = 0.
+  flex.qs = synthetic.loads((n, n))
+  flex.Te = synthetic.elastic_thickness((n, n))
+  flex.dx = flex.dy = 5000.
+  flex.BC_W = flex.BC_E = flex.BC_N = flex.BC_S = BC
+  flex.initialize()
+  start = time.time()
+  try:
+    flex.run()
+  except SystemExit:
+    return None, time.time() - start
+  elapsed = time.time() - start
+  flex.finalize()
+  return flex.w, elapsed
+
+def main(argv):
+  n = 300
+  preconditioners = ['spectral', 'jacobi']
+  tolerance = 1E-3
+  out = None
+  args = list(argv)
+  while args:
+    arg = args.pop(0)
+    if arg == '--size':
+      n = int(args.pop(0))
+    elif arg == '--preconditioners':
+      preconditioners = args.pop(0).split(',')
+    elif arg == '--tolerance':
+      tolerance = float(args.pop(0))
+    elif arg == '--json':
+      out = args.pop(0)
+    else:
+      sys.exit(__doc__)
+  results = []
+  print "%-20s  %-10s  %10s  %10s" % ('boundary condition', 'solver', 'time [s]', 'error')
+  for BC in BCs:
+    w_direct, t_direct = solve(n, BC, 'direct')
+    results.append({'BC': BC, 'Preconditioner': None, 'time': t_direct, 'error': 0.})
+    print "%-20s  %-10s  %10.3f  %10s" % (BC, 'direct', t_direct, '-')
+    for Preconditioner in preconditioners:
+      w, t = solve(n, BC, 'iterative', Preconditioner, tolerance)
+      if w is None:
+        error = None
+      else:
+        error = float(np.max(np.abs(w - w_direct)) / np.max(np.abs(w_direct)))
+      results.append({'BC': BC, 'Preconditioner': Preconditioner, 'time': t, 'error': error})
+      print "%-20s  %-10s  %10.3f  %10s" % (BC, Preconditioner, t,
+            'failed' if error is None else '%.2e' % error)
+  if out:
+    with open(out, 'w') as f:
+      json.dump({'benchmark': 'matrixfree', 'python': sys.version.split()[0], 'size': n,
+                 'ConvergenceTolerance': tolerance, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
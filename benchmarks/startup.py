@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+"""
+Startup-time benchmark: how long "import gflex" and minimal F1D and F2D
+runs take in a fresh Python process, and which heavy packages each one
+loads. Each case is run in its own interpreter, several times; the best
+and median times are reported.
+
+Usage:
+  python benchmarks/startup.py [--repeat N] [--json <output.json>]
+"""
+
+import sys, os, subprocess, json, time
+import numpy as np
+
+# gFlex from this source tree, rather than any installed copy
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Packages whose import is reported (and should not happen needlessly)
+heavy = ['scipy', 'matplotlib']
+
+cases = [
+  ('import', ''),
+  ('F1D FD', '''
+flex = gflex.F1D()
+flex.Quiet = True
+flex.Method = 'FD'
+flex.Solver = 'direct'
+flex.g = 9.8; flex.E = 65E9; flex.nu = 0.25; flex.rho_m = 3300.; flex.rho_fill = 0.
+flex.Te = 30000.
+flex.qs = np.zeros(200); flex.qs[80:120] = 1E6
+flex.dx = 5000.
+flex.BC_W = '0Displacement0Slope'; flex.BC_E = '0Moment0Shear'
+flex.initialize(); flex.run(); flex.finalize()
+'''),
+  ('F2D FD', '''
+flex = gflex.F2D()
+flex.Quiet = True
+flex.Method = 'FD'
+flex.PlateSolutionType = 'vWC1994'
+flex.Solver = 'direct'
+flex.g = 9.8; flex.E = 65E9; flex.nu = 0.25; flex.rho_m = 3300.; flex.rho_fill = 0.
+flex.Te = 30000.
+flex.qs = np.zeros((50, 50)); flex.qs[20:30, 20:30] = 1E6
+flex.dx = 5000.; flex.dy = 5000.
+flex.BC_W = flex.BC_E = flex.BC_N = flex.BC_S = '0Displacement0Slope'
+flex.initialize(); flex.run(); flex.finalize()
+'''),
+]
+
+child = '''
+import time
+start = time.time()
+import sys
+sys.path.insert(0, %r)
+import numpy as np
+import gflex
+imported = time.time()
+%s
+finished = time.time()
+import json
+print json.dumps({'import': imported - start, 'total': finished - start,
+                  'modules': sorted(set(m.split('.')[0] for m in sys.modules
+                                        if m.split('.')[0] in %r))})
+'''
+
+def run_case(code):
+  """
+  Runs one case in a fresh interpreter; returns its timings and the heavy
+  packages that were imported
+  """
+  env = dict(os.environ)
+  env.pop('MPLBACKEND', None) # As on a headless compute node
+  out = subprocess.check_output([sys.executable, '-c', child % (root, code, heavy)], env=env)
+  return json.loads(out.strip().splitlines()[-1])
+
+def main(argv):
+  repeat = 5
+  out = None
+  args = list(argv)
+  while args:
+    arg = args.pop(0)
+    if arg == '--repeat':
+      repeat = int(args.pop(0))
+    elif arg == '--json':
+      out = args.pop(0)
+    else:
+      sys.exit(__doc__)
+  results = []
+  print "%-8s  %12s  %12s  %12s  %s" % ('case', 'import [s]', 'best [s]', 'median [s]', 'heavy imports')
+  for name, code in cases:
+    runs = [run_case(code) for i in range(repeat)]
+    totals = [run['total'] for run in runs]
+    result = {'case': name, 'repeat': repeat,
+              'import_best': min(run['import'] for run in runs),
+              'best': min(totals), 'median': float(np.median(totals)),
+              'modules': runs[0]['modules']}
+    results.append(result)
+    print "%-8s  %12.3f  %12.3f  %12.3f  %s" % (name, result['import_best'], result['best'],
+          result['median'], ', '.join(result['modules']) or '-')
+  if out:
+    with open(out, 'w') as f:
+      json.dump({'benchmark': 'startup', 'python': sys.version.split()[0],
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
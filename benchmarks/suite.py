@@ -0,0 +1,252 @@
+#! /usr/bin/env python
+"""
+Benchmark suite: times F1D and F2D with every solution method (FD with
+each solver, FFT, SAS and SAS_NG), boundary condition, and (for 2D FD) plate
+solution type, on synthetic loads and elastic thicknesses (see synthetic.py)
+of increasing size. FD runs use a variable Te with weak zones; the others,
+which require it, a constant Te.
+
+Each case runs in its own interpreter, so that its peak resident set size
+is its own. For each case, the wall time of initialize() + run(), the time
+to build the coefficient matrix, the time to solve (the run report's solve
+and factorization phases, which leave out building the matrix), the number
+of nonzeros in the coefficient matrix, and the peak RSS (and that before the
+run) are reported; the JSON output also holds the run report's record of
+each phase.
+
+Modes:
+  --quick  (default) two small sizes of each case; a minute or two
+  --full   scaling from ~10^4 to ~7x10^7 cells (2D) or 10^7 cells (1D);
+           SAS_NG, whose cost goes as (number of points)^2, stops at 16000.
+           Cases that fail (e.g., run out of memory) or time out are
+           recorded as such, and larger sizes of that case are skipped.
+
+Usage:
+  python benchmarks/suite.py [--quick | --full] [--json <output.json>]
+         [--only <text> ...] [--max-cells N] [--timeout <s>]
+
+--only runs only the cases whose names contain one of the given pieces of
+text, e.g., --only "F2D FD/iterative" --only SAS_NG
+"""
+
+import sys, os, subprocess, json, time, tempfile, platform
+import numpy as np
+
+# gFlex from this source tree, rather than any installed copy
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+
+FD_BCs = ['0Displacement0Slope', '0Moment0Shear', '0Slope0Shear', 'Mirror', 'Periodic']
+FFT_BCs = ['NoOutsideLoads', 'Mirror', 'Periodic']
+solvers = {1: ['direct', 'iterative', 'banded'], 2: ['direct', 'iterative']}
+stencils = ['vWC1994', 'G2009']
+
+# Numbers of cells (or, for SAS_NG, of points) for each mode
+sizes = {
+  'quick': {1: [2000, 20000], 2: [50**2, 100**2], 'SAS_NG': [500, 2000]},
+  'full': {1: [10**3, 10**4, 10**5, 10**6, 10**7],
+           2: [n**2 for n in [128, 256, 512, 1024, 2048, 4096, 8192]],
+           'SAS_NG': [1000, 4000, 16000]},
+}
+
+dx = 5000. # [m]
+
+def case_name(case):
+  name = 'F%dD %s' % (case['dimension'], case['method'])
+  if case['method'] == 'FD':
+    name += '/' + case['solver']
+    if case['dimension'] == 2:
+      name += '/' + case['stencil']
+  if case['BC']:
+    name += '/' + case['BC']
+  return name
+
+def cases(mode):
+  """
+  Every case, smallest sizes first
+  """
+  out = []
+  for dimension in 1, 2:
+    for solver in solvers[dimension]:
+      for stencil in (stencils if dimension == 2 else [None]):
+        for BC in FD_BCs:
+          out.append({'dimension': dimension, 'method': 'FD', 'solver': solver,
+                      'stencil': stencil, 'BC': BC})
+    for BC in FFT_BCs:
+      out.append({'dimension': dimension, 'method': 'FFT', 'BC': BC})
+    out.append({'dimension': dimension, 'method': 'SAS', 'BC': None})
+    out.append({'dimension': dimension, 'method': 'SAS_NG', 'BC': None})
+  for case in out:
+    case['name'] = case_name(case)
+    case['sizes'] = sizes[mode]['SAS_NG' if case['method'] == 'SAS_NG' else case['dimension']]
+  return out
+
+def peak_rss():
+  """
+  Peak resident set size of this process so far [MB]
+  """
+  import resource
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == 'darwin':
+    rss /= 1024. # bytes there; kB elsewhere
+  return rss / 1024.
+
+def run_case(case, ncells):
+  """
+  Runs one case (in this process) and returns its results
+  """
+  import gflex
+  import synthetic
+  dimension = case['dimension']
+  if dimension == 1:
+    flex = gflex.F1D()
+  else:
+    flex = gflex.F2D()
+  flex.Quiet = True
+  flex.Method = case['method']
+  flex.g = 9.8; flex.E = 65E9; flex.nu = 0.25; flex.rho_m = 3300.; flex.rho_fill = 0.
+  flex.dx = dx
+  if dimension == 2:
+    flex.dy = dx
+  if case['method'] == 'SAS_NG':
+    flex.q0 = synthetic.point_loads(ncells, dimension, dx)
+    shape = (ncells,)
+  else:
+    shape = synthetic.grid_shape(ncells, dimension)
+    flex.qs = synthetic.loads(shape)
+  if case['method'] == 'FD':
+    flex.Te = synthetic.elastic_thickness(shape)
+    flex.Solver = case['solver']
+    if dimension == 2:
+      flex.PlateSolutionType = case['stencil']
+  else:
+    flex.Te = synthetic.TeScalar
+  if case['BC']:
+    flex.BC_W = flex.BC_E = case['BC']
+    if dimension == 2:
+      flex.BC_N = flex.BC_S = case['BC']
+  rss_before = peak_rss()
+  start = time.time()
+  flex.initialize()
+  flex.run()
+  wall = time.time() - start
+  try:
+    nnz = int(flex.coeff_matrix.nnz)
+  except AttributeError:
+    nnz = None # No matrix: not FD, or the banded solver
+  phases = flex.report['phases']
+  # time_to_solve also counts building the operator; the solve and 
+  # factorization phases do not
+  solve_time = sum(phases[name]['time'] for name in ('solve', 'factorization') if name in phases)
+  result = {'wall': wall, 'nnz': nnz,
+            'coeff_creation_time': getattr(flex, 'coeff_creation_time', None),
+            'time_to_solve': getattr(flex, 'time_to_solve', None),
+            'solve_time': solve_time,
+            'iterations': getattr(flex, 'iterative_iterations', None),
+            'peak_rss_before': rss_before, 'phases': phases}
+  flex.finalize()
+  result['peak_rss'] = peak_rss()
+  return result
+
+def run_isolated(case, ncells, timeout):
+  """
+  Runs one case in a fresh interpreter, killing it after timeout [s];
+  returns its results, with 'status' ok, failed, or timeout
+  """
+  out = tempfile.TemporaryFile()
+  err = tempfile.TemporaryFile()
+  spec = json.dumps({'case': case, 'ncells': ncells})
+  proc = subprocess.Popen([sys.executable, os.path.realpath(__file__), '--case', spec],
+                          stdout=out, stderr=err)
+  start = time.time()
+  while proc.poll() is None:
+    if timeout and time.time() - start > timeout:
+      proc.kill()
+      proc.wait()
+      return {'status': 'timeout'}
+    time.sleep(0.05)
+  out.seek(0)
+  err.seek(0)
+  if proc.returncode != 0:
+    lines = err.read().strip().splitlines() or ['exit code %d' % proc.returncode]
+    return {'status': 'failed', 'error': lines[-1]}
+  result = json.loads(out.read().strip().splitlines()[-1])
+  result['status'] = 'ok'
+  return result
+
+def git_revision():
+  try:
+    with open(os.devnull, 'w') as devnull:
+      return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root,
+                                     stderr=devnull).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def fmt(value, spec):
+  if value is None:
+    return '-'
+  return spec % value
+
+def main(argv):
+  mode = 'quick'
+  out = None
+  only = []
+  max_cells = None
+  timeout = 3600.
+  args = list(argv)
+  while args:
+    arg = args.pop(0)
+    if arg == '--case':
+      # Internal: run a single case and print its results
+      spec = json.loads(args.pop(0))
+      # gFlex compares its options against str, not unicode
+      case = dict((str(key), str(value) if isinstance(value, unicode) else value)
+                  for key, value in spec['case'].items())
+      print json.dumps(run_case(case, spec['ncells']))
+      return
+    elif arg in ('--quick', '--full'):
+      mode = arg[2:]
+    elif arg == '--json':
+      out = args.pop(0)
+    elif arg == '--only':
+      only.append(args.pop(0))
+    elif arg == '--max-cells':
+      max_cells = int(float(args.pop(0)))
+    elif arg == '--timeout':
+      timeout = float(args.pop(0))
+    else:
+      sys.exit(__doc__)
+  results = []
+  print "%-42s  %9s  %9s  %9s  %9s  %10s  %9s" % ('case', 'cells', 'wall [s]', 'build [s]',
+        'solve [s]', 'nnz', 'RSS [MB]')
+  for case in cases(mode):
+    if only and not any(text in case['name'] for text in only):
+      continue
+    for ncells in case['sizes']:
+      if max_cells and ncells > max_cells:
+        break
+      result = run_isolated(case, ncells, timeout)
+      result.update({'case': case['name'], 'ncells': ncells,
+                     'dimension': case['dimension'], 'method': case['method'],
+                     'solver': case.get('solver'), 'PlateSolutionType': case.get('stencil'),
+                     'BC': case['BC']})
+      results.append(result)
+      if result['status'] == 'ok':
+        print "%-42s  %9d  %9.3f  %9s  %9s  %10s  %9.1f" % (case['name'], ncells, result['wall'],
+              fmt(result['coeff_creation_time'], '%.3f'), fmt(result['solve_time'], '%.3f'),
+              fmt(result['nnz'], '%d'), result['peak_rss'])
+      else:
+        print "%-42s  %9d  %s: %s" % (case['name'], ncells, result['status'],
+                                      result.get('error', ''))
+        break # Larger grids will not do any better
+      sys.stdout.flush()
+  if out:
+    import scipy
+    with open(out, 'w') as f:
+      json.dump({'benchmark': 'suite', 'mode': mode, 'revision': git_revision(),
+                 'python': sys.version.split()[0], 'numpy': np.__version__,
+                 'scipy': scipy.__version__, 'platform': platform.platform(),
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
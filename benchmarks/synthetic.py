@@ -0,0 +1,63 @@
+"""
+Synthetic loads and elastic thickness grids for the benchmarks, of any
+size. The loads are rectangular blocks, as in input/grid2D.py; the elastic
+thicknesses are a constant plate cut by Gaussian weak zones, as in
+input/Te_sample/makebreaks.py.
+"""
+
+import numpy as np
+
+TeScalar = 30000. # [m]
+q = 1E6 # Load stress [Pa]
+
+def grid_shape(ncells, dimension):
+  """
+  Shape of a 1D grid, or a square 2D grid, of (about) ncells cells
+  """
+  if dimension == 1:
+    return (int(ncells),)
+  n = int(round(np.sqrt(ncells)))
+  return (n, n)
+
+def loads(shape):
+  """
+  Load stresses: a block in the middle of the grid covering a tenth of each
+  dimension, and a smaller, heavier one off to the side (and up against the
+  edge of the grid, so that the boundary conditions matter)
+  """
+  qs = np.zeros(shape)
+  center = tuple(slice(int(0.45*n), max(int(0.55*n), int(0.45*n)+1)) for n in shape)
+  edge = tuple(slice(0, max(int(0.05*n), 1)) for n in shape)
+  qs[center] += q
+  qs[edge] += 2*q
+  return qs
+
+def elastic_thickness(shape, breaks=3, proportion=0.8, width=8.):
+  """
+  TeScalar minus Gaussian weak zones (a fraction "proportion" of TeScalar
+  deep, and "width" cells wide) evenly spaced along each dimension; in 2D
+  they run along both rows and columns, with the deeper one taken where they
+  cross
+  """
+  g = np.zeros(shape)
+  for axis, n in enumerate(shape):
+    x = np.arange(n)
+    g1d = np.zeros(n)
+    for b in np.linspace(0, n, breaks+2)[1:-1]:
+      g1d = np.maximum(g1d, np.exp(-(x-b)**2/(2*width**2)))
+    index = [np.newaxis] * len(shape)
+    index[axis] = slice(None)
+    g = np.maximum(g, g1d[tuple(index)])
+  return TeScalar * (1 - proportion*g)
+
+def point_loads(npoints, dimension, dx, seed=0):
+  """
+  Ungridded (SAS_NG) loads: (x, q) or (x, y, q) columns of npoints loads
+  [N] at random positions over the area of a grid of npoints cells of size
+  dx, so that they are as dense as the gridded loads
+  """
+  rand = np.random.RandomState(seed)
+  extent = np.array(grid_shape(npoints, dimension)) * dx
+  xy = rand.uniform(0, 1, (npoints, dimension)) * extent
+  forces = rand.uniform(0, 2*q, npoints) * dx**dimension
+  return np.column_stack((xy, forces))
@@ -1,10 +1,56 @@
 import sys, ConfigParser, os
 import numpy as np
 import time # For efficiency counting
+import hashlib # For operator cache keys
+import inspect # For iterative solver options
+import tempfile # For binary copies of ASCII inputs
 import types # For flow control
-from matplotlib import pyplot as plt
+import contextlib # For timed phases of a run
+import json # For run reports
+import logging # For messages
+from collections import OrderedDict
 from _version import __version__
 
+# Messages go to the "gflex" logger, at the levels:
+#   DEBUG    details for troubleshooting (Debug = True)
+#   VERBOSE  progress through each step of a run (Verbose = True)
+#   INFO     the start of each run, timings, and choices made for the user
+#   WARNING  problems that the run continues past
+#   ERROR    the reason for stopping, before exiting
+# Timing messages carry "timer" (its name) and "seconds" (its value) as 
+# attributes of the log record. Whole arrays (with Debug) go only to the 
+# "gflex.arrays" logger, which does not pass them on to "gflex": add a 
+# handler to it to see them.
+VERBOSE = 15
+logging.addLevelName(VERBOSE, 'VERBOSE')
+logger = logging.getLogger('gflex')
+logger.addHandler(logging.NullHandler())
+array_logger = logging.getLogger('gflex.arrays')
+array_logger.propagate = False
+array_logger.addHandler(logging.NullHandler())
+
+# Prints messages to stdout, as gFlex did before it used logging; see 
+# Flexure.setLogLevel
+console_handler = logging.StreamHandler(sys.stdout)
+console_handler.setFormatter(logging.Formatter('%(message)s'))
+
+try:
+  import resource # For peak memory use; not on Windows
+except ImportError:
+  resource = None
+
+def peak_rss():
+  """
+  Peak resident set size (memory use) of this process so far [MB], or None 
+  if it cannot be found
+  """
+  if resource is None:
+    return None
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == 'darwin':
+    rss /= 1024. # bytes there; kB elsewhere
+  return rss / 1024.
+
 class Utility(object):
 
   """
@@ -37,35 +83,43 @@ class Utility(object):
         if var == ""  and optional == False:
           # but "" is acceptable for boundary conditions
           if name[:17] != 'BoundaryCondition':
-            if self.Quiet != True:
-              print "An empty input string here is not an acceptable option."
-              print name, "is not optional."
-              print "Program crash likely to occur."
+            logger.warning("An empty input string here is not an acceptable option.\n"
+                           "%s is not optional.\n"
+                           "Program crash likely to occur.", name)
       elif vartype == 'integer' or vartype == 'int':
         var = self.config.getint(category, name)
       elif vartype == 'boolean' or vartype == 'bool':
         var = self.config.getboolean(category, name)
       else:
-        print "Please enter 'float', 'string' (or 'str'), 'integer' (or 'int'), or 'boolean (or 'bool') for vartype"
+        logger.error("Please enter 'float', 'string' (or 'str'), 'integer' (or 'int'), or 'boolean (or 'bool') for vartype")
         sys.exit() # Won't exit, but will lead to exception
       return var
     except:
       if optional:
         # Carry on if the variable is optional
         var = None
-        if self.Verbose or self.Debug:
-          if self.grass == False:
-            print ""
-            print 'No value entered for optional parameter "' + name + '"'
-            print 'in category "' + category + '" in configuration file.'
-            print 'No action related to this optional parameter will be taken.'
-            print ""
+        if self.grass == False:
+          logger.log(VERBOSE, '\nNo value entered for optional parameter "%s"\n'
+                              'in category "%s" in configuration file.\n'
+                              'No action related to this optional parameter will be taken.\n',
+                     name, category)
       else:
-        print 'Problem loading ' + vartype + ' "' + name + '" in category "' + category + '" from configuration file.'
+        logger.error('Problem loading %s "%s" in category "%s" from configuration file.',
+                     vartype, name, category)
         if specialReturnMessage:
-          print specialReturnMessage
+          logger.error(specialReturnMessage)
         sys.exit("Exiting.")
 
+  def configGetIfSet(self, vartype, category, name):
+    """
+    configGet for an opt-in setting that most configuration files leave 
+    out: returns None, without the optional-parameter message, if the 
+    configuration file does not have it.
+    """
+    if self.config.has_option(category, name):
+      return self.configGet(vartype, category, name, optional=True)
+    return None
+
   def readyCoeff(self):
     from scipy import sparse
     if sparse.issparse(self.coeff_matrix):
@@ -76,6 +130,117 @@ class Utility(object):
       except:
         sys.exit("Failed to make a sparse array or load a sparse matrix from the input.")
 
+  def superpose_kernel(self, q, kernel):
+    """
+    Superposition of a kernel (Green's function) centered on every cell of 
+    a gridded load array, as a zero-padded FFT convolution.
+    
+    q: loads, shape (n0, [n1, ...])
+    kernel: response to a unit load at its center; shape (2*n0+1, 
+            [2*n1+1, ...]), with the load at index (n0, [n1, ...])
+    
+    Returns an array of the shape of q:
+      out[i] = sum_j q[j] * kernel[n + i - j]
+    which is the same sum as adding a kernel slice for each loaded cell, 
+    but O(N log N) rather than O(N^2).
+    Only the central part of the linear convolution is needed, so each axis 
+    is padded only to the kernel length (2n+1, rounded up to a fast FFT 
+    size): wrap-around cannot reach the output cells.
+    
+    If only a few cells are loaded (e.g., the change in the loads for an 
+    incremental update), so that adding their kernel slices costs less than 
+    the FFTs, that is done instead.
+    """
+    from scipy.fftpack import next_fast_len
+    n = q.shape
+    shape = [next_fast_len(2*ni+1) for ni in n]
+    size = np.prod(shape)
+    loaded = np.flatnonzero(q)
+    if len(loaded) * q.size < size * np.log2(size):
+      out = np.zeros(n)
+      for j in zip(*np.unravel_index(loaded, n)):
+        out += q[j] * kernel[tuple([slice(ni-ji, 2*ni-ji) for ni, ji in zip(n, j)])]
+      return out
+    out = np.fft.irfftn(np.fft.rfftn(q, shape) * np.fft.rfftn(kernel, shape), shape)
+    return out[tuple([slice(ni, 2*ni) for ni in n])]
+
+  def superpose_points(self, kernel, n_out, q, ntemp=4):
+    """
+    Blocked superposition of point-load solutions (SAS_NG):
+    
+      w[i] = sum_j kernel(i, j) * q[j]
+    
+    kernel(out_slice, load_slice) must return the (unit-load) response 
+    matrix for a tile of output points (rows) and load points (columns), 
+    evaluated as whole arrays. Each tile is reduced with a matrix-vector 
+    product, so there is no Python-level loop over individual loads.
+    
+    The tile size is bounded by MaxTileMemory [MB], assuming that the 
+    kernel holds about "ntemp" tile-sized float64 temporaries at once.
+    """
+    n_in = len(q)
+    w = np.zeros(n_out)
+    if n_in == 0:
+      return w
+    tile_elements = max(int(self.MaxTileMemory * 2**20 / (8. * ntemp)), 1)
+    n_in_tile = min(n_in, tile_elements)
+    n_out_tile = max(tile_elements // n_in_tile, 1)
+    for i in range(0, n_out, n_out_tile):
+      out_slice = slice(i, min(i + n_out_tile, n_out))
+      for j in range(0, n_in, n_in_tile):
+        load_slice = slice(j, min(j + n_in_tile, n_in))
+        w[out_slice] += np.dot(kernel(out_slice, load_slice), q[load_slice])
+    return w
+
+  def superpose_neighbors(self, kernel, out_xyz, load_xyz, q, radius):
+    """
+    Truncated superposition of point-load solutions (SAS_NG with a cutoff 
+    radius): only loads within "radius" of each output point are summed.
+    
+      w[i] = sum_{j: |x_i - x_j| <= radius} kernel(i, j, d_ij) * q[j]
+    
+    out_xyz and load_xyz are (n, ndim) coordinate arrays; a KD-tree 
+    (scipy.spatial.cKDTree) over the loads finds the neighbours of blocks of 
+    output points. kernel(i, j, d) must return the unit-load response for 
+    arrays of output indices i, load indices j and their KD-tree distances d.
+    
+    Output points are processed in blocks whose size adapts to the number 
+    of neighbours found, so that each block holds about as many pairs as a 
+    MaxTileMemory-sized tile in superpose_points.
+    """
+    from scipy.spatial import cKDTree
+    n_out = out_xyz.shape[0]
+    w = np.zeros(n_out)
+    if len(q) == 0:
+      return w
+    load_tree = cKDTree(load_xyz)
+    # Pair records (i, j, d) are 24 bytes, plus the kernel temporaries
+    tile_elements = max(int(self.MaxTileMemory * 2**20 / (8. * 8)), 1)
+    # First guess assumes that every load is a neighbour
+    n_out_tile = max(tile_elements // len(q), 1)
+    i = 0
+    while i < n_out:
+      out_slice = slice(i, min(i + n_out_tile, n_out))
+      n = out_slice.stop - out_slice.start
+      pairs = cKDTree(out_xyz[out_slice]).sparse_distance_matrix(load_tree, radius, output_type='ndarray')
+      if len(pairs):
+        wij = kernel(pairs['i'] + i, pairs['j'], pairs['v']) * q[pairs['j']]
+        w[out_slice] += np.bincount(pairs['i'], weights=wij, minlength=n)
+      # Size the next block from the number of neighbours per point here
+      n_out_tile = max(int(tile_elements / max(len(pairs) / float(n), 1.)), 1)
+      i = out_slice.stop
+    return w
+
+  def kernel_tail_bound(self, kernel, x_cut):
+    """
+    Returns max |kernel(x)| for x >= x_cut, where x is distance divided by 
+    the flexural parameter. Both the 1D (exp-cos) and 2D (kei) kernels have 
+    envelopes that decrease monotonically, so the maximum lies within one 
+    oscillation of x_cut; searching 20 flexural parameters is plenty.
+    """
+    x = np.arange(x_cut, x_cut + 20., 1E-3)
+    return np.max(np.abs(kernel(x)))
+
   def greatCircleDistance(self, lat1, long1, lat2, long2, radius):
     """
     Returns the great circle distance between two points.
@@ -132,13 +297,11 @@ class Utility(object):
       # Warn that any existing grid will be overwritten
       try:
         self.dx
-        if self.Quiet == False:
-          print "dx and dy being overwritten -- supply a full grid"
+        logger.warning("dx and dy being overwritten -- supply a full grid")
       except:
         try:
           self.dy
-          if self.Quiet == False:
-            print "dx and dy being overwritten -- supply a full grid"
+          logger.warning("dx and dy being overwritten -- supply a full grid")
         except:
           pass
       # Boundaries
@@ -157,50 +320,127 @@ class Utility(object):
       self.xw = np.linspace(w, e, nx)
       self.yw = np.linspace(s, n, ny)
     else:
-      print "Lat/lon xw and yw must be pre-set: grid will not be square"
-      print "and may run into issues with poles, so to ensure the proper"
-      print "output points are chosen, the end user should do this."
+      logger.error("Lat/lon xw and yw must be pre-set: grid will not be square\n"
+                   "and may run into issues with poles, so to ensure the proper\n"
+                   "output points are chosen, the end user should do this.")
       sys.exit()
     
         
+  def resolveInputPath(self, var):
+    """
+    Returns the path to an input file, which is either as given (absolute or 
+    relative to the current working directory) or relative to the location 
+    of the configuration file, in that order of preference; None if there 
+    is no such file.
+    """
+    if os.path.isfile(var):
+      return var
+    try:
+      if os.path.isfile(self.inpath + var):
+        return self.inpath + var
+    except:
+      pass # No configuration file path
+    return None
+
   def loadFile(self, var, close_on_fail = True):
     """
     A special function to replate a variable name that is a string file path
     with the loaded file.
     var is a string on input
     output is a numpy array or a None-type object (success vs. failure)
+    
+    Numpy binary (.npy) files are memory-mapped, copy-on-write: they are read 
+    from disk only as needed, and are never changed on disk. ASCII files are 
+    read by loadASCII.
     """
-    out = None
+    # Arrays that have already been loaded (e.g., shared by the sweep runner)
     try:
-      # First see if it is a full path or directly links from the current
-      # working directory
-      out = np.load(var)
-      if self.Verbose: print "Loading "+var+" from numpy binary"
+      return self.preloaded_files[var]
     except:
-      try:
-        out = np.loadtxt(var)
-        if self.Verbose: print "Loading "+var+" ASCII"
-      except:
-        # Then see if it is relative to the location of the configuration file
+      pass
+    with self.phase('loadFile'):
+      out = None
+      path = self.resolveInputPath(var)
+      if path:
         try:
-          out = load(self.inpath + var)
-          if self.Verbose: print "Loading "+var+" from numpy binary"
+          with open(path, 'rb') as f:
+            magic = f.read(len(np.lib.format.MAGIC_PREFIX))
+          if magic == np.lib.format.MAGIC_PREFIX:
+            # Plain ndarray view of the map
+            out = np.asarray(np.load(path, mmap_mode='c'))
+            logger.log(VERBOSE, "Loading %s from numpy binary", var)
+          elif magic[:2] == 'PK':
+            out = np.load(path) # .npz archive
+            logger.log(VERBOSE, "Loading %s from numpy binary", var)
+          else:
+            out = self.loadASCII(path)
+            logger.log(VERBOSE, "Loading %s ASCII", var)
         except:
-          try:
-            out = np.loadtxt(self.inpath + var)
-            if self.Verbose: print "Loading "+var+" ASCII"
-          # If failure
-          except:
-            if close_on_fail:
-              print "Cannot find "+var+" file"
-              print ""+var+" path = " + var
-              print "Looked relative to model python files."
-              print "Also looked relative to configuration file path,"
-              print "  ", self.inpath
-              print "Exiting."
-              sys.exit()
-            else:
-              pass
+          out = None
+          if close_on_fail:
+            logger.error("Cannot read %s file\n%s path = %s\nExiting.", var, var, path)
+            sys.exit()
+      elif close_on_fail:
+        try:
+          inpath = self.inpath
+        except:
+          inpath = "(none)"
+        logger.error("Cannot find %s file\n%s path = %s\n"
+                     "Looked relative to model python files.\n"
+                     "Also looked relative to configuration file path,\n"
+                     "   %s\nExiting.", var, var, var, inpath)
+        sys.exit()
+    return out
+
+  def loadASCII(self, path):
+    """
+    Loads a whitespace-delimited ASCII array, as numpy.loadtxt does, but 
+    parsed in a single pass over the file (numpy.loadtxt is only used for 
+    files that this cannot handle, e.g., with comments or blank lines).
+    
+    With CacheASCIIInputs, the array is also saved as a hidden binary 
+    "sidecar" file next to the ASCII file (.<name>.<size>-<time>.npy), which 
+    later runs memory-map instead of parsing the ASCII file again, for as 
+    long as the ASCII file keeps the same size and modification time.
+    """
+    try:
+      use_sidecar = self.CacheASCIIInputs
+    except:
+      use_sidecar = False
+    if use_sidecar:
+      info = os.stat(path)
+      folder, name = os.path.split(path)
+      prefix = '.' + name + '.'
+      sidecar = os.path.join(folder, prefix + '%d-%.6f' % (info.st_size, info.st_mtime) + '.npy')
+      if os.path.isfile(sidecar):
+        logger.debug("Using binary copy %s", sidecar)
+        return np.asarray(np.load(sidecar, mmap_mode='c'))
+    with open(path) as f:
+      text = f.read()
+    out = None
+    if '#' not in text:
+      body = text.strip()
+      nrows = body.count('\n') + 1
+      ncols = len(body.partition('\n')[0].split())
+      values = np.fromstring(body, sep=' ')
+      if ncols and values.size == nrows * ncols:
+        # Squeezed like numpy.loadtxt output
+        out = np.squeeze(values.reshape(nrows, ncols))
+    del text
+    if out is None:
+      out = np.loadtxt(path)
+    if use_sidecar:
+      try:
+        # Remove binary copies of earlier versions of the file
+        for old in os.listdir(folder or '.'):
+          if old.startswith(prefix) and old.endswith('.npy'):
+            os.remove(os.path.join(folder, old))
+        handle, tmppath = tempfile.mkstemp(suffix='.tmp', dir=folder or '.')
+        with os.fdopen(handle, 'wb') as f:
+          np.save(f, out)
+        os.rename(tmppath, sidecar)
+      except (IOError, OSError) as e:
+        logger.log(VERBOSE, "Could not save binary copy of %s: %s", path, e)
     return out
 
 class Plotting(object):
@@ -217,7 +457,9 @@ class Plotting(object):
     #except:
     #  self.plotChoice = None
     if self.plotChoice:
-      if self.Verbose: print "Starting to plot " + self.plotChoice
+      logger.log(VERBOSE, "Starting to plot %s", self.plotChoice)
+      # Imported here so that matplotlib is only needed for plotting
+      from matplotlib import pyplot as plt
       if self.dimension == 1:
         if self.plotChoice == 'q':
           plt.figure(1)
@@ -267,9 +509,8 @@ class Plotting(object):
           ax = fig.add_subplot(1,1,1)
           # Plot undeflected load
           if self.Method == "SAS_NG":
-            if self.Quiet == False:
-              print "Combo plot can't work with SAS_NG! Don't have mechanism in place\nto calculate load width."
-              print "Big problem -- what is the area represented by the loads at the\nextreme ends of the array?"
+            logger.warning("Combo plot can't work with SAS_NG! Don't have mechanism in place\nto calculate load width.\n"
+                           "Big problem -- what is the area represented by the loads at the\nextreme ends of the array?")
           else:
             ax.plot(self.x/1000., self.qs/(self.rho_m*self.g), 'g--', linewidth=2, label="Load thickness [m mantle equivalent]")
           # Plot deflected load
@@ -311,10 +552,9 @@ class Plotting(object):
           plt.tight_layout()
           plt.show()
         else:
-          if self.Quiet == False:
-            print 'Incorrect plotChoice input, "' + self.plotChoice + '" provided.'
-            print "Possible input strings are: q, w, both, and (for 1D) combo"
-            print "Unable to produce plot."
+          logger.warning('Incorrect plotChoice input, "%s" provided.\n'
+                         'Possible input strings are: q, w, both, and (for 1D) combo\n'
+                         'Unable to produce plot.', self.plotChoice)
       elif self.dimension == 2:
         if self.plotChoice == 'q':
           fig = plt.figure(1, figsize=(8,6))
@@ -347,15 +587,15 @@ class Plotting(object):
             plt.tight_layout()
             plt.show()
         else:
-          if self.Quiet == False:
-            print 'Incorrect plotChoice input, "' + self.plotChoice + '" provided.'
-            print "Possible input strings are: q, w, both, and (for 1D) combo"
-            print "Unable to produce plot."
+          logger.warning('Incorrect plotChoice input, "%s" provided.\n'
+                         'Possible input strings are: q, w, both, and (for 1D) combo\n'
+                         'Unable to produce plot.', self.plotChoice)
 
   def surfplot(self, z, titletext):
     """
     Plot if you want to - for troubleshooting - 1 figure
     """
+    from matplotlib import pyplot as plt
     if self.latlon:
       plt.imshow(z, extent=(0, self.dx*z.shape[0], self.dy*z.shape[1], 0)) #,interpolation='nearest'
       plt.xlabel('longitude [deg E]', fontsize=12, fontweight='bold')
@@ -372,6 +612,7 @@ class Plotting(object):
     """
     Plot multiple subplot figure for 2D array
     """
+    from matplotlib import pyplot as plt
     # Could more elegantly just call surfplot twice
     # And also could include xyzinterp as an option inside surfplot.
     # Noted here in case anyone wants to take that on in the future...
@@ -406,11 +647,11 @@ class Plotting(object):
     """
     # Help from http://wiki.scipy.org/Cookbook/Matplotlib/Gridding_irregularly_spaced_data
     
-    if self.Verbose:
-      print "Starting to interpolate grid for plotting -- can be a slow process!"
+    logger.log(VERBOSE, "Starting to interpolate grid for plotting -- can be a slow process!")
     
     from scipy.interpolate import griddata
     import numpy.ma as ma
+    from matplotlib import pyplot as plt
     
     # define grid.
     xmin = np.min(self.xw)
@@ -467,6 +708,503 @@ class Plotting(object):
     plt.title(titletext, fontsize=16)
 
 
+class Instrumentation(object):
+  """
+  Timing and memory use of each phase of a model run: configuration, 
+  loadFile, BC_Rigidity, get_coeff_values, BC_Flexure, build_diagonals, 
+  factorization, solve, and output. These, with the size of the 
+  coefficient matrix and the progress of the iterative solver, make up the 
+  run report (see report), which is written to ReportOut by writeReport.
+  """
+
+  def phase_reset(self):
+    """
+    Clears the records of the last run; called at the start of initialize()
+    """
+    self.phase_records = OrderedDict()
+    self.phase_stack = []
+    self.phase_start_time = time.time()
+    self.phase_end_time = self.phase_start_time
+    self.coeff_matrix_nnz = None
+    self.iterative_iterations = None
+    self.iterative_residuals = None
+    self.infill_iterations = None
+    self.infill_residuals = None
+    self.crop_shape = None
+    self.crop_error_estimate = None
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    """
+    with self.phase(name):
+      ...
+    Times the enclosed code as phase "name", and records how much it raises 
+    the peak memory use (resident set size) of the process. Phases that run 
+    more than once (e.g., loadFile) add up. Time and memory spent in a phase 
+    within another (e.g., loadFile during configuration) count only towards 
+    the inner one.
+    
+    Each function in phase_callbacks is called as 
+    callback(flexure, name, event, record) as the phase starts 
+    (event = 'start') and ends (event = 'end'); record holds the phase's 
+    calls, time [s], peak_rss [MB], and peak_rss_increase [MB].
+    """
+    try:
+      record = self.phase_records[name]
+    except KeyError:
+      record = self.phase_records[name] = OrderedDict([('calls', 0), ('time', 0.), 
+                                            ('peak_rss', None), ('peak_rss_increase', 0.)])
+    for callback in self.phase_callbacks:
+      callback(self, name, 'start', record)
+    rss_start = peak_rss()
+    start = time.time()
+    # Time and memory taken by phases within this one
+    self.phase_stack.append([0., 0.])
+    try:
+      yield record
+    finally:
+      nested_time, nested_rss = self.phase_stack.pop()
+      self.phase_end_time = time.time()
+      elapsed = self.phase_end_time - start
+      rss_end = peak_rss()
+      if rss_end is None:
+        rss_increase = 0.
+      else:
+        rss_increase = rss_end - rss_start
+      if self.phase_stack:
+        self.phase_stack[-1][0] += elapsed
+        self.phase_stack[-1][1] += rss_increase
+      record['calls'] += 1
+      record['time'] += elapsed - nested_time
+      record['peak_rss'] = rss_end
+      record['peak_rss_increase'] += rss_increase - nested_rss
+      for callback in self.phase_callbacks:
+        callback(self, name, 'end', record)
+
+  @property
+  def report(self):
+    """
+    Report on the latest run, as an OrderedDict that can be written as JSON:
+    the solution method and grid, the record of each phase (see phase), the 
+    total time from the start of initialize() to the end of the last phase, 
+    the peak memory use [MB], the number of nonzeros in the coefficient 
+    matrix, the iterations (outer cycles, for lgmres) and relative 
+    residuals of the iterative solver (and of the infill iteration), and the shape of the cropped grid and 
+    estimated error (see fd_crop)
+    """
+    report = OrderedDict([('gflex_version', __version__)])
+    for name in ['dimension', 'Method', 'Solver', 'PlateSolutionType', 
+                 'IterativeMethod', 'Preconditioner']:
+      try:
+        report[name] = getattr(self, name)
+      except AttributeError:
+        pass
+    try:
+      report['shape'] = list(np.shape(self.w))
+    except AttributeError:
+      pass
+    report['phases'] = OrderedDict((name, OrderedDict(record)) 
+                                   for name, record in self.phase_records.items())
+    report['total_time'] = self.phase_end_time - self.phase_start_time
+    report['peak_rss'] = peak_rss()
+    for name in ['coeff_creation_time', 'time_to_solve', 'coeff_matrix_nnz', 
+                 'iterative_iterations', 'infill_iterations', 'crop_shape', 
+                 'crop_error_estimate']:
+      report[name] = getattr(self, name, None)
+    for name in ['iterative_residuals', 'infill_residuals']:
+      if getattr(self, name) is None:
+        report[name] = None
+      else:
+        report[name] = [float(r) for r in getattr(self, name)]
+    return report
+
+  def writeReport(self, path=None):
+    """
+    Writes the run report (see report) as JSON to path or, if path is not 
+    given, to ReportOut, if that is set
+    """
+    if path is None:
+      try:
+        path = self.ReportOut
+      except AttributeError:
+        path = None
+    if path:
+      with open(path, 'w') as f:
+        json.dump(self.report, f, indent=2)
+      logger.log(VERBOSE, 'Saving run report --> %s', path)
+
+
+class BMI(object):
+  """
+  Basic Model Interface (BMI), for coupling gFlex to other models. 
+  initialize() and finalize() are those of the flexure object; update() 
+  takes the place of run().
+  
+  Variables are named by CSDMS Standard Names (or by the names of the 
+  attributes that hold them; see bmi_vars). Grid 0 is the model grid, 
+  uniform rectilinear with the shape of qs; grid 1 holds the single values.
+  Grid values are passed as flattened (C-order) arrays.
+  
+  get_value_ptr returns views of qs, Te, and w, not copies: values written 
+  into the qs and Te views are used by the next update, and the w view 
+  holds the deflections from each update. update solves again only if the 
+  inputs have changed since the last solution, and keeps the finite 
+  difference operator if only the loads have (see bmi_solve). With 
+  IncrementalUpdate, SAS updates compute only the deflection due to the 
+  change in the loads.
+  
+  Only the gridded methods (FD, FFT, and SAS) are supported. gFlex has no 
+  time dependence: time advances only so that the coupler can keep count.
+  """
+
+  # Standard name: (attribute, units, "in" or "out", grid)
+  bmi_vars = OrderedDict([
+    ('lithosphere__overlying_pressure_increment', ('qs', 'Pa', 'in', 0)),
+    ('lithosphere__elastic_thickness', ('Te', 'm', 'in', 0)),
+    ('lithosphere__young_modulus', ('E', 'Pa', 'in', 1)),
+    ('lithosphere__poisson_ratio', ('nu', '1', 'in', 1)),
+    ('mantle__mass-per-volume_density', ('rho_m', 'kg m-3', 'in', 1)),
+    ('infill_material__mass-per-volume_density', ('rho_fill', 'kg m-3', 'in', 1)),
+    ('planet_surface__gravitational_acceleration', ('g', 'm s-2', 'in', 1)),
+    ('lithosphere_surface__elevation_increment', ('w', 'm', 'out', 0)),
+  ])
+
+  # Settings that, with the loads and Te, determine the solution
+  bmi_settings = ['Method', 'Solver', 'PlateSolutionType', 'dx', 'dy', 'E', 'nu', 
+                  'rho_m', 'rho_fill', 'g', 'BC_W', 'BC_E', 'BC_N', 'BC_S', 
+                  'CropWavelengths', 'CropFarField', 'MatrixFree']
+
+  def bmi_var(self, name):
+    """
+    (attribute, units, "in" or "out", grid) of the variable with this 
+    standard name or attribute name
+    """
+    try:
+      return self.bmi_vars[name]
+    except KeyError:
+      for var in self.bmi_vars.values():
+        if var[0] == name:
+          return var
+    sys.exit('Unknown variable "'+name+'"; variables are:\n'+'\n'.join(self.bmi_vars))
+
+  def bmi_setup(self):
+    """
+    Set-up for the solution method, done once, after initialize(): reads 
+    the remaining settings and the loads and Te from the configuration 
+    file, if there is one, so that all of the inputs are attributes that 
+    can be read and changed. The direct finite difference solution keeps 
+    its factorization between updates (CacheFactorization) unless the 
+    configuration file or a setter says otherwise.
+    """
+    if self.bmi_ready:
+      return
+    if self.Method not in ('FD', 'FFT', 'SAS'):
+      sys.exit('Error: the BMI requires a gridded solution method ("FD", "FFT", or "SAS")')
+    # SAS: add the deflections due to changes in the loads to the last 
+    # solution, with a full solution after every IncrementalRecompute of 
+    # these (0: never)
+    try:
+      self.IncrementalUpdate
+    except:
+      self.IncrementalUpdate = None
+      if self.filename:
+        self.IncrementalUpdate = self.configGetIfSet("bool", "numerical", "IncrementalUpdate")
+    try:
+      self.IncrementalRecompute
+    except:
+      self.IncrementalRecompute = None
+      if self.filename:
+        self.IncrementalRecompute = self.configGetIfSet("int", "numerical", "IncrementalRecompute")
+    if self.IncrementalRecompute is None:
+      self.IncrementalRecompute = 100
+    if self.Method == 'FD':
+      try:
+        self.CacheFactorization
+      except:
+        self.CacheFactorization = None
+        if self.filename:
+          self.CacheFactorization = self.configGetIfSet("bool", "numerical", "CacheFactorization")
+        if self.CacheFactorization is None:
+          self.CacheFactorization = True
+    self.bc_check()
+    with self.phase('configuration'):
+      getattr(Flexure, self.Method)(self)
+    # C-ordered floating-point arrays, so that get_value_ptr can view them
+    self.qs = np.ascontiguousarray(self.qs, dtype=float)
+    if not np.isscalar(self.Te):
+      self.Te = np.ascontiguousarray(self.Te, dtype=float)
+    self.bmi_ready = True
+
+  def bmi_solve(self):
+    """
+    Solves for the deflections, unless the loads, Te, and the settings in 
+    bmi_settings are all the same as for the last solution (copies of 
+    which are kept in bmi_inputs). If only the 
+    loads have changed, the finite difference operator (and, with 
+    CacheFactorization, its factorization) is reused. The deflections are 
+    written into the same array each time, so that views of w stay valid.
+    
+    With IncrementalUpdate, if only the loads have changed, the SAS method 
+    adds the deflections due to the change (see sas_superpose) to the last 
+    solution. Only the changed cells are summed, which is much faster than 
+    a full solution when few have changed. Every IncrementalRecompute 
+    incremental updates, a full solution is computed instead, so rounding 
+    errors cannot build up. (The finite difference method always solves 
+    for the full loads: a solution for the change costs as much, through 
+    the same factorization, and the iterative solver already starts from 
+    the last solution.)
+    """
+    self.bmi_setup()
+    settings = tuple(getattr(self, name, None) for name in self.bmi_settings)
+    if self.bmi_inputs is None:
+      loads_changed = operator_changed = True
+    else:
+      # Compared with copies of the last inputs: much faster than hashing 
+      # large grids
+      qs, Te, last_settings = self.bmi_inputs
+      loads_changed = not np.array_equal(self.qs, qs)
+      operator_changed = settings != last_settings or \
+                         np.isscalar(self.Te) != np.isscalar(Te) or \
+                         not np.array_equal(self.Te, Te)
+    if not (loads_changed or operator_changed):
+      logger.log(VERBOSE, "Inputs unchanged: keeping the last solution")
+      return
+    if self.IncrementalUpdate and self.Method == 'SAS' and not operator_changed \
+      and (not self.IncrementalRecompute or self.bmi_increments < self.IncrementalRecompute):
+      dqs = self.qs - qs
+      logger.log(VERBOSE, "Incremental update: loads changed in %s cells", np.count_nonzero(dqs))
+      with self.phase('solve'):
+        self.bmi_w += self.sas_superpose(dqs)
+      qs[...] = self.qs
+      self.bmi_increments += 1
+      return
+    if operator_changed and self.bmi_inputs is not None:
+      self.coeff_matrix = None # Rebuilt (or found in a cache) by the run
+    self.drho = self.rho_m - self.rho_fill
+    # Everything has been read from the configuration file by bmi_setup; 
+    # hide it so that the run does not read it again over any new values
+    filename = self.filename
+    self.filename = None
+    Te = self.Te
+    try:
+      self.run()
+    finally:
+      self.filename = filename
+      # Te as it was, not padded for the boundary conditions
+      self.Te = Te
+      try:
+        del self.Te_unpadded
+      except AttributeError:
+        pass
+    w = np.ascontiguousarray(self.w, dtype=float)
+    if self.bmi_w is not None and self.bmi_w.shape == w.shape:
+      self.bmi_w[...] = w
+    else:
+      self.bmi_w = w
+    self.w = self.bmi_w
+    if np.isscalar(Te):
+      self.bmi_inputs = (self.qs.copy(), Te, settings)
+    else:
+      self.bmi_inputs = (self.qs.copy(), Te.copy(), settings)
+    self.bmi_increments = 0
+
+  # Model control
+
+  def update(self):
+    """
+    Solves for the deflections if the inputs have changed (see bmi_solve), 
+    and advances the time by one time step
+    """
+    self.bmi_solve()
+    self.bmi_time += self.bmi_time_step
+
+  def update_until(self, time):
+    """
+    Solves for the deflections if the inputs have changed (see bmi_solve), 
+    and sets the time to "time"
+    """
+    self.bmi_solve()
+    self.bmi_time = float(time)
+
+  # Model and variable information
+
+  def get_component_name(self):
+    return 'gFlex'
+
+  def get_input_item_count(self):
+    return len(self.get_input_var_names())
+
+  def get_output_item_count(self):
+    return len(self.get_output_var_names())
+
+  def get_input_var_names(self):
+    return tuple(name for name, var in self.bmi_vars.items() if var[2] == 'in')
+
+  def get_output_var_names(self):
+    return tuple(name for name, var in self.bmi_vars.items() if var[2] == 'out')
+
+  def get_var_grid(self, name):
+    return self.bmi_var(name)[3]
+
+  def get_var_type(self, name):
+    return np.dtype(float).name
+
+  def get_var_units(self, name):
+    return self.bmi_var(name)[1]
+
+  def get_var_itemsize(self, name):
+    return np.dtype(float).itemsize
+
+  def get_var_nbytes(self, name):
+    return self.get_var_itemsize(name) * self.get_grid_size(self.get_var_grid(name))
+
+  def get_var_location(self, name):
+    return 'node'
+
+  # Time
+
+  def get_start_time(self):
+    return 0.
+
+  def get_end_time(self):
+    return np.inf
+
+  def get_current_time(self):
+    return self.bmi_time
+
+  def get_time_step(self):
+    return self.bmi_time_step
+
+  def get_time_units(self):
+    return 's'
+
+  # Values
+
+  def get_value_ptr(self, name):
+    """
+    Flattened view of a grid variable (qs, Te, or w): no copy is made. A 
+    single (scalar) Te is first expanded to a grid, except for the SAS 
+    method, which needs a single value. Before the first update, w is zeros.
+    """
+    self.bmi_setup()
+    attribute, units, role, grid = self.bmi_var(name)
+    if grid != 0:
+      sys.exit('"'+name+'" is a single value, which cannot be viewed: use get_value and set_value')
+    if attribute == 'Te' and np.isscalar(self.Te):
+      if self.Method == 'SAS':
+        sys.exit('The SAS method needs a single elastic thickness, which cannot be viewed:\n'
+                 'use get_value and set_value')
+      self.Te = self.Te * np.ones(self.qs.shape)
+    if attribute == 'w' and self.bmi_w is None:
+      self.bmi_w = self.w = np.zeros(self.qs.shape)
+    return getattr(self, attribute).reshape(-1)
+
+  def get_value(self, name, dest=None):
+    """
+    Copies the values of a variable into dest, if it is given, or a new 
+    flattened array; returns it
+    """
+    self.bmi_setup()
+    attribute, units, role, grid = self.bmi_var(name)
+    if grid != 0:
+      values = np.array([getattr(self, attribute)], dtype=float)
+    elif attribute == 'Te' and np.isscalar(self.Te):
+      values = self.Te * np.ones(self.qs.size)
+    else:
+      values = self.get_value_ptr(name)
+    if dest is None:
+      return values.copy()
+    dest[:] = values
+    return dest
+
+  def get_value_at_indices(self, name, dest, inds):
+    """
+    Copies the values of a variable at the given (flattened) indices into 
+    dest, if it is given, or a new array; returns it
+    """
+    values = self.get_value(name)[inds]
+    if dest is None:
+      return values
+    dest[:] = values
+    return dest
+
+  def set_value(self, name, src):
+    """
+    Sets an input variable from src: for grid variables, a flattened array 
+    (or anything of the grid's size); for single values, a number or a 
+    one-element array. The SAS method takes only a constant Te.
+    """
+    self.bmi_setup()
+    attribute, units, role, grid = self.bmi_var(name)
+    if role != 'in':
+      sys.exit('"'+name+'" is an output variable; it cannot be set')
+    src = np.asarray(src, dtype=float)
+    if grid != 0:
+      setattr(self, attribute, float(src.flat[0]))
+    elif attribute == 'Te' and self.Method == 'SAS':
+      if (src != src.flat[0]).any():
+        sys.exit("The SAS method requires a constant elastic thickness.")
+      self.Te = float(src.flat[0])
+    else:
+      self.get_value_ptr(name)[:] = src.reshape(-1)
+
+  def set_value_at_indices(self, name, inds, src):
+    """
+    Sets the values of an input grid variable at the given (flattened) 
+    indices
+    """
+    self.bmi_setup()
+    attribute, units, role, grid = self.bmi_var(name)
+    if role != 'in' or grid != 0:
+      sys.exit('"'+name+'" is not an input grid variable; use set_value')
+    self.get_value_ptr(name)[inds] = src
+
+  # Grid
+
+  def get_grid_type(self, grid):
+    return ['uniform_rectilinear', 'scalar'][grid]
+
+  def get_grid_rank(self, grid):
+    if grid == 0:
+      self.bmi_setup()
+      return self.qs.ndim
+    return 0
+
+  def get_grid_size(self, grid):
+    if grid == 0:
+      self.bmi_setup()
+      return self.qs.size
+    return 1
+
+  def get_grid_shape(self, grid, shape=None):
+    """
+    Number of rows and columns (2D) or of cells (1D) of the model grid
+    """
+    self.bmi_setup()
+    return self.bmi_fill(shape, self.qs.shape)
+
+  def get_grid_spacing(self, grid, spacing=None):
+    """
+    dy and dx (2D) or dx (1D) of the model grid [m]
+    """
+    if self.dimension == 2:
+      return self.bmi_fill(spacing, (self.dy, self.dx))
+    return self.bmi_fill(spacing, (self.dx,))
+
+  def get_grid_origin(self, grid, origin=None):
+    """
+    Position of the first cell center of the model grid [m]
+    """
+    return self.bmi_fill(origin, self.get_grid_spacing(grid) / 2.)
+
+  def bmi_fill(self, dest, values):
+    values = np.array(values)
+    if dest is None:
+      return values
+    dest[:] = values
+    return dest
+
+
 class WhichModel(Utility):
   def __init__(self, filename=None):
     """
@@ -490,7 +1228,7 @@ class WhichModel(Utility):
         except:
           sys.exit()
 
-class Flexure(Utility, Plotting):
+class Flexure(Utility, Plotting, Instrumentation, BMI):
   
   def __init__(self, filename=None):
     # 17 Nov 2014: Splitting out initialize from __init__ to allow space
@@ -528,6 +1266,63 @@ class Flexure(Utility, Plotting):
     except:
       self.PlanetaryRadius = None
 
+    # Cached finite difference operator and factorization; see 
+    # fd_cache_lookup
+    self.fd_cache = None
+
+    # Run report: timed phases, and functions to call as each starts and ends
+    self.phase_callbacks = []
+    self.phase_reset()
+
+    # Basic Model Interface: model time, the deflection array handed out 
+    # by get_value_ptr, and the inputs to the last solution; see BMI
+    self.bmi_ready = False
+    self.bmi_time = 0.
+    self.bmi_time_step = 1.
+    self.bmi_w = None
+    self.bmi_inputs = None
+    self.bmi_increments = 0
+
+  def setLogLevel(self):
+    """
+    Sets the level of the "gflex" logger: LogLevel, if it is set (a level 
+    name, e.g., "DEBUG", "VERBOSE", "INFO", or "WARNING", or number); 
+    otherwise ERROR if Quiet, DEBUG if Debug, VERBOSE if Verbose, and INFO 
+    if none of these. Called by initialize().
+    
+    Unless the program running gFlex has set up logging (i.e., given a 
+    handler to the root or "gflex" logger), messages are printed to stdout.
+    """
+    try:
+      self.LogLevel
+    except:
+      self.LogLevel = None
+      if self.filename:
+        self.LogLevel = self.configGetIfSet("string", "verbosity", "LogLevel")
+    if self.LogLevel:
+      if isinstance(self.LogLevel, int):
+        level = self.LogLevel
+      else:
+        level = logging.getLevelName(self.LogLevel.upper())
+        if not isinstance(level, int):
+          sys.exit('LogLevel must be DEBUG, VERBOSE, INFO, WARNING, ERROR, or CRITICAL')
+    elif self.Quiet:
+      level = logging.ERROR
+    elif self.Debug:
+      level = logging.DEBUG
+    elif self.Verbose:
+      level = VERBOSE
+    else:
+      level = logging.INFO
+    logger.setLevel(level)
+    # Print to stdout only if there is nowhere else for the messages to go
+    handlers = [h for h in logger.handlers 
+                if h is not console_handler and not isinstance(h, logging.NullHandler)]
+    if handlers or logging.getLogger().handlers:
+      logger.removeHandler(console_handler)
+    elif console_handler not in logger.handlers:
+      logger.addHandler(console_handler)
+
   def initialize(self, filename=None):
     # Values from configuration file
 
@@ -577,19 +1372,15 @@ class Flexure(Utility, Plotting):
     if self.Quiet:
       self.Debug = False
       self.Verbose = False
+    self.setLogLevel()
     
     # Introduce model
     # After configuration file can define "Quiet", and getter/setter should be done
     # by this point if we are going that way.
-    if self.Quiet == False:
-      print "" # Blank line at start of run
-      print ""
-      print "****************************"+"*"*len(__version__)
-      print "*** Initializing gFlex v"+__version__+" ***"
-      print "****************************"+"*"*len(__version__)
-      print ""
-      print "Open-source licensed under GNU GPL v3"
-      print ""
+    # (Blank lines at start of run)
+    logger.info("\n\n%s\n*** Initializing gFlex v%s ***\n%s\n\n"
+                "Open-source licensed under GNU GPL v3\n",
+                "*"*(28+len(__version__)), __version__, "*"*(28+len(__version__)))
 
     if self.filename:
       # Set clocks to None so if they are called by the getter before the 
@@ -644,6 +1435,22 @@ class Flexure(Utility, Plotting):
       self.E  = self.configGet("float", "parameter", "YoungsModulus")
       self.nu = self.configGet("float", "parameter", "PoissonsRatio")
     
+    # Binary copies of ASCII input files, to be read by later runs
+    try:
+      self.CacheASCIIInputs
+    except:
+      self.CacheASCIIInputs = False
+      if self.filename:
+        self.CacheASCIIInputs = self.configGetIfSet("bool", "input", "CacheASCIIInputs")
+    
+    # JSON file for the run report (timing and memory use of each phase)
+    try:
+      self.ReportOut
+    except:
+      self.ReportOut = None
+      if self.filename:
+        self.ReportOut = self.configGetIfSet("string", "output", "ReportOut")
+    
     # Stop program if there is no q0 defined or if it is None-type
     try:
       self.q0
@@ -675,12 +1482,10 @@ class Flexure(Utility, Plotting):
     if self.q0 is not None:
       if self.Method != 'SAS_NG':
         if self.q0.ndim != self.dimension:
-          print "Number of dimensions in loads file is inconsistent with"
-          print "number of dimensions in solution technique."
-          print "Loads", self.q0.ndim
-          print "Dimensions", self.dimension
-          print self.q0
-          print "Exiting."
+          logger.error("Number of dimensions in loads file is inconsistent with\n"
+                       "number of dimensions in solution technique.\n"
+                       "Loads %s\nDimensions %s\nExiting.", self.q0.ndim, self.dimension)
+          array_logger.debug("q0 = %s", self.q0)
           sys.exit()
           
     # Plotting selection
@@ -709,17 +1514,25 @@ class Flexure(Utility, Plotting):
       del self.coeff_matrix
     except:
       pass
-    if self.Quiet==False:
-      print ""
+    # Keep the operator's factorization or preconditioner only if asked to
+    try:
+      if not self.CacheFactorization:
+        self.fd_cache = None
+    except:
+      pass
+    self.writeReport()
+    logger.info("")
 
   # SAVING TO FILE AND PLOTTING STEPS
 
   # Output: One of the functions run by isostasy.py; not part of IRF
   # (for standalone model use)
   def output(self):
-    if self.Verbose: print 'Output step'
-    self.outputDeflections()
-    self.plotting()
+    logger.log(VERBOSE, 'Output step')
+    with self.phase('output'):
+      self.outputDeflections()
+      self.plotting()
+    self.writeReport()
 
   # Save output deflections to file, if desired
   def outputDeflections(self):
@@ -727,16 +1540,18 @@ class Flexure(Utility, Plotting):
     Outputs a grid of deflections if an output directory is defined in the 
     configuration file
     
-    If the filename given in the configuration file ends in ".npy", then a binary 
-    numpy grid will be exported.
+    The file format is DeflectionOutFormat or, if this is not set, chosen by 
+    the file extension: ".npy" (numpy binary), ".npz" (compressed numpy 
+    archive), ".nc" (NetCDF), or ".raw" or ".bin" (raw binary with a JSON 
+    header). Otherwise, an ASCII grid will be exported. See writers.
     
-    Otherwise, an ASCII grid will be exported.
+    The npz, NetCDF, and raw formats can also hold other fields, as chosen 
+    by OutputFields; see outputArrays.
     """
     try:
       # If wOutFile exists, has already been set by a setter
       self.wOutFile
-      if self.Verbose:
-        print "Output filename provided."
+      logger.log(VERBOSE, "Output filename provided.")
     # Otherwise, it needs to be set by an configuration file
     except:
       try:
@@ -744,19 +1559,85 @@ class Flexure(Utility, Plotting):
       except:
         # if there is no parsable output string, do not generate output;
         # this allows the user to leave the line blank and produce no output
-        if self.Debug:
-          print 'No output filename provided:'
-          print '  not writing any deflection output to file'
+        logger.debug('No output filename provided:\n'
+                     '  not writing any deflection output to file')
     if self.wOutFile:
-        if self.wOutFile[-4:] == '.npy':
-          from numpy import save
-          save(self.wOutFile,self.w)
-        else:
-          from numpy import savetxt
-          # Shouldn't need more than mm precision, at very most
-          savetxt(self.wOutFile,self.w,fmt='%.3f')
-          if self.Verbose:
-            print 'Saving deflections --> ' + self.wOutFile
+      import writers
+      try:
+        self.wOutFormat
+      except:
+        self.wOutFormat = None
+        if self.filename:
+          self.wOutFormat = self.configGetIfSet("string", "output", "DeflectionOutFormat")
+      fields, dims, coords, attrs = self.outputArrays()
+      fmt = writers.write(self.wOutFile, fields, dims, coords, attrs, self.wOutFormat)
+      logger.log(VERBOSE, 'Saving %s (%s) --> %s', ', '.join(fields.keys()), fmt, self.wOutFile)
+
+  def outputArrays(self):
+    """
+    fields, dims, coords, attrs = outputArrays()
+    
+    Collects the output fields: the deflections (w) and, as listed in 
+    OutputFields, any of the loads (qs), elastic thickness (Te), and 
+    flexural rigidity (D), each with the shape of w. Also returns the names 
+    of the dimensions, the cell-center (or SAS_NG point) coordinates, and the 
+    model parameters, for the writers that store them.
+    """
+    try:
+      self.OutputFields
+    except:
+      self.OutputFields = None
+      if self.filename:
+        self.OutputFields = self.configGetIfSet("string", "output", "OutputFields")
+    names = ['w']
+    if self.OutputFields:
+      names += [name for name in self.OutputFields.replace(',', ' ').split() if name != 'w']
+    fields = OrderedDict()
+    for name in names:
+      if name == 'w':
+        values = self.w
+      elif name == 'qs':
+        try:
+          values = self.qs
+        except:
+          values = self.q # SAS_NG point loads
+      elif name == 'Te':
+        values = self.Te
+      elif name == 'D':
+        values = self.E*np.asarray(self.Te, dtype=float)**3/(12*(1-self.nu**2))
+      else:
+        sys.exit("Error: OutputFields can include w, qs, Te, and D; not "+name)
+      try:
+        fields[name] = np.broadcast_to(values, self.w.shape)
+      except ValueError:
+        sys.exit("Error: cannot write "+name+" (shape "+str(np.shape(values))+
+                 ") with deflections of shape "+str(self.w.shape))
+    coords = OrderedDict()
+    if self.Method == 'SAS_NG':
+      dims = ('point',)
+      coords['x'] = (dims, self.xw.ravel())
+      if self.dimension == 2:
+        coords['y'] = (dims, self.yw.ravel())
+    elif self.dimension == 1:
+      dims = ('x',)
+      coords['x'] = (dims, (np.arange(self.w.shape[0]) + 0.5) * self.dx)
+    else:
+      dims = ('y', 'x')
+      coords['y'] = (('y',), (np.arange(self.w.shape[0]) + 0.5) * self.dy)
+      coords['x'] = (('x',), (np.arange(self.w.shape[1]) + 0.5) * self.dx)
+    attrs = OrderedDict([('gflex_version', __version__), ('dimension', self.dimension), 
+                         ('Method', self.Method)])
+    for name in ['dx', 'dy', 'E', 'nu', 'rho_m', 'rho_fill', 'g', 'BC_W', 'BC_E', 
+                 'BC_N', 'BC_S', 'PlateSolutionType']:
+      try:
+        value = getattr(self, name)
+      except AttributeError:
+        continue
+      if np.isscalar(value):
+        attrs[name] = value
+    if np.isscalar(self.Te):
+      attrs['Te'] = self.Te
+    return fields, dims, coords, attrs
 
   def bc_check(self):
     # Check that boundary conditions are acceptable with code implementation
@@ -802,6 +1683,44 @@ class Flexure(Utility, Plotting):
                        +"Exiting.")
           else:
             sys.exit("For a flexural solution, grid must be 1D or 2D. Exiting.")
+    elif self.Method == 'FFT':
+      # Spectral solution boundary conditions
+      # The FFT domain is inherently periodic; the other boundary conditions
+      # are created by padding the load grid (see fft_pad_axis).
+      # If they aren't set, it is because no input file has been used
+      self.bcFFT = np.array(['Periodic', 'Mirror', 'NoOutsideLoads'])
+      try:
+        self.BC_E
+      except:
+        self.BC_E = ''
+      try:
+        self.BC_W
+      except:
+        self.BC_W = ''
+      bcpairs = [['BC_W', 'BC_E']]
+      if self.dimension == 2:
+        try:
+          self.BC_N
+        except:
+          self.BC_N = ''
+        try:
+          self.BC_S
+        except:
+          self.BC_S = ''
+        bcpairs += [['BC_N', 'BC_S']]
+      for pair in bcpairs:
+        for side in pair:
+          if getattr(self, side) == '':
+            # As for the analytical solutions
+            logger.log(VERBOSE, "Assuming NoOutsideLoads boundary condition for %s", side[-1])
+            setattr(self, side, 'NoOutsideLoads')
+          if (getattr(self, side) == self.bcFFT).any() == False:
+            sys.exit("'"+getattr(self, side)+"'"+ " is not an acceptable FFT boundary condition.\n"\
+                     +"Acceptable boundary conditions are:\n"\
+                     +str(self.bcFFT)+"\n"\
+                     +"Exiting.")
+        if (getattr(self, pair[0]) == 'Periodic') != (getattr(self, pair[1]) == 'Periodic'):
+          sys.exit("Not physical to have one wrap-around boundary but not its pair.")
     else:
       # Analytical solution boundary conditions
       # If they aren't set, it is because no input file has been used
@@ -834,26 +1753,20 @@ class Flexure(Utility, Plotting):
          and self.BC_W == 'NoOutsideLoads' or self.BC_W == '') ):
         if self.BC_E == '' or self.BC_W == '' \
            or self.BC_S == '' or self.BC_N == '':
-          if self.Verbose:
-            print "Assuming NoOutsideLoads boundary condition, as this is implicit in the " 
-            print "  superposition-based analytical solution"
+          logger.log(VERBOSE, "Assuming NoOutsideLoads boundary condition, as this is implicit in the \n"
+                              "  superposition-based analytical solution")
       else:
         if self.Quiet == False:
-          print ""
-          print ">>> BOUNDARY CONDITIONS IMPROPERLY DEFINED <<<"
-          print ""
-          print "For analytical solutions the boundaries must be either:"
-          print ""
-          print "* NoOutsideLoads (explicitly)"
-          print "* <left blank>"
-          print ""
-          print "The latter is to implictly indicate a desire to use the only"
-          print "boundary condition available for the superposition-based"
-          print "analytical solutions."
-          print "This check is in place to ensure that the user does not apply"
-          print "boundary conditions for finite difference solutions to the"
-          print "analytical solutions and expect them to work."
-          print ""
+          logger.error("\n>>> BOUNDARY CONDITIONS IMPROPERLY DEFINED <<<\n\n"
+                       "For analytical solutions the boundaries must be either:\n\n"
+                       "* NoOutsideLoads (explicitly)\n"
+                       "* <left blank>\n\n"
+                       "The latter is to implictly indicate a desire to use the only\n"
+                       "boundary condition available for the superposition-based\n"
+                       "analytical solutions.\n"
+                       "This check is in place to ensure that the user does not apply\n"
+                       "boundary conditions for finite difference solutions to the\n"
+                       "analytical solutions and expect them to work.\n")
           sys.exit()
  
   def coeffArraySizeCheck(self):
@@ -862,9 +1775,8 @@ class Flexure(Utility, Plotting):
     each other (for finite difference if loading a pre-build coefficient
     array). Otherwise, exit.
     """
-    if prod(self.coeff_matrix.shape) != long(prod(np.array(self.qs.shape,dtype=int64)+2)**2):
-      print "Inconsistent size of q0 array and coefficient mattrix"
-      print "Exiting."
+    if np.prod(self.coeff_matrix.shape) != long(np.prod(np.array(self.qs.shape,dtype=np.int64)+2)**2):
+      logger.error("Inconsistent size of q0 array and coefficient mattrix\nExiting.")
       sys.exit()
       
   def TeArraySizeCheck(self):
@@ -881,7 +1793,7 @@ class Flexure(Utility, Plotting):
         if (np.array(self.Te.shape) != np.array(self.qs.shape)).any():
           sys.exit("q0 and Te arrays have incompatible shapes. Exiting.")
       else:
-        if self.Debug: print "Te and qs array sizes pass consistency check"
+        logger.debug("Te and qs array sizes pass consistency check")
 
   ### need to determine its interface, it is best to have a uniform interface
   ### no matter it is 1D or 2D; but if it can't be that way, we can set up a
@@ -891,8 +1803,7 @@ class Flexure(Utility, Plotting):
     """
     Set-up for the finite difference solution method
     """
-    if self.Verbose:
-      print "Finite Difference Solution Technique"
+    logger.log(VERBOSE, "Finite Difference Solution Technique")
     # Used to check for coeff_matrix here, but now doing so in self.bc_check()
     # called by f1d and f2d at the start
     # 
@@ -921,6 +1832,113 @@ class Flexure(Utility, Plotting):
         self.Solver = self.configGet("string", "numerical", "Solver")
       else:
         sys.exit("No solver defined!")
+    # Keep the operator and its factorization between runs?
+    try:
+      self.CacheFactorization
+    except:
+      if self.filename:
+        self.CacheFactorization = self.configGetIfSet("bool", "numerical", "CacheFactorization")
+      else:
+        self.CacheFactorization = False
+    # Operators shared between runs through a directory on disk
+    try:
+      self.OperatorCacheDir
+    except:
+      self.OperatorCacheDir = None
+      if self.filename:
+        self.OperatorCacheDir = self.configGetIfSet("string", "numerical", "OperatorCacheDir")
+        if self.OperatorCacheDir:
+          # Relative to the configuration file
+          self.OperatorCacheDir = os.path.join(self.inpath, os.path.expanduser(self.OperatorCacheDir))
+    try:
+      self.OperatorCacheSize
+    except:
+      self.OperatorCacheSize = None
+      if self.filename:
+        self.OperatorCacheSize = self.configGetIfSet("float", "numerical", "OperatorCacheSize")
+    if self.OperatorCacheSize is None:
+      self.OperatorCacheSize = 1024
+    # Iterative solver: Krylov method and preconditioner (read from the 
+    # configuration file only for the iterative solver)
+    iterative = self.Solver == "iterative" or self.Solver == "Iterative"
+    try:
+      self.IterativeMethod
+    except:
+      self.IterativeMethod = None
+      if self.filename and iterative:
+        self.IterativeMethod = self.configGetIfSet("string", "numerical", "IterativeMethod")
+    if not self.IterativeMethod:
+      self.IterativeMethod = 'lgmres'
+    try:
+      self.Preconditioner
+    except:
+      self.Preconditioner = None
+      if self.filename and iterative:
+        self.Preconditioner = self.configGetIfSet("string", "numerical", "Preconditioner")
+    try:
+      self.ILUDropTolerance
+    except:
+      self.ILUDropTolerance = None
+      if self.filename and iterative:
+        self.ILUDropTolerance = self.configGetIfSet("float", "numerical", "ILUDropTolerance")
+    if self.ILUDropTolerance is None:
+      self.ILUDropTolerance = 1E-5
+    try:
+      self.ILUFillFactor
+    except:
+      self.ILUFillFactor = None
+      if self.filename and iterative:
+        self.ILUFillFactor = self.configGetIfSet("float", "numerical", "ILUFillFactor")
+    if self.ILUFillFactor is None:
+      self.ILUFillFactor = 20
+    # 2D: apply the stencil without building the sparse matrix
+    try:
+      self.MatrixFree
+    except:
+      self.MatrixFree = False
+      if self.filename:
+        self.MatrixFree = self.configGetIfSet("bool", "numerical", "MatrixFree")
+    if self.MatrixFree and self.dimension == 2:
+      if not (self.Solver == "iterative" or self.Solver == "Iterative"):
+        sys.exit('MatrixFree requires the iterative solver (Solver = "iterative")')
+      if self.Preconditioner in ('amg', 'ilu'):
+        sys.exit('Preconditioner "'+self.Preconditioner+'" requires the sparse matrix; '
+                 'with MatrixFree, use "spectral", "jacobi", or "none"')
+    # Check the iterative solver settings before anything is built
+    if iterative:
+      if self.IterativeMethod not in ('lgmres', 'bicgstab', 'cg', 'minres'):
+        sys.exit('IterativeMethod must be "lgmres", "bicgstab", "cg", or "minres"')
+      if self.Preconditioner and self.Preconditioner not in ('amg', 'ilu', 'jacobi', 'spectral', 'none'):
+        sys.exit('Preconditioner must be "amg", "ilu", "jacobi", "spectral", or "none"')
+      if self.Preconditioner == 'spectral' and self.dimension != 2:
+        sys.exit('Preconditioner "spectral" is available only for 2D (F2D) solutions')
+      if self.IterativeMethod in ('cg', 'minres') and self.Preconditioner == 'ilu':
+        # The incomplete LU factors are not symmetric
+        sys.exit('IterativeMethod "'+self.IterativeMethod+'" needs a symmetric preconditioner: '
+                 'use "amg", "jacobi", "spectral", or "none", not "ilu"')
+    # Solve only on the part of the grid around the loads (see fd_crop)
+    try:
+      self.CropWavelengths
+    except:
+      self.CropWavelengths = None
+      if self.filename:
+        self.CropWavelengths = self.configGetIfSet("float", "numerical", "CropWavelengths")
+    try:
+      self.CropFarField
+    except:
+      self.CropFarField = None
+      if self.filename:
+        self.CropFarField = self.configGetIfSet("string", "numerical", "CropFarField")
+    if not self.CropFarField:
+      self.CropFarField = 'zero'
+    if self.CropFarField not in ('zero', 'kernel'):
+      sys.exit('CropFarField must be "zero" or "kernel"')
+    if not self.filename:
+      # Relative residual tolerance for iterative solutions from a script
+      try:
+        self.iterative_ConvergenceTolerance
+      except:
+        self.iterative_ConvergenceTolerance = 1E-3
     # Check consistency of size if coeff array was loaded
     if self.filename:
       # In the case that it is iterative, find the convergence criterion
@@ -955,24 +1973,676 @@ class Flexure(Utility, Plotting):
     if Tepath:
       self.Te = self.loadFile(self.Te, close_on_fail = False)
       if self.Te is None:
-        print "Requested Te file is provided but cannot be located."
-        print "No scalar elastic thickness is provided in configuration file"
-        print "(Typo in path to input Te grid?)"
+        message = "Requested Te file is provided but cannot be located.\n" \
+                  "No scalar elastic thickness is provided in configuration file\n" \
+                  "(Typo in path to input Te grid?)\n"
         if self.coeff_matrix is not None:
-          print "But a coefficient matrix has been found."
-          print "Calculations will be carried forward using it."
+          logger.warning(message + "But a coefficient matrix has been found.\n"
+                         "Calculations will be carried forward using it.")
         else:
-          print "Exiting."
+          logger.error(message + "Exiting.")
           sys.exit()
 
       # Check that Te is the proper size if it was loaded
       # Will be array if it was loaded
-      if self.Te.any():
+      # (Against a stack of profiles, it is checked by F1D.run_profiles)
+      if self.Te.any() and np.ndim(self.qs) == self.dimension:
         self.TeArraySizeCheck()
     
-  ### need work
+  def fd_crop(self):
+    """
+    With CropWavelengths, the finite difference solution is computed only 
+    on the part of the grid around the loads: their bounding box, padded on 
+    each side by CropWavelengths maximum flexural wavelengths (see 
+    calc_max_flexural_wavelength, here for the largest Te). Sides of the 
+    grid that are cut away are given 0Displacement0Slope boundary 
+    conditions; an axis with Periodic boundary conditions is cut on both 
+    sides or not at all.
+    
+    qs, Te, and the boundary conditions are those of the cropped grid until 
+    fd_uncrop is called after the solution. The shape of the cropped grid 
+    and an estimate of the error are kept in self.crop_shape and 
+    self.crop_error_estimate (and in the run report): the largest 
+    deflection beyond the cut, relative to the peak deflection, of the 
+    analytical solution for a point load with the largest Te.
+    
+    Returns True if the grid has been cropped.
+    """
+    self.crop_shape = None
+    self.crop_error_estimate = None
+    if not self.CropWavelengths or self.coeff_matrix is not None:
+      return False
+    loaded = np.nonzero(self.qs)
+    if len(loaded[0]) == 0:
+      return False
+    self.D = self.E*np.max(self.Te)**3/(12*(1-self.nu**2))
+    self.calc_max_flexural_wavelength()
+    if self.dimension == 1:
+      ncells = [self.maxFlexuralWavelength_ncells]
+      spacing = [self.dx]
+      sides = [('BC_W', 'BC_E')]
+    else:
+      ncells = [self.maxFlexuralWavelength_ncells_y, self.maxFlexuralWavelength_ncells_x]
+      spacing = [self.dy, self.dx]
+      sides = [('BC_N', 'BC_S'), ('BC_W', 'BC_E')]
+    slices = []
+    BCs = OrderedDict()
+    cut = [] # Distance from the loads to each side that is cut away [m]
+    for axis in range(self.dimension):
+      n = self.qs.shape[axis]
+      pad = int(np.ceil(self.CropWavelengths * ncells[axis]))
+      lo = max(loaded[axis].min() - pad, 0)
+      hi = min(loaded[axis].max() + pad + 1, n)
+      if getattr(self, sides[axis][0]) == 'Periodic' and (lo > 0) != (hi < n):
+        lo, hi = 0, n
+      for side, is_cut in zip(sides[axis], (lo > 0, hi < n)):
+        if is_cut:
+          BCs[side] = '0Displacement0Slope'
+          cut.append(pad * spacing[axis])
+      slices.append(slice(lo, hi))
+    if not cut:
+      return False
+    self.crop_slices = tuple(slices)
+    self.crop_saved = (self.qs, self.Te, OrderedDict((side, getattr(self, side)) for side in BCs))
+    self.qs = np.ascontiguousarray(self.qs[self.crop_slices])
+    if not np.isscalar(self.Te):
+      self.Te = np.ascontiguousarray(self.Te[self.crop_slices])
+    for side, bc in BCs.items():
+      setattr(self, side, bc)
+    self.crop_shape = list(self.qs.shape)
+    if self.dimension == 1:
+      alpha = (4*self.D/(self.drho*self.g))**.25 # 1D flexural parameter
+      kernel = lambda x: np.exp(-x) * (np.cos(x) + np.sin(x))
+    else:
+      kernel = self.kei
+      alpha = (self.D/(self.drho*self.g))**.25 # 2D flexural parameter
+    self.crop_error_estimate = float(self.kernel_tail_bound(kernel, min(cut)/alpha) 
+                                     / np.abs(kernel(0.)))
+    logger.info("Cropped to %s cells around the loads (%.3g%% of the grid); "
+                "estimated relative error %.3g", self.crop_shape, 
+                100. * self.qs.size / self.crop_saved[0].size, self.crop_error_estimate)
+    return True
+
+  def fd_uncrop(self):
+    """
+    After a solution on a cropped grid (see fd_crop), restores qs, Te, and 
+    the boundary conditions, and places the deflections in a grid of the 
+    full size. Outside of the cropped grid, the deflections are zero or, 
+    with CropFarField = 'kernel', the analytical (SAS) solution for all of 
+    the loads on a plate of the mean Te.
+    """
+    qs, Te, BCs = self.crop_saved
+    del self.crop_saved
+    w_crop = self.w
+    self.qs = qs
+    for side, bc in BCs.items():
+      setattr(self, side, bc)
+    # Built for the cropped grid; with CacheFactorization, it is kept in the 
+    # cache for the next run with the same cropped grid
+    self.coeff_matrix = None
+    if self.CropFarField == 'kernel':
+      try:
+        self.TabulatedKernel
+      except AttributeError:
+        self.TabulatedKernel = False
+      self.Te = float(np.mean(Te))
+      self.spatialDomainVarsSAS()
+      if self.dimension == 1:
+        self.gridded_x()
+      self.spatialDomainGridded()
+    else:
+      self.w = np.zeros(qs.shape)
+    self.w[self.crop_slices] = w_crop
+    self.Te = Te
+    if hasattr(self, 'Te_unpadded'):
+      self.Te_unpadded = Te
+
+  def fd_operator_key(self):
+    """
+    Returns a key that identifies the finite difference operator.
+    It is built from every input to the coefficient matrix, so a change to 
+    any of them (Te, grid spacing, elastic parameters, densities, gravity, 
+    boundary conditions, or plate solution type) changes the key.
+    Must be called before BC_Rigidity pads Te.
+    """
+    Te = np.ascontiguousarray(self.Te, dtype=float)
+    key = [hashlib.sha1(Te).hexdigest(), np.isscalar(self.Te), Te.shape, 
+           self.qs.shape, self.dx, self.E, self.nu, self.drho, self.g, 
+           self.BC_W, self.BC_E]
+    if self.dimension == 2:
+      key += [self.dy, self.BC_N, self.BC_S, self.PlateSolutionType]
+      if getattr(self, 'MatrixFree', False):
+        key.append('MatrixFree')
+    return tuple(key)
+
+  def fd_cache_lookup(self):
+    """
+    Persistent factorization mode (CacheFactorization = True).
+    If the cached operator was built from the same inputs as the current 
+    run, it is placed back into self.coeff_matrix and True is returned. 
+    Otherwise, the cache is reset to the current key and False is returned,
+    so the caller can build a new operator and store it with fd_cache_store.
+    """
+    key = self.fd_operator_key()
+    if self.fd_cache is not None and self.fd_cache['key'] == key:
+      self.coeff_matrix = self.fd_cache['coeff_matrix']
+      logger.log(VERBOSE, "Reusing cached coefficient matrix: inputs unchanged")
+      return True
+    else:
+      self.fd_cache = {'key': key, 'coeff_matrix': None, 'lu': None, 'preconditioner': None}
+      return False
+
+  def fd_cache_store(self):
+    """
+    Stores the newly built coefficient matrix under the key set by 
+    fd_cache_lookup
+    """
+    self.fd_cache['coeff_matrix'] = self.coeff_matrix
+
+  def fd_disk_cache_load(self):
+    """
+    On-disk operator cache (OperatorCacheDir), shared between processes.
+    If an operator built from the same inputs is stored there, it is placed 
+    into self.coeff_matrix and True is returned. Otherwise, False is 
+    returned, and the caller can build a new operator and store it with 
+    fd_disk_cache_store. See operator_cache.
+    """
+    import operator_cache
+    self.fd_disk_cache_key = self.fd_operator_key()
+    self.coeff_matrix = operator_cache.load(self.OperatorCacheDir, self.fd_disk_cache_key)
+    if self.coeff_matrix is None:
+      return False
+    logger.log(VERBOSE, "Loaded coefficient matrix from operator cache in %s", self.OperatorCacheDir)
+    return True
+
+  def fd_disk_cache_store(self):
+    """
+    Stores the newly built coefficient matrix in the on-disk operator cache, 
+    under the key set by fd_disk_cache_load. The least recently used 
+    operators are removed to keep the cache within OperatorCacheSize [MB].
+    """
+    import operator_cache
+    try:
+      operator_cache.store(self.OperatorCacheDir, self.fd_disk_cache_key, 
+                           self.coeff_matrix, self.OperatorCacheSize * 2**20)
+    except (IOError, OSError) as e:
+      logger.warning("Could not write to operator cache: %s", e)
+
+  def fd_direct_solve(self, rhs):
+    """
+    Direct solution of coeff_matrix * w = rhs.
+    
+    By default, this calls UMFpack (or SuperLU) via spsolve each time.
+    With CacheFactorization, the LU factorization (SuperLU, via splu) is 
+    computed once and kept alongside the cached operator, so that each 
+    later solve is just a forward and back substitution. A coefficient 
+    matrix that did not come from the cache (e.g., one set directly by the 
+    user) is factored and cached on its first solve.
+    """
+    from scipy.sparse.linalg import spsolve, splu
+    self.coeff_matrix_nnz = int(self.coeff_matrix.nnz)
+    if rhs.ndim == 2 and not self.CacheFactorization:
+      # Several right-hand sides (columns): factor once, solve for each
+      with self.phase('factorization'):
+        lu = splu(self.coeff_matrix.tocsc())
+      return lu.solve(rhs)
+    elif self.CacheFactorization:
+      cache = self.fd_cache_entry()
+      if cache['lu'] is None:
+        logger.debug("Factorizing coefficient matrix (SuperLU)")
+        with self.phase('factorization'):
+          cache['lu'] = splu(self.coeff_matrix.tocsc())
+      return cache['lu'].solve(rhs)
+    else:
+      # UMFpack is now the default, but setting true just to be sure in case
+      # anything changes
+      return spsolve(self.coeff_matrix, rhs, use_umfpack=True)
+
+  def fd_cache_entry(self):
+    """
+    Returns the cache entry for the current coefficient matrix, in which its 
+    factorization and iterative-solver preconditioner are kept. If the 
+    coefficient matrix did not come from the cache (e.g., it was set 
+    directly by the user), the cache is re-keyed to it. Without 
+    CacheFactorization, the entry is dropped by finalize.
+    """
+    if self.fd_cache is None or self.fd_cache['coeff_matrix'] is not self.coeff_matrix:
+      self.fd_cache = {'key': None, 'coeff_matrix': self.coeff_matrix, 'lu': None, 'preconditioner': None}
+    return self.fd_cache
+
+  def fd_preconditioner(self):
+    """
+    Returns the preconditioner for the iterative solver, as chosen by 
+    Preconditioner:
+      'amg': smoothed-aggregation algebraic multigrid (requires pyamg)
+      'ilu': incomplete LU factorization (scipy.sparse.linalg.spilu), with 
+             ILUDropTolerance and ILUFillFactor
+      'jacobi': the inverse of the diagonal of the operator
+      'spectral': the inverse of the operator for uniform Te, applied with 
+                  fast transforms (2D only; see spectral_preconditioner)
+      'none': no preconditioner
+    By default, 'amg' is used if pyamg can be imported, and 'ilu' otherwise 
+    ('jacobi' for cg and minres, which need a symmetric preconditioner); 
+    with MatrixFree (which leaves no matrix to factor), 'spectral'.
+    The preconditioner is built once per coefficient matrix; see 
+    fd_cache_entry.
+    """
+    from scipy.sparse.linalg import spilu, LinearOperator
+    cache = self.fd_cache_entry()
+    if cache['preconditioner'] is not None:
+      return cache['preconditioner']
+    if not self.Preconditioner:
+      if getattr(self, 'MatrixFree', False) and self.dimension == 2:
+        self.Preconditioner = 'spectral'
+      else:
+        try:
+          import pyamg
+          self.Preconditioner = 'amg'
+        except ImportError:
+          if self.IterativeMethod in ('cg', 'minres'):
+            self.Preconditioner = 'jacobi'
+          else:
+            self.Preconditioner = 'ilu'
+    if self.Preconditioner == 'none':
+      return None
+    elif self.Preconditioner == 'amg':
+      try:
+        import pyamg
+      except ImportError:
+        sys.exit('Preconditioner "amg" requires pyamg, which cannot be imported')
+      logger.debug("Building algebraic multigrid preconditioner (pyamg)")
+      with self.phase('factorization'):
+        if self.IterativeMethod in ('cg', 'minres'):
+          symmetry = 'symmetric'
+        else:
+          symmetry = 'nonsymmetric'
+        ml = pyamg.smoothed_aggregation_solver(self.coeff_matrix.tocsr(), symmetry=symmetry)
+      cache['preconditioner'] = ml.aspreconditioner(cycle='V')
+    elif self.Preconditioner == 'ilu':
+      logger.debug("Building incomplete LU preconditioner")
+      # Minimum-degree ordering on A^T+A and no partial pivoting keep the 
+      # incomplete factors of this (diagonally strong) operator usable
+      with self.phase('factorization'):
+        ilu = spilu(self.coeff_matrix.tocsc(), drop_tol=self.ILUDropTolerance, 
+                    fill_factor=self.ILUFillFactor, permc_spec='MMD_AT_PLUS_A',
+                    diag_pivot_thresh=0.)
+      cache['preconditioner'] = LinearOperator(self.coeff_matrix.shape, ilu.solve)
+    elif self.Preconditioner == 'jacobi':
+      inverse_diagonal = 1. / self.coeff_matrix.diagonal()
+      cache['preconditioner'] = LinearOperator(self.coeff_matrix.shape, 
+                                               lambda x: inverse_diagonal * x.reshape(-1))
+    elif self.Preconditioner == 'spectral':
+      logger.debug("Building spectral preconditioner")
+      cache['preconditioner'] = self.spectral_preconditioner()
+    else:
+      sys.exit('Preconditioner must be "amg", "ilu", "jacobi", "spectral", or "none"')
+    return cache['preconditioner']
+
+  def fd_iterative_solve(self, rhs, x0=None):
+    """
+    Iterative solution of coeff_matrix * x = rhs, for grids too large to 
+    factor directly. x0 is the starting guess (e.g., the previous solution).
+    coeff_matrix may also be the matrix-free operator (see MatrixFree).
+    
+    IterativeMethod selects the Krylov method: 'lgmres' (default) or 
+    'bicgstab' for general operators, or 'cg' or 'minres' for symmetric 
+    ones: constant Te, with 0Displacement0Slope or Periodic boundary 
+    conditions on every side (the other boundary conditions, and variable 
+    Te, make the operator nonsymmetric). The operator is checked (with a 
+    pair of random vectors) before cg or minres is used. The iteration 
+    stops when the relative residual, |rhs - A x| / |rhs|, falls below 
+    ConvergenceTolerance.
+    
+    The number of iterations and the relative residual after each one are 
+    kept in self.iterative_iterations and self.iterative_residuals. These 
+    come from the method's callback, which for lgmres is called once per 
+    outer (restart) cycle, each of several Krylov iterations, so for lgmres 
+    they count and follow those cycles; for the other methods, the 
+    iterations themselves. Each residual costs one more application of the 
+    operator. If the iteration does not converge, or breaks down, the run 
+    is stopped, rather than returning a wrong solution.
+    """
+    from scipy.sparse import linalg
+    methods = {'lgmres': linalg.lgmres, 'bicgstab': linalg.bicgstab, 
+               'cg': linalg.cg, 'minres': linalg.minres}
+    try:
+      method = methods[self.IterativeMethod]
+    except KeyError:
+      sys.exit('IterativeMethod must be "lgmres", "bicgstab", "cg", or "minres"')
+    A = self.coeff_matrix
+    if self.IterativeMethod in ('cg', 'minres'):
+      # x . A y = y . A x for a symmetric A
+      x, y = np.random.RandomState(0).rand(2, A.shape[0])
+      Ay = A.dot(y)
+      if np.abs(x.dot(Ay) - y.dot(A.dot(x))) > 1E-10 * np.linalg.norm(x) * np.linalg.norm(Ay):
+        sys.exit('IterativeMethod "'+self.IterativeMethod+'" needs a symmetric operator '
+                 '(constant Te, with 0Displacement0Slope or Periodic boundary conditions '
+                 'on every side); use "lgmres" or "bicgstab"')
+    M = self.fd_preconditioner()
+    self.coeff_matrix_nnz = int(A.nnz)
+    rhs_norm = np.linalg.norm(rhs)
+    if rhs_norm == 0:
+      rhs_norm = 1.
+    self.iterative_residuals = []
+    # The methods do not pass their residual to the callback
+    def record_residual(xk):
+      self.iterative_residuals.append(np.linalg.norm(rhs - A.dot(xk)) / rhs_norm)
+    options = {'x0': x0, 'tol': self.iterative_ConvergenceTolerance, 'M': M,
+               'callback': record_residual}
+    if 'atol' in inspect.getargspec(method).args:
+      # Relative tolerance only
+      options['atol'] = 0
+    logger.log(VERBOSE, "Solving iteratively with %s and preconditioner %s\n"
+                        "Converging to a relative residual of %s",
+               self.IterativeMethod, self.Preconditioner, self.iterative_ConvergenceTolerance)
+    x, info = method(A, rhs, **options)
+    self.iterative_iterations = len(self.iterative_residuals)
+    if info > 0:
+      logger.error("Iterative solution did not converge in %s iterations; relative residual %s",
+                   info, self.iterative_residuals[-1] if self.iterative_residuals else None)
+      sys.exit("Exiting. Try another Preconditioner or IterativeMethod, a larger "
+               "ConvergenceTolerance, or the direct solver.")
+    elif info < 0:
+      logger.error("Iterative solution broke down")
+      sys.exit("Exiting. Try another IterativeMethod or Preconditioner.")
+    if self.IterativeMethod == 'lgmres':
+      logger.log(VERBOSE, "Iterations: %s (outer cycles)", self.iterative_iterations)
+    else:
+      logger.log(VERBOSE, "Iterations: %s", self.iterative_iterations)
+    return x
+
+  def run_batch(self, qs_stack):
+    """
+    w_stack = run_batch(qs_stack)
+    
+    Finite difference solutions for a stack of loads on the same plate, 
+    shaped (n_loads, nx) in 1D or (n_loads, ny, nx) in 2D. Call it in place 
+    of run(), after initialize() and before finalize(); as for run(), a load 
+    (e.g., qs = qs_stack[0]) must be set before initialize().
+    
+    The coefficient matrix is built once (BC_selector_and_coeff_matrix_creator)
+    and, for the direct solver, factored once; all loads are then solved 
+    together as a multi-column right-hand side. The iterative solver reuses 
+    the operator and solves the loads one at a time.
+    
+    Returns the stacked deflections, which are also kept in self.w_stack.
+    self.qs and self.w are set to the last load and its deflection.
+    """
+    qs_stack = np.asarray(qs_stack, dtype=float)
+    if self.Method != 'FD':
+      sys.exit('Error: run_batch requires the finite difference method ("FD")')
+    if qs_stack.ndim != self.dimension + 1:
+      sys.exit("Error: run_batch needs a stack of "+str(self.dimension)+"D load arrays; array shape is "+str(qs_stack.shape))
+    self.qs = qs_stack[-1].copy()
+    self.bc_check()
+    self.solver_start_time = time.time()
+    with self.phase('configuration'):
+      Flexure.FD(self)
+    self.fd_operator()
+    # One column per load; C-order flattening of each grid, as in fd_solve
+    rhs = qs_stack.reshape(qs_stack.shape[0], -1).T
+    with self.phase('solve'):
+      if self.Solver == "iterative" or self.Solver == "Iterative":
+        # One preconditioner for all loads
+        wvectors = np.empty(rhs.shape)
+        for i in range(rhs.shape[1]):
+          wvectors[:,i] = self.fd_iterative_solve(rhs[:,i])
+      else:
+        wvectors = self.fd_direct_solve(rhs)
+    # - b/c pos load leads to neg (downward) deflection
+    self.w_stack = -wvectors.T.reshape(qs_stack.shape)
+    self.w = self.w_stack[-1].copy()
+    self.time_to_solve = time.time() - self.solver_start_time
+    logger.info('Time to solve %s loads [s]: %s', qs_stack.shape[0], self.time_to_solve,
+                extra={'timer': 'time_to_solve', 'seconds': self.time_to_solve})
+    return self.w_stack
+
+  def run_infill(self):
+    """
+    w = run_infill()
+    
+    Self-consistent infill: loads from water or sediment (of density 
+    rho_fill) that fill the flexural basin up to SeaLevel. Call it in place 
+    of run(), after initialize() and before finalize(), with:
+      Topography: surface elevation [m] before the loads qs are applied; a 
+                  grid of the shape of qs, or the path to one
+      SeaLevel: elevation of the infill surface [m]; defaults to 0
+    
+    Wherever the deflected surface, Topography + w, lies below SeaLevel, it 
+    is filled up to it; the infill load is the change in the weight of the 
+    fill from that on the undeflected Topography:
+    
+      q_fill = rho_fill g (max(SeaLevel - Topography - w, 0) 
+                           - max(SeaLevel - Topography, 0))
+    
+    Because the fill is placed only where it belongs, rather than 
+    everywhere (as in the usual drho = rho_m - rho_fill), the plate is 
+    solved with drho = rho_m.
+    
+    The deflections of qs + q_fill are found by fixed-point iteration: 
+    load --> deflection --> infill load. The operator is built once: the 
+    finite difference factorization (or preconditioner) and the SAS 
+    unit-load solution are reused for every iteration. The iteration is 
+    accelerated as chosen by InfillAcceleration:
+      'anderson' (default): Anderson mixing of the last InfillMemory 
+                            (default 5) iterates
+      'aitken': Aitken (Irons-Tuck) relaxation
+      'none': plain fixed-point iteration
+    It stops when the largest change in w, relative to the largest 
+    deflection, falls below InfillTolerance (default 1E-6), or after 
+    InfillMaxIterations (default 100).
+    
+    The number of iterations and the relative change after each one are 
+    kept in self.infill_iterations and self.infill_residuals (and in the 
+    run report), and the infill load [Pa] in self.infill_load. self.qs is 
+    left as the loads without the infill.
+    """
+    if self.Method not in ('FD', 'FFT', 'SAS'):
+      sys.exit('Error: run_infill requires a gridded solution method ("FD", "FFT", or "SAS")')
+    # Settings
+    try:
+      self.Topography
+    except:
+      self.Topography = None
+      if self.filename:
+        self.Topography = self.configGetIfSet("string", "input", "Topography")
+    if type(self.Topography) == str:
+      self.Topography = self.loadFile(self.Topography)
+    if self.Topography is None:
+      sys.exit("Error: run_infill requires Topography")
+    try:
+      self.SeaLevel
+    except:
+      self.SeaLevel = None
+      if self.filename:
+        self.SeaLevel = self.configGetIfSet("float", "parameter", "SeaLevel")
+    if self.SeaLevel is None:
+      self.SeaLevel = 0.
+    try:
+      self.InfillAcceleration
+    except:
+      self.InfillAcceleration = None
+      if self.filename:
+        self.InfillAcceleration = self.configGetIfSet("string", "numerical", "InfillAcceleration")
+    if not self.InfillAcceleration:
+      self.InfillAcceleration = 'anderson'
+    if self.InfillAcceleration not in ('anderson', 'aitken', 'none'):
+      sys.exit('InfillAcceleration must be "anderson", "aitken", or "none"')
+    for name, vartype, default in [('InfillMemory', 'int', 5), 
+                                   ('InfillTolerance', 'float', 1E-6), 
+                                   ('InfillMaxIterations', 'int', 100)]:
+      try:
+        getattr(self, name)
+      except:
+        setattr(self, name, None)
+        if self.filename:
+          setattr(self, name, self.configGetIfSet(vartype, "numerical", name))
+      if getattr(self, name) is None:
+        setattr(self, name, default)
+    
+    # First solution, for the loads alone, which also builds the operator; 
+    # the factorization is kept for the iterations
+    try:
+      CacheFactorization = self.CacheFactorization
+    except:
+      CacheFactorization = None
+      if self.filename and self.Method == 'FD':
+        CacheFactorization = self.configGetIfSet("bool", "numerical", "CacheFactorization")
+    self.CacheFactorization = True
+    self.drho = self.rho_m
+    # The infill can reach well beyond the loads, so the whole grid is solved
+    try:
+      CropWavelengths = self.CropWavelengths
+    except:
+      CropWavelengths = None
+      if self.filename and self.Method == 'FD':
+        CropWavelengths = self.configGetIfSet("float", "numerical", "CropWavelengths")
+    self.CropWavelengths = None
+    self.run()
+    qs = self.qs
+    z = np.asarray(self.Topography, dtype=float)
+    if z.shape != qs.shape:
+      sys.exit("Error: Topography shape "+str(z.shape)+" does not match the loads, "+str(qs.shape))
+    fill0 = np.maximum(self.SeaLevel - z, 0)
+    def infill_load(w):
+      return self.rho_fill * self.g * (np.maximum(self.SeaLevel - z - w, 0) - fill0)
+    def deflection(w):
+      # Solution for the loads plus the infill on deflection w
+      q = qs + infill_load(w)
+      if self.Method == 'FD':
+        rhs = q.reshape(-1)
+        if self.Solver == "iterative" or self.Solver == "Iterative":
+          x = self.fd_iterative_solve(rhs, -w.reshape(-1))
+        else:
+          x = self.fd_direct_solve(rhs)
+        return -x.reshape(q.shape)
+      elif self.Method == 'SAS':
+        return self.sas_superpose(q)
+      else:
+        self.qs = q
+        self.fft_solve()
+        return self.w
+    
+    w = self.w.copy()
+    self.infill_residuals = []
+    history = [] # (w, residual) of the last iterations, for Anderson mixing
+    omega = 1. # Aitken relaxation factor
+    residual = None
+    with self.phase('solve'):
+      for k in range(self.InfillMaxIterations):
+        w_next = deflection(w)
+        r = w_next - w
+        residual = np.max(np.abs(r)) / max(np.max(np.abs(w_next)), np.finfo(float).tiny)
+        self.infill_residuals.append(float(residual))
+        logger.log(VERBOSE, "Infill iteration %s: relative change in w %s", k+1, residual)
+        if residual < self.InfillTolerance:
+          w = w_next
+          break
+        if self.InfillAcceleration == 'anderson':
+          history.append((w, r))
+          history = history[-(self.InfillMemory+1):]
+          if len(history) > 1:
+            # Least-squares combination of the last iterates that minimizes 
+            # the residual (Anderson type II, no damping)
+            dW = np.column_stack([(history[i+1][0] - history[i][0]).ravel() for i in range(len(history)-1)])
+            dR = np.column_stack([(history[i+1][1] - history[i][1]).ravel() for i in range(len(history)-1)])
+            gamma = np.linalg.lstsq(dR, r.ravel(), rcond=None)[0]
+            w = w + r - (dW + dR).dot(gamma).reshape(w.shape)
+          else:
+            w = w_next
+        elif self.InfillAcceleration == 'aitken':
+          if history:
+            dr = r - history[-1]
+            drdr = np.sum(dr*dr)
+            if drdr > 0:
+              omega = -omega * np.sum(history[-1]*dr) / drdr
+          history = [r]
+          w = w + omega * r
+        else:
+          w = w_next
+      else:
+        logger.warning("Infill iteration did not converge in %s iterations; relative change in w %s",
+                       self.InfillMaxIterations, residual)
+    self.infill_iterations = len(self.infill_residuals)
+    logger.info("Infill iterations: %s", self.infill_iterations)
+    self.infill_load = infill_load(w)
+    self.qs = qs
+    self.w = w
+    self.drho = self.rho_m - self.rho_fill
+    # Drop the factorization at finalize(), unless it was asked for
+    self.CacheFactorization = bool(CacheFactorization)
+    self.CropWavelengths = CropWavelengths
+    return self.w
+
   def FFT(self):
-    pass
+    """
+    Set-up for the spectral (fast Fourier transform) solution method.
+    Requires a constant elastic thickness.
+    """
+    logger.log(VERBOSE, "Fast Fourier Transform (spectral) Solution Technique")
+    if self.filename:
+      # Define the (scalar) elastic thickness; a constant grid is also OK
+      self.Te = self.configGet("float", "input", "ElasticThickness", optional=True)
+      if self.Te is None:
+        self.Te = self.loadFile(self.configGet("string", "input", "ElasticThickness"))
+    if type(self.Te) == np.ndarray:
+      if (self.Te != self.Te.flat[0]).any():
+        sys.exit("The FFT solution method requires a constant elastic thickness.\n"+
+                 "Use the FD method for variable Te. Exiting.")
+    # Define a stress-based qs = q0
+    # But only if the latter has not already been defined
+    # (e.g., by the getters and setters)
+    try:
+      self.qs
+    except:
+      self.qs = self.q0.copy()
+      # Remove self.q0 to avoid issues with multiply-defined inputs
+      # q0 is the parsable input to either a qs grid or contains (x,(y),q)
+      del self.q0
+    # x and y for plotting, as for FD
+    if self.dimension == 1:
+      self.x = np.arange(self.dx/2., self.dx * self.qs.shape[0], self.dx)
+    else:
+      self.x = np.arange(self.dx/2., self.dx * self.qs.shape[1], self.dx)
+      self.y = np.arange(self.dy/2., self.dy * self.qs.shape[0], self.dy)
+
+  def fft_pad_axis(self, q, axis, bc_lo, bc_hi, npad):
+    """
+    Extends the load array along one axis so that the periodic domain of 
+    the discrete Fourier transform represents the requested boundaries.
+    
+    bc_lo and bc_hi are the boundary conditions at the start and end of 
+    the axis (W/E or N/S):
+    * Periodic (both sides): no change
+    * NoOutsideLoads: pad with npad cells of zeros on that side
+    * Mirror: reflect the domain about the boundary cell, as is done by the 
+      finite difference Mirror boundary condition
+    
+    Returns the extended array and the index along this axis at which the 
+    original domain starts.
+    """
+    if bc_lo == 'Periodic' and bc_hi == 'Periodic':
+      return q, 0
+    pad_lo = npad if bc_lo == 'NoOutsideLoads' else 0
+    pad_hi = npad if bc_hi == 'NoOutsideLoads' else 0
+    mirror = bc_lo == 'Mirror' or bc_hi == 'Mirror'
+    if not mirror:
+      # Zero padding only: grow it to a length that the FFT handles quickly
+      from scipy.fftpack import next_fast_len
+      n = q.shape[axis] + pad_lo + pad_hi
+      if pad_hi:
+        pad_hi += next_fast_len(n) - n
+      else:
+        pad_lo += next_fast_len(n) - n
+    widths = [(0, 0)] * q.ndim
+    widths[axis] = (pad_lo, pad_hi)
+    q = np.pad(q, widths, 'constant')
+    if mirror:
+      # Whole-sample symmetric extension about the first and last cells; 
+      # any zero padding lies between the mirrored copies
+      reflected = q.take(np.arange(q.shape[axis]-2, 0, -1), axis=axis)
+      q = np.concatenate((q, reflected), axis=axis)
+    return q, pad_lo
 
   # SAS and SAS_NG are the exact same here; leaving separate just for symmetry 
   # with other functions
@@ -1001,7 +2671,13 @@ class Flexure(Utility, Plotting):
         # Remove self.q0 to avoid issues with multiply-defined inputs
         # q0 is the parsable input to either a qs grid or contains (x,(y),q)
         del self.q0
-      from scipy.special import kei
+    # Interpolate kei from a lookup table instead of computing it directly?
+    try:
+      self.TabulatedKernel
+    except:
+      self.TabulatedKernel = False
+      if self.filename:
+        self.TabulatedKernel = self.configGetIfSet("bool", "numerical", "TabulatedKernel")
 
   def SAS_NG(self):
     """
@@ -1018,8 +2694,29 @@ class Flexure(Utility, Plotting):
       # remain held for an eventual future.
       self.latlon = self.configGet("string", "numerical2D", "latlon", optional=True)
       self.PlanetaryRadius = self.configGet("float", "numerical2D", "PlanetaryRadius", optional=True)
-      if self.dimension == 2:
-        from scipy.special import kei
+    # Memory cap [MB] on each block of the load-to-output-point superposition
+    try:
+      self.MaxTileMemory
+    except:
+      self.MaxTileMemory = None
+      if self.filename:
+        self.MaxTileMemory = self.configGetIfSet("float", "numerical", "MaxTileMemory")
+    if self.MaxTileMemory is None:
+      self.MaxTileMemory = 64.
+    # Interpolate kei from a lookup table instead of computing it directly?
+    try:
+      self.TabulatedKernel
+    except:
+      self.TabulatedKernel = False
+      if self.filename:
+        self.TabulatedKernel = self.configGetIfSet("bool", "numerical", "TabulatedKernel")
+    # Optional truncation of the solution at this many flexural wavelengths
+    try:
+      self.CutoffWavelengths
+    except:
+      self.CutoffWavelengths = None
+      if self.filename:
+        self.CutoffWavelengths = self.configGetIfSet("float", "numerical", "CutoffWavelengths")
     # Parse out input q0 into variables of imoprtance for solution
     if self.dimension == 1:
       try:
@@ -1037,7 +2734,7 @@ class Flexure(Utility, Plotting):
       try:
         # If these have already been set, e.g., by getters/setters, great!
         self.x
-        self.u
+        self.y
         self.q
       except:
         # Using [x, y, w] configuration file
@@ -1,43 +1,46 @@
 from __future__ import division # No automatic floor division
 from base import *
-from scipy.sparse import spdiags
-from scipy.sparse.linalg import spsolve, isolve
 
 class F1D(Flexure):
   def initialize(self, filename=None):
     self.dimension = 1 # Set it here in case it wasn't set for selection before
-    super(F1D, self).initialize()
-    if self.Verbose: print 'F1D initialized'
+    self.phase_reset()
+    with self.phase('configuration'):
+      super(F1D, self).initialize(filename)
+    logger.log(VERBOSE, 'F1D initialized')
 
   def run(self):
     self.bc_check()
     self.solver_start_time = time.time()
-    if self.Method == 'FD':
-      # Finite difference
-      super(F1D, self).FD()
-      self.method_func = self.FD
-    elif self.Method == 'FFT':
-      # Fast Fourier transform
-      super(F1D, self).FFT()
-      self.method_func = self.FFT
-    elif self.Method == "SAS":
-      # Superposition of analytical solutions
-      super(F1D, self).SAS()
-      self.method_func = self.SAS
-    elif self.Method == "SAS_NG":
-      # Superposition of analytical solutions,
-      # nonuniform points
-      super(F1D, self).SAS_NG()
-      self.method_func = self.SAS_NG
-    else:
-      sys.exit('Error: method must be "FD", "FFT", "SAS", or "SAS_NG"')
+    # Set-up for the solution method
+    with self.phase('configuration'):
+      if self.Method == 'FD':
+        # Finite difference
+        super(F1D, self).FD()
+        self.method_func = self.FD
+      elif self.Method == 'FFT':
+        # Fast Fourier transform
+        super(F1D, self).FFT()
+        self.method_func = self.FFT
+      elif self.Method == "SAS":
+        # Superposition of analytical solutions
+        super(F1D, self).SAS()
+        self.method_func = self.SAS
+      elif self.Method == "SAS_NG":
+        # Superposition of analytical solutions,
+        # nonuniform points
+        super(F1D, self).SAS_NG()
+        self.method_func = self.SAS_NG
+      else:
+        sys.exit('Error: method must be "FD", "FFT", "SAS", or "SAS_NG"')
 
-    if self.Verbose: print 'F1D run'
-    self.method_func()
+    logger.log(VERBOSE, 'F1D run')
+    with self.phase('solve'):
+      self.method_func()
 
     self.time_to_solve = time.time() - self.solver_start_time
-    if self.Quiet == False:
-      print 'Time to solve [s]:', self.time_to_solve
+    logger.info('Time to solve [s]: %s', self.time_to_solve,
+                extra={'timer': 'time_to_solve', 'seconds': self.time_to_solve})
 
   def finalize(self):
     # If elastic thickness has been padded, return it to its original
@@ -47,7 +50,7 @@ class F1D(Flexure):
       self.Te = self.Te_unpadded
     except:
       pass
-    if self.Verbose: print 'F1D finalized'
+    logger.log(VERBOSE, 'F1D finalized')
     super(F1D, self).finalize()   
     
   ########################################
@@ -55,19 +58,131 @@ class F1D(Flexure):
   ########################################
   
   def FD(self):
+    cropped = self.fd_crop() # With CropWavelengths, only around the loads
+    self.fd_operator()
+    self.fd_solve() # Get the deflection, "w"
+    if cropped:
+      self.fd_uncrop()
+
+  def fd_operator(self):
     self.gridded_x()
     # Only generate coefficient matrix if it is not already provided
     if self.coeff_matrix is not None:
       pass
+    elif self.Solver == "banded" or self.Solver == "Banded":
+      # Diagonals only: O(nx) to build, so not worth caching
+      self.elasprepFD()
+      self.BC_selector_and_coeff_matrix_creator()
+    elif self.CacheFactorization and self.fd_cache_lookup():
+      pass # Same inputs as the last run: operator restored from cache
+    elif self.OperatorCacheDir and self.fd_disk_cache_load():
+      # Built by an earlier run (or process) with the same inputs
+      if self.CacheFactorization:
+        self.fd_cache_store()
     else:
       self.elasprepFD() # define dx4 and D within self
       self.BC_selector_and_coeff_matrix_creator()
-    self.fd_solve() # Get the deflection, "w"
+      if self.CacheFactorization:
+        self.fd_cache_store()
+      if self.OperatorCacheDir:
+        self.fd_disk_cache_store()
 
-  def FFT(self):
-    if self.plotChoice:
+  def run_profiles(self, qs_profiles, Te_profiles=None, BC_W=None, BC_E=None):
+    """
+    w_profiles = run_profiles(qs_profiles, Te_profiles=None, BC_W=None, BC_E=None)
+    
+    Finite difference solutions for many independent profiles at once 
+    (e.g., cross-sections across a basin), each with its own loads, Te, and 
+    boundary conditions. Call it in place of run(), after initialize() and 
+    before finalize(); as for run(), a load (e.g., qs = qs_profiles) must be 
+    set before initialize().
+    
+    qs_profiles: loads, shaped (n_profiles, nx)
+    Te_profiles: elastic thickness, shaped (n_profiles, nx), or (nx,) or 
+                 scalar for all profiles; defaults to self.Te (e.g., 
+                 ElasticThickness in the configuration file)
+    BC_W, BC_E: boundary conditions: one for all profiles, or a list with 
+                one per profile; default to self.BC_W and self.BC_E
+    
+    The coefficients of all profiles that share boundary conditions are 
+    computed together, with the profiles along a second array axis, and 
+    their pentadiagonal systems are solved in one call (see banded_solve).
+    
+    Returns the deflections, shaped (n_profiles, nx), which are also kept 
+    in self.w_profiles (and self.w).
+    """
+    qs_profiles = np.asarray(qs_profiles, dtype=float)
+    if self.Method != 'FD':
+      sys.exit('Error: run_profiles requires the finite difference method ("FD")')
+    if qs_profiles.ndim != 2:
+      sys.exit("Error: run_profiles needs loads shaped (n_profiles, nx); array shape is "+str(qs_profiles.shape))
+    nprofiles, nx = qs_profiles.shape
+    try:
+      BCs_set = (self.BC_W, self.BC_E)
+    except:
+      BCs_set = None
+    if BC_W is None:
+      BC_W = self.BC_W
+    if BC_E is None:
+      BC_E = self.BC_E
+    if type(BC_W) == str:
+      BC_W = [BC_W] * nprofiles
+    if type(BC_E) == str:
+      BC_E = [BC_E] * nprofiles
+    if len(BC_W) != nprofiles or len(BC_E) != nprofiles:
+      sys.exit("Error: run_profiles needs one boundary condition per profile")
+    self.solver_start_time = time.time()
+    self.qs = qs_profiles
+    if Te_profiles is not None:
+      self.Te = Te_profiles
+    try:
+      self.Solver
+    except:
+      self.Solver = 'banded' # The only solver used here
+    with self.phase('configuration'):
+      super(F1D, self).FD() # Te from the configuration file, if it is there
+    if Te_profiles is None:
+      Te_profiles = self.Te
+    Te = np.asarray(Te_profiles, dtype=float)
+    if Te.ndim > 0 and Te.shape != (nx,) and Te.shape != qs_profiles.shape:
+      sys.exit("Error: run_profiles needs Te as a scalar, shaped (nx,) for all profiles, "
+               "or shaped (n_profiles, nx); loads "+str(qs_profiles.shape)+", Te "+str(Te.shape))
+    Te = np.broadcast_to(Te, qs_profiles.shape)
+    self.w_profiles = np.empty(qs_profiles.shape)
+    for BCs in sorted(set(zip(BC_W, BC_E))):
+      group = np.array([i for i in range(nprofiles) if (BC_W[i], BC_E[i]) == BCs])
+      self.BC_W, self.BC_E = BCs
+      self.coeff_matrix = None
+      self.bc_check()
+      # Profiles along the second axis
+      self.qs = qs_profiles[group].T
+      self.Te = Te[group].T.copy()
       self.gridded_x()
-    sys.exit("The fast Fourier transform solution method is not yet implemented.")
+      self.elasprepFD()
+      self.BC_selector_and_coeff_matrix_creator()
+      # qs negative so bends down with positive load, bends up with neative load 
+      # (i.e. material removed)
+      with self.phase('solve'):
+        self.w_profiles[group] = self.banded_solve(-self.qs).T
+    if BCs_set:
+      self.BC_W, self.BC_E = BCs_set
+    self.qs = qs_profiles
+    self.Te = Te_profiles
+    try:
+      del self.Te_unpadded
+    except:
+      pass
+    self.x = np.arange(self.dx/2., self.dx * nx, self.dx)
+    self.w = self.w_profiles
+    self.time_to_solve = time.time() - self.solver_start_time
+    logger.info('Time to solve %s profiles [s]: %s', nprofiles, self.time_to_solve,
+                extra={'timer': 'time_to_solve', 'seconds': self.time_to_solve})
+    return self.w_profiles
+
+  def FFT(self):
+    self.gridded_x()
+    self.elasprepFD() # define D within self
+    self.fft_solve()
     
   def SAS(self):
     self.gridded_x()
@@ -106,16 +221,23 @@ class F1D(Flexure):
 
   def spatialDomainGridded(self):
   
-    self.w = np.zeros(self.nx) # Deflection array
-    
-    for i in range(self.nx):
-      # Loop over locations that have loads, and sum
-      if self.qs[i]:
-        dist = abs(self._x_local[i]-self._x_local)
-        # -= b/c pos load leads to neg (downward) deflection
-        self.w -= self.qs[i] * self.coeff * self.dx * np.exp(-dist/self.alpha) * \
-          (np.cos(dist/self.alpha) + np.sin(dist/self.alpha))
+    # Solution for a unit load at the center of a grid of twice the size,
+    # so exp/cos/sin are evaluated only once
+    dist = np.abs(np.arange(-self.nx, self.nx+1)) * self.dx
+    # Kept for incremental updates (see BMI.bmi_solve)
+    self.sas_kernel = self.coeff * self.dx * np.exp(-dist/self.alpha) * \
+      (np.cos(dist/self.alpha) + np.sin(dist/self.alpha))
+    self.w = self.sas_superpose(self.qs)
     # No need to return: w already belongs to "self"
+
+  def sas_superpose(self, qs):
+    """
+    Deflections due to the gridded loads qs, from the unit-load solution 
+    of the last spatialDomainGridded
+    """
+    # Sum over all loaded cells, done as an FFT convolution
+    # - b/c pos load leads to neg (downward) deflection
+    return -self.superpose_kernel(qs, self.sas_kernel)
     
 
   # NONUNIFORM DX (NO GRID): ARBITRARILY-SPACED POINT LOADS
@@ -125,19 +247,64 @@ class F1D(Flexure):
     """
     Superposition of analytical solutions without a gridded domain
     """
-    self.w = np.zeros(self.xw.shape)
+    logger.debug("w = \n%s", self.xw.shape)
+    
+    # More efficient if we have created some 0-load points
+    # (e.g., for where we want output): skip these
+    loaded = self.q != 0
+    x = self.x[loaded]
+    q = self.q[loaded]
+    xw = self.xw.ravel()
+    
+    def green(dist):
+      return np.exp(-dist) * ( np.cos(dist) + np.sin(dist) )
+    
+    if self.CutoffWavelengths:
+      # Truncate at CutoffWavelengths flexural wavelengths: only nearby 
+      # loads, found with a KD-tree, are summed. The error at any point is 
+      # at most coeff * max(|green|, beyond cutoff) * sum(|q|)
+      radius = self.CutoffWavelengths * 2*np.pi*self.alpha
+      def kernel(i, j, d):
+        return green(d/self.alpha)
+      w = self.superpose_neighbors(kernel, xw[:,np.newaxis], x[:,np.newaxis], q, radius)
+      self.SAS_NG_truncation_error = np.abs(self.coeff) * np.sum(np.abs(q)) \
+                                     * self.kernel_tail_bound(green, radius/self.alpha)
+      logger.info('SAS_NG truncated at %s flexural wavelengths ( %s m )\n'
+                  'Truncation error bound [m]: %s', self.CutoffWavelengths, radius, 
+                  self.SAS_NG_truncation_error)
+    else:
+      def kernel(out_slice, load_slice):
+        return green(np.abs(xw[out_slice,np.newaxis] - x[np.newaxis,load_slice]) / self.alpha)
+      w = self.superpose_points(kernel, xw.size, q, ntemp=5)
+    
+    # - b/c pos load leads to neg (downward) deflection
+    self.w = -self.coeff * w.reshape(self.xw.shape)
+
+  ## SPECTRAL (FAST FOURIER TRANSFORM)
+  #####################################
 
-    if self.Debug:
-      print "w = "
-      print self.w.shape
+  def fft_solve(self):
+    """
+    w = fft_solve()
+    
+    Spectral solution for flexure with constant elastic thickness:
+    
+      w_hat = -q_hat / (D k^4 + drho g)
     
-    for i in range(len(self.q)):
-      # More efficient if we have created some 0-load points
-      # (e.g., for where we want output)
-      if self.q[i] != 0:
-        dist = np.abs(self.xw - self._x_local[i])
-        self.w -= self.q[i] * self.coeff * np.exp(-dist/self.alpha) * \
-          ( np.cos(dist/self.alpha) + np.sin(dist/self.alpha) )
+    using numpy's real FFT: O(N log N) in time and O(N) in memory.
+    The domain is periodic; Mirror and NoOutsideLoads boundaries are made by 
+    padding the loads (see fft_pad_axis) by one maximum flexural wavelength.
+    """
+    self.D = float(np.asarray(self.D).flat[0])
+    self.calc_max_flexural_wavelength()
+    q, i0 = self.fft_pad_axis(self.qs, 0, self.BC_W, self.BC_E,
+                              self.maxFlexuralWavelength_ncells)
+    n = q.shape[0]
+    k = 2*np.pi*np.fft.rfftfreq(n, self.dx)
+    # qs negative so bends down with positive load, bends up with neative load 
+    # (i.e. material removed)
+    w = np.fft.irfft(-np.fft.rfft(q) / (self.D*k**4 + self.drho*self.g), n)
+    self.w = w[i0:i0+self.nx]
 
   ## FINITE DIFFERENCE
   ######################
@@ -161,28 +328,31 @@ class F1D(Flexure):
     
     # Zeroth, start the timer and print the boundary conditions to the screen
     self.coeff_start_time = time.time()
-    if self.Verbose:
-      print "Boundary condition, West:", self.BC_W, type(self.BC_W)
-      print "Boundary condition, East:", self.BC_E, type(self.BC_E)
+    logger.log(VERBOSE, "Boundary condition, West: %s %s\nBoundary condition, East: %s %s",
+               self.BC_W, type(self.BC_W), self.BC_E, type(self.BC_E))
 
     # First, set flexural rigidity boundary conditions to flesh out this padded
     # array
-    self.BC_Rigidity()
+    with self.phase('BC_Rigidity'):
+      self.BC_Rigidity()
     
     # Second, build the coefficient arrays -- with the rigidity b.c.'s
-    self.get_coeff_values()
+    with self.phase('get_coeff_values'):
+      self.get_coeff_values()
 
     # Third, apply boundary conditions to the coeff_arrays to create the 
     # flexural solution
-    self.BC_Flexure()
+    with self.phase('BC_Flexure'):
+      self.BC_Flexure()
     
     # Fourth, construct the sparse diagonal array
-    self.build_diagonals()
+    with self.phase('build_diagonals'):
+      self.build_diagonals()
     
     # Finally, compute the total time this process took    
     self.coeff_creation_time = time.time() - self.coeff_start_time
-    if self.Quiet == False:
-      print 'Time to construct coefficient (operator) array [s]:', self.coeff_creation_time
+    logger.info('Time to construct coefficient (operator) array [s]: %s', self.coeff_creation_time,
+                extra={'timer': 'coeff_creation_time', 'seconds': self.coeff_creation_time})
 
   def BC_Rigidity(self):
     """
@@ -224,7 +394,9 @@ class F1D(Flexure):
     # response with variable Te. We'll keep everything simpler here and 
     # just pad this array so it can be sent through the same process
     # to create the coefficient arrays.
-    self.D = np.hstack([np.nan, self.D, np.nan])
+    # (Along the first axis: there may be a second axis of profiles; see 
+    # run_profiles)
+    self.D = np.concatenate((np.nan*self.D[:1], self.D, np.nan*self.D[:1]))
 
     ###############################################################
     # APPLY FLEXURAL RIGIDITY BOUNDARY CONDITIONS TO PADDED ARRAY #
@@ -301,9 +473,8 @@ class F1D(Flexure):
     # http://scicomp.stackexchange.com/questions/5355/writing-the-poisson-equation-finite-difference-matrix-with-neumann-boundary-cond
     # http://scicomp.stackexchange.com/questions/7175/trouble-implementing-neumann-boundary-conditions-because-the-ghost-points-cannot
     
-    if self.Verbose:
-      print "Boundary condition, West:", self.BC_W, type(self.BC_W)
-      print "Boundary condition, East:", self.BC_E, type(self.BC_E)
+    logger.log(VERBOSE, "Boundary condition, West: %s %s\nBoundary condition, East: %s %s",
+               self.BC_W, type(self.BC_W), self.BC_E, type(self.BC_E))
 
     # In 2D, these are handled inside the function; in 1D, there are separate
     # defined functions. Keeping these due to inertia and fear of cut/paste
@@ -335,10 +506,10 @@ class F1D(Flexure):
     # arrays: Python will naturally just do vertical shifts instead of 
     # diagonal shifts, so this takes into account the horizontal compoent 
     # to ensure that boundary values are at the right place.
-    self.l2 = np.roll(self.l2, -2)
-    self.l1 = np.roll(self.l1, -1)
-    self.r1 = np.roll(self.r1, 1)
-    self.r2 = np.roll(self.r2, 2)
+    self.l2 = np.roll(self.l2, -2, axis=0)
+    self.l1 = np.roll(self.l1, -1, axis=0)
+    self.r1 = np.roll(self.r1, 1, axis=0)
+    self.r2 = np.roll(self.r2, 2, axis=0)
 
     # Then assemble these rows: this is where the periodic boundary condition 
     # can matter.
@@ -351,11 +522,17 @@ class F1D(Flexure):
       # the solution array
       pass
     else:
-      self.diags = np.vstack((self.l2,self.l1,self.c0,self.r1,self.r2))
+      self.diags = np.array((self.l2,self.l1,self.c0,self.r1,self.r2))
       self.offsets = np.array([-2,-1,0,1,2])
 
     # Everybody now (including periodic b.c. cases)
-    self.coeff_matrix = spdiags(self.diags, self.offsets, self.nx, self.nx, format='csr')
+    if self.Solver == "banded" or self.Solver == "Banded" or self.c0.ndim == 2:
+      # The banded solver works from self.diags and self.offsets directly
+      # (always the case for many profiles at once; see run_profiles)
+      pass
+    else:
+      from scipy.sparse import spdiags
+      self.coeff_matrix = spdiags(self.diags, self.offsets, self.nx, self.nx, format='csr')
   
   def BC_Periodic(self):
     """
@@ -375,7 +552,7 @@ class F1D(Flexure):
                "be fixed and not include an implicit periodic boundary\n"+
                "condition makes no physical sense.\n"+
                "Please fix the input boundary conditions. Aborting.")
-    self.diags = np.vstack((self.r1,self.r2,self.l2,self.l1,self.c0,self.r1,self.r2,self.l2,self.l1))
+    self.diags = np.array((self.r1,self.r2,self.l2,self.l1,self.c0,self.r1,self.r2,self.l2,self.l1))
     self.offsets = np.array([1-self.ncolsx,2-self.ncolsx,-2,-1,0,1,2,self.ncolsx-2,self.ncolsx-1])
 
   def BC_0Displacement0Slope(self):
@@ -567,37 +744,117 @@ class F1D(Flexure):
     Sparse solver for one-dimensional flexure of an elastic plate
     """
     
-    if self.Debug:
-      print 'qs', self.qs.shape
-      print 'Te', self.Te.shape
+    if logger.isEnabledFor(logging.DEBUG):
       self.calc_max_flexural_wavelength()
-      print 'maxFlexuralWavelength_ncells', self.maxFlexuralWavelength_ncells
+      logger.debug('qs %s\nTe %s\nmaxFlexuralWavelength_ncells %s', self.qs.shape, 
+                   self.Te.shape, self.maxFlexuralWavelength_ncells)
     
     if self.Solver == "iterative" or self.Solver == "Iterative":
-      if self.Debug:
-        print "Using generalized minimal residual method for iterative solution"
-      if self.Verbose:
-        print "Converging to a tolerance of", self.iterative_ConvergenceTolerance, "m between iterations"
+      # Warm start from the previous solution on this grid, if there is one
+      try:
+        x0 = self.w
+        if x0.shape != self.qs.shape:
+          x0 = None
+      except:
+        x0 = None
       # qs negative so bends down with positive load, bends up with neative load 
       # (i.e. material removed)
-      w = isolve.lgmres(self.coeff_matrix, -self.qs, tol=self.iterative_ConvergenceTolerance)  
-      self.w = w[0] # Reach into tuple to get my array back
+      self.w = self.fd_iterative_solve(-self.qs, x0)
     else:
       if self.Solver == "direct" or self.Solver == "Direct":
-        if self.Debug:
-          print "Using direct solution with UMFpack"
+        logger.debug("Using direct solution with UMFpack")
+      elif self.Solver == "banded" or self.Solver == "Banded":
+        logger.debug("Using direct solution with LAPACK banded solver")
       else:
-        print "Solution type not understood:"
-        print "Defaulting to direct solution with UMFpack"
-      # UMFpack is now the default, but setting true just to be sure in case
-      # anything changes
+        logger.warning("Solution type not understood:\n"
+                       "Defaulting to direct solution with UMFpack")
       # qs negative so bends down with positive load, bends up with neative load 
       # (i.e. material removed)
-      self.w = spsolve(self.coeff_matrix, -self.qs, use_umfpack=True)
+      self.w = self.fd_direct_solve(-self.qs)
     
-    if self.Debug:
-      print "w.shape:"
-      print self.w.shape
-      print "w:"
-      print self.w
+    logger.debug("w.shape:\n%s", self.w.shape)
+    array_logger.debug("w:\n%s", self.w)
     
+
+  def fd_direct_solve(self, rhs):
+    """
+    Direct solution of coeff_matrix * w = rhs.
+    With Solver = "banded", there is no coefficient matrix: the system is 
+    solved from the diagonals by banded_solve instead.
+    """
+    if self.coeff_matrix is None:
+      return self.banded_solve(rhs)
+    else:
+      return super(F1D, self).fd_direct_solve(rhs)
+
+  def banded_solve(self, rhs):
+    """
+    Solves the pentadiagonal system from its diagonals (self.diags, at 
+    self.offsets, as built for spdiags) with LAPACK, in O(nx) time and 
+    without building a sparse matrix. rhs may have one column per load.
+    The diagonals may also have a second axis of profiles, with one 
+    column of rhs for each (see run_profiles); the profiles are placed end 
+    to end, uncoupled, in one banded system and solved in a single call.
+    
+    The diagonals are placed in LAPACK banded storage. If the matrix is 
+    symmetric (e.g., constant Te with symmetric boundary conditions), the 
+    Cholesky-based solveh_banded is tried first; otherwise (or if it is not 
+    positive definite), solve_banded (LU) is used.
+    
+    Periodic boundary conditions add wrap-around entries in the corners of 
+    the matrix. These are removed from the band and added back as a 
+    low-rank correction (Sherman-Morrison-Woodbury): A = B + U C, where 
+    U selects the (up to four) edge rows and C holds their corner entries, 
+    so that
+      A^-1 b = y - Z (I + C Z)^-1 C y,  with y = B^-1 b and Z = B^-1 U
+    and B^-1 is applied to b and U together, in a single banded solve.
+    """
+    from scipy.linalg import solve_banded, solveh_banded, LinAlgError
+    n = self.nx
+    diags = self.diags.reshape(len(self.offsets), n, -1)
+    nprofiles = diags.shape[2]
+    # ab[2 - offset, p, j] holds the entry of profile p at row j - offset, 
+    # column j
+    ab = np.zeros((5, nprofiles, n))
+    corner_rows = []
+    corner_cols = []
+    corner_vals = []
+    for diag, offset in zip(diags, self.offsets):
+      cols = np.arange(max(offset, 0), min(n, n + offset))
+      if abs(offset) <= 2:
+        ab[2 - offset][:, cols] += diag[cols].T
+      else:
+        corner_rows.append(cols - offset)
+        corner_cols.append(cols)
+        corner_vals.append(diag[cols])
+    ab = ab.reshape(5, -1)
+    b = rhs.reshape(n, nprofiles, -1).transpose(1, 0, 2).reshape(nprofiles*n, -1)
+    nrhs = b.shape[1]
+    if len(corner_rows):
+      corner_rows = np.hstack(corner_rows)
+      corner_cols = np.hstack(corner_cols)
+      corner_vals = np.vstack(corner_vals)
+      rows = np.unique(corner_rows)
+      C = np.zeros((nprofiles, len(rows), n))
+      C[:, np.searchsorted(rows, corner_rows), corner_cols] = corner_vals.T
+      # The profiles are uncoupled, so each column of U can hold the same 
+      # edge row for all of them
+      U = np.zeros((nprofiles, n, len(rows)))
+      U[:, rows, np.arange(len(rows))] = 1.
+      b = np.hstack((b, U.reshape(nprofiles*n, -1)))
+    symmetric = np.array_equal(ab[1, 1:], ab[3, :-1]) and np.array_equal(ab[0, 2:], ab[4, :-2])
+    x = None
+    if symmetric:
+      try:
+        x = solveh_banded(ab[:3], b, check_finite=False)
+      except LinAlgError:
+        pass
+    if x is None:
+      x = solve_banded((2, 2), ab, b, check_finite=False)
+    x = x.reshape(nprofiles, n, -1)
+    if len(corner_rows):
+      y = x[:, :, :nrhs]
+      Z = x[:, :, nrhs:]
+      CZ = np.matmul(C, Z) + np.eye(len(rows))
+      x = y - np.matmul(Z, np.linalg.solve(CZ, np.matmul(C, y)))
+    return x.transpose(1, 0, 2).reshape(rhs.shape)
@@ -1,47 +1,65 @@
 from __future__ import division # No automatic floor division
 from base import *
-import scipy
-from scipy.special import kei
+from collections import OrderedDict
+import threading
 
 # class F2D inherits Flexure and overrides __init__ therefore setting up the same
 # three parameters as class Isostasy; and it then sets up more parameters specific
 # to its own type of simulation.
 class F2D(Flexure):
+
+  # kei lookup table for TabulatedKernel = True. kei is tabulated as a 
+  # function of r/alpha, so one table (built on first use) serves every Te
+  kei_table_spacing = 1/128.
+  kei_table_min = 0.25
+  kei_table_max = 40.
+  kei_table = None
+  # Gridded SAS unit-load solutions, least recently used first
+  sas_kernel_cache = OrderedDict()
+  sas_kernel_cache_size = 4
+  # Held while the cache is looked up or changed, for runs in several threads
+  sas_kernel_cache_lock = threading.Lock()
+
   def initialize(self, filename=None):
     self.dimension = 2 # Set it here in case it wasn't set for selection before
-    super(F2D, self).initialize()
-    if self.Verbose: print 'F2D initialized'
+    self.phase_reset()
+    with self.phase('configuration'):
+      super(F2D, self).initialize(filename)
+    logger.log(VERBOSE, 'F2D initialized')
 
   def run(self):
     self.bc_check()
     self.solver_start_time = time.time()
       
-    if self.Method == 'FD':
-      # Finite difference
-      super(F2D, self).FD()
-      self.method_func = self.FD
-    elif self.Method == 'FFT':
-      # Fast Fourier transform
-      super(F2D, self).FFT()
-      self.method_func = self.FFT
-    elif self.Method == "SAS":
-      # Superposition of analytical solutions
-      super(F2D, self).SAS()
-      self.method_func = self.SAS
-    elif self.Method == "SAS_NG":
-      # Superposition of analytical solutions,
-      # nonuniform points (no grid)
-      super(F2D, self).SAS_NG()
-      self.method_func = self.SAS_NG
-    else:
-      sys.exit('Error: method must be "FD", "FFT", "SAS", or "SAS_NG"')
+    # Set-up for the solution method
+    with self.phase('configuration'):
+      if self.Method == 'FD':
+        # Finite difference
+        super(F2D, self).FD()
+        self.method_func = self.FD
+      elif self.Method == 'FFT':
+        # Fast Fourier transform
+        super(F2D, self).FFT()
+        self.method_func = self.FFT
+      elif self.Method == "SAS":
+        # Superposition of analytical solutions
+        super(F2D, self).SAS()
+        self.method_func = self.SAS
+      elif self.Method == "SAS_NG":
+        # Superposition of analytical solutions,
+        # nonuniform points (no grid)
+        super(F2D, self).SAS_NG()
+        self.method_func = self.SAS_NG
+      else:
+        sys.exit('Error: method must be "FD", "FFT", "SAS", or "SAS_NG"')
 
-    if self.Verbose: print 'F2D run'
-    self.method_func()
+    logger.log(VERBOSE, 'F2D run')
+    with self.phase('solve'):
+      self.method_func()
 
     self.time_to_solve = time.time() - self.solver_start_time
-    if self.Quiet == False:
-      print 'Time to solve [s]:', self.time_to_solve
+    logger.info('Time to solve [s]: %s', self.time_to_solve,
+                extra={'timer': 'time_to_solve', 'seconds': self.time_to_solve})
 
   def finalize(self):
     # If elastic thickness has been padded, return it to its original
@@ -51,7 +69,7 @@ class F2D(Flexure):
       self.Te = self.Te_unpadded
     except:
       pass
-    if self.Verbose: print 'F2D finalized'
+    logger.log(VERBOSE, 'F2D finalized')
     super(F2D, self).finalize()
     
   ########################################
@@ -59,16 +77,34 @@ class F2D(Flexure):
   ########################################
 
   def FD(self):
+    cropped = self.fd_crop() # With CropWavelengths, only around the loads
+    self.fd_operator()
+    self.fd_solve()
+    if cropped:
+      self.fd_uncrop()
+
+  def fd_operator(self):
     # Only generate coefficient matrix if it is not already provided
     if self.coeff_matrix is not None:
       pass
+    elif self.CacheFactorization and self.fd_cache_lookup():
+      pass # Same inputs as the last run: operator restored from cache
+    elif self.OperatorCacheDir and not self.MatrixFree and self.fd_disk_cache_load():
+      # Built by an earlier run (or process) with the same inputs
+      if self.CacheFactorization:
+        self.fd_cache_store()
     else:
       self.elasprep()
       self.BC_selector_and_coeff_matrix_creator()
-    self.fd_solve()
+      if self.CacheFactorization:
+        self.fd_cache_store()
+      # The matrix-free operator is rebuilt each time: it cannot be stored
+      if self.OperatorCacheDir and not self.MatrixFree:
+        self.fd_disk_cache_store()
 
   def FFT(self):
-    sys.exit("The fast Fourier transform solution method is not yet implemented.")
+    self.elasprep()
+    self.fft_solve()
 
   def SAS(self):
     self.spatialDomainVarsSAS()
@@ -94,6 +130,40 @@ class F2D(Flexure):
     self.alpha = (self.D/(self.drho*self.g))**.25 # 2D flexural parameter
     self.coeff = self.alpha**2/(2*np.pi*self.D)
 
+  def kei(self, x):
+    """
+    Kelvin function kei(x): from scipy.special, or, if TabulatedKernel is 
+    set, by cubic Hermite interpolation between tabulated values of kei and 
+    its derivative keip.
+    
+    Table nodes are spaced every 1/128 from x = 0.25 to 40, which keeps the 
+    absolute error below 1E-10 (|kei| <= pi/4). Below x = 0.25 the x**2 log(x) 
+    term in kei spoils the interpolation, so exact values are used; above 
+    x = 40, |kei| < 5E-14 and 0 is returned.
+    """
+    from scipy.special import kei, keip
+    if not getattr(self, 'TabulatedKernel', False):
+      return kei(x)
+    if F2D.kei_table is None:
+      h = self.kei_table_spacing
+      n = int(round((self.kei_table_max - self.kei_table_min)/h)) + 1
+      xn = self.kei_table_min + h*np.arange(n)
+      F2D.kei_table = (kei(xn), h*keip(xn))
+    f, hd = F2D.kei_table
+    x = np.asarray(x, dtype=float)
+    out = np.zeros(x.shape)
+    near = x < self.kei_table_min
+    out[near] = kei(x[near])
+    inside = ~near & (x < self.kei_table_max)
+    s = (x[inside] - self.kei_table_min) / self.kei_table_spacing
+    i = np.minimum(s.astype(int), len(f) - 2)
+    t = s - i
+    t2 = t*t
+    t3 = t2*t
+    out[inside] = (2*t3 - 3*t2 + 1) * f[i] + (t3 - 2*t2 + t) * hd[i] \
+                  + (3*t2 - 2*t3) * f[i+1] + (t3 - t2) * hd[i+1]
+    return out
+
   # GRIDDED
 
   def spatialDomainGridded(self):
@@ -109,55 +179,141 @@ class F2D(Flexure):
     # Prepare a large grid of solutions beforehand, so we don't have to
     # keep calculating kei (time-intensive!)
     # This pre-prepared solution will be for a unit load
-    bigshape = 2*self.ny+1,2*self.nx+1 # Tuple shape
-
-    dist_ny = np.arange(bigshape[0]) - self.ny
-    dist_nx = np.arange(bigshape[1]) - self.nx
-
-    dist_x,dist_y = np.meshgrid(dist_nx*self.dx,dist_ny*self.dy)
-
-    bigdist = np.sqrt(dist_x**2 + dist_y**2) # Distances from center
-                                          # Center at [ny,nx]
-    
-    biggrid = self.coeff * kei(bigdist/self.alpha) # Kelvin fcn solution
-
-    # Now compute the deflections
-    self.w = np.zeros((self.ny,self.nx)) # Deflection array
-    for i in range(self.nx):
-      for j in range(self.ny):
-        # Loop over locations that have loads, and sum
-        if self.qs[j,i]:
-          # Solve by summing portions of "biggrid" while moving origin
-          # to location of current cell
-          # Load must be multiplied by grid cell size
-          self.w += self.qs[j,i] * self.dx * self.dy \
-             * biggrid[self.ny-j:2*self.ny-j,self.nx-i:2*self.nx-i]
-      # No need to return: w already belongs to "self"
+    # With TabulatedKernel, these are kept for repeated runs on the same grid
+    key = (self.alpha, self.coeff, self.dx, self.dy, self.ny, self.nx)
+    biggrid = None
+    if self.TabulatedKernel:
+      with F2D.sas_kernel_cache_lock:
+        biggrid = F2D.sas_kernel_cache.pop(key, None)
+    if biggrid is None:
+      # The solution is symmetric about the center, at [ny,nx]: compute 
+      # one quadrant and mirror it
+      dist_x,dist_y = np.meshgrid(np.arange(self.nx+1)*self.dx,np.arange(self.ny+1)*self.dy)
+      dist = np.sqrt(dist_x**2 + dist_y**2) # Distances from center
+      quadrant = self.coeff * self.kei(dist/self.alpha) # Kelvin fcn solution
+      quadrant = np.hstack((quadrant[:,:0:-1], quadrant))
+      biggrid = np.vstack((quadrant[:0:-1], quadrant))
+    if self.TabulatedKernel:
+      with F2D.sas_kernel_cache_lock:
+        F2D.sas_kernel_cache[key] = biggrid
+        while len(F2D.sas_kernel_cache) > self.sas_kernel_cache_size:
+          F2D.sas_kernel_cache.popitem(last=False)
+
+    # Kept for incremental updates (see BMI.bmi_solve)
+    self.sas_kernel = biggrid
+    self.w = self.sas_superpose(self.qs)
+    # No need to return: w already belongs to "self"
+
+  def sas_superpose(self, qs):
+    """
+    Deflections due to the gridded loads qs, from the unit-load solution 
+    of the last spatialDomainGridded
+    """
+    # Sum of the unit-load solution with its origin moved to each loaded 
+    # cell, done as an FFT convolution
+    # Load must be multiplied by grid cell size
+    return self.superpose_kernel(qs * self.dx * self.dy, self.sas_kernel)
 
   # NO GRID
 
   def spatialDomainNoGrid(self):
 
-    self.w = np.zeros(self.xw.shape)
-    if self.Debug:
-      print "w = "
-      print self.w.shape
+    logger.debug("w = \n%s", self.xw.shape)
+    
+    # More efficient if we have created some 0-load points
+    # (e.g., for where we want output): skip these
+    loaded = self.q != 0
+    x = self.x[loaded]
+    y = self.y[loaded]
+    q = self.q[loaded]
+    xw = self.xw.ravel()
+    yw = self.yw.ravel()
+    
+    if self.CutoffWavelengths:
+      self.spatialDomainNoGridTruncated(x, y, q, xw, yw)
+      return
     
     if self.latlon:
-      for i in range(len(self._x_local)):
-        # More efficient if we have created some 0-load points
-        # (e.g., for where we want output)
-        if self.q[i] != 0:
-          # Create array of distances from point of load
-          r = self.greatCircleDistance(lat1=self._y_local[i], long1=self._x_local[i], lat2=self.yw, long2=self.xw, radius=self.PlanetaryRadius)
-          self.w += self.q[i] * self.coeff * kei(r/self.alpha)
-          # Compute and sum deflection
-          self.w += self.q[i] * self.coeff * kei(r/self.alpha)
+      def kernel(out_slice, load_slice):
+        # Great-circle distances between each output point and each load
+        r = self.greatCircleDistance(lat1=y[np.newaxis,load_slice], long1=x[np.newaxis,load_slice],
+                                     lat2=yw[out_slice,np.newaxis], long2=xw[out_slice,np.newaxis],
+                                     radius=self.PlanetaryRadius)
+        return self.kei(r/self.alpha)
+      ntemp = 8
     else:
-      for i in range(len(self._x_local)):
-        if self.q[i] != 0:
-          r = ( (self.xw - self._x_local[i])**2 + (self.yw - self._y_local[i])**2 )**.5
-          self.w += self.q[i] * self.coeff * kei(r/self.alpha)
+      def kernel(out_slice, load_slice):
+        r = np.hypot(xw[out_slice,np.newaxis] - x[np.newaxis,load_slice],
+                     yw[out_slice,np.newaxis] - y[np.newaxis,load_slice])
+        return self.kei(r/self.alpha)
+      ntemp = 4
+    
+    self.w = self.coeff * self.superpose_points(kernel, xw.size, q, ntemp)
+    self.w = self.w.reshape(self.xw.shape)
+
+  def spatialDomainNoGridTruncated(self, x, y, q, xw, yw):
+    """
+    SAS_NG with the kei solution truncated at CutoffWavelengths flexural 
+    wavelengths (2*pi*alpha): loads farther than this from an output point 
+    are skipped. Neighbours are found with a KD-tree, so the cost scales 
+    with the number of nearby load-output pairs instead of N_loads x N_out.
+    
+    The truncation error at any point is at most
+      coeff * max(|kei(r/alpha)|, r > cutoff) * sum(|q|)
+    which is stored in self.SAS_NG_truncation_error [m].
+    """
+    radius = self.CutoffWavelengths * 2*np.pi*self.alpha
+    if self.latlon:
+      # Search on the unit sphere, by chord length
+      def unit_sphere(lon, lat):
+        lon = np.radians(lon)
+        lat = np.radians(lat)
+        return np.column_stack((np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)))
+      chord = 2*np.sin(min(radius/self.PlanetaryRadius, np.pi)/2.)
+      def kernel(i, j, d):
+        r = self.greatCircleDistance(lat1=y[j], long1=x[j], lat2=yw[i], long2=xw[i], radius=self.PlanetaryRadius)
+        return self.kei(r/self.alpha)
+      w = self.superpose_neighbors(kernel, unit_sphere(xw, yw), unit_sphere(x, y), q, chord)
+    else:
+      def kernel(i, j, d):
+        return self.kei(d/self.alpha)
+      w = self.superpose_neighbors(kernel, np.column_stack((xw, yw)), np.column_stack((x, y)), q, radius)
+    self.w = (self.coeff * w).reshape(self.xw.shape)
+    self.SAS_NG_truncation_error = np.abs(self.coeff) * np.sum(np.abs(q)) \
+                                   * self.kernel_tail_bound(self.kei, radius/self.alpha)
+    logger.info('SAS_NG truncated at %s flexural wavelengths ( %s m )\n'
+                'Truncation error bound [m]: %s', self.CutoffWavelengths, radius, 
+                self.SAS_NG_truncation_error)
+
+  ## SPECTRAL (FAST FOURIER TRANSFORM)
+  #####################################
+
+  def fft_solve(self):
+    """
+    w = fft_solve()
+    
+    Spectral solution for flexure with constant elastic thickness:
+    
+      w_hat = -q_hat / (D (kx^2 + ky^2)^2 + drho g)
+    
+    using numpy's 2D real FFT: O(N log N) in time and O(N) in memory, as 
+    opposed to the sparse direct solve of the FD method.
+    The domain is periodic; Mirror and NoOutsideLoads boundaries are made by 
+    padding the loads (see fft_pad_axis) by one maximum flexural wavelength.
+    """
+    self.D = float(np.asarray(self.D).flat[0])
+    self.calc_max_flexural_wavelength()
+    # x: columns (W-E); y: rows (N-S)
+    q, j0 = self.fft_pad_axis(self.qs, 1, self.BC_W, self.BC_E,
+                              self.maxFlexuralWavelength_ncells_x)
+    q, i0 = self.fft_pad_axis(q, 0, self.BC_N, self.BC_S,
+                              self.maxFlexuralWavelength_ncells_y)
+    ny, nx = q.shape
+    kx = 2*np.pi*np.fft.rfftfreq(nx, self.dx)
+    ky = 2*np.pi*np.fft.fftfreq(ny, self.dy)
+    k2 = kx[np.newaxis,:]**2 + ky[:,np.newaxis]**2
+    w = np.fft.irfft2(-np.fft.rfft2(q) / (self.D*k2**2 + self.drho*self.g), q.shape)
+    self.w = w[i0:i0+self.qs.shape[0], j0:j0+self.qs.shape[1]]
 
   ## FINITE DIFFERENCE
   ######################
@@ -201,30 +357,37 @@ class F2D(Flexure):
     
     # Zeroth, start the timer and print the boundary conditions to the screen
     self.coeff_start_time = time.time()
-    if self.Verbose:
-      print "Boundary condition, West:", self.BC_W, type(self.BC_W)
-      print "Boundary condition, East:", self.BC_E, type(self.BC_E)
-      print "Boundary condition, North:", self.BC_N, type(self.BC_N)
-      print "Boundary condition, South:", self.BC_S, type(self.BC_S)
+    logger.log(VERBOSE, "Boundary condition, West: %s %s\nBoundary condition, East: %s %s\n"
+                        "Boundary condition, North: %s %s\nBoundary condition, South: %s %s",
+               self.BC_W, type(self.BC_W), self.BC_E, type(self.BC_E),
+               self.BC_N, type(self.BC_N), self.BC_S, type(self.BC_S))
     
     # First, set flexural rigidity boundary conditions to flesh out this padded
     # array
-    self.BC_Rigidity()
+    with self.phase('BC_Rigidity'):
+      self.BC_Rigidity()
     
     # Second, build the coefficient arrays -- with the rigidity b.c.'s
-    self.get_coeff_values()
+    with self.phase('get_coeff_values'):
+      self.get_coeff_values()
     
     # Third, apply boundary conditions to the coeff_arrays to create the 
     # flexural solution
-    self.BC_Flexure()
+    with self.phase('BC_Flexure'):
+      self.BC_Flexure()
     
-    # Fourth, construct the sparse diagonal array
-    self.build_diagonals()
+    # Fourth, construct the sparse diagonal array (or, with MatrixFree, the 
+    # operator that applies the stencil without it)
+    with self.phase('build_diagonals'):
+      if self.MatrixFree:
+        self.build_stencil_operator()
+      else:
+        self.build_diagonals()
 
     # Finally, compute the total time this process took    
     self.coeff_creation_time = time.time() - self.coeff_start_time
-    if self.Quiet == False:
-      print 'Time to construct coefficient (operator) array [s]:', self.coeff_creation_time
+    logger.info('Time to construct coefficient (operator) array [s]: %s', self.coeff_creation_time,
+                extra={'timer': 'coeff_creation_time', 'seconds': self.coeff_creation_time})
 
   def BC_Rigidity(self):
     """
@@ -322,7 +485,7 @@ class F2D(Flexure):
     coefficient matrix can very rapidly compute flexural solutions to any load.
     This makes this particularly good for probelms with time-variable loads or 
     that require iteration (e.g., water loading, in which additional water 
-    causes subsidence, causes additional water detph, etc.).
+    causes subsidence, causes additional water detph, etc.; see run_infill).
 
     These must be linearly combined to solve the equation.
 
@@ -347,47 +510,39 @@ class F2D(Flexure):
 
     if np.isscalar(self.Te):
       # So much simpler with constant D! And symmetrical stencil
-      self.cj2i0 = D/dy4
-      self.cj1i_1 = 2*D/dx2dy2
-      self.cj1i0 = -4*D/dy4 - 4*D/dx2dy2
-      self.cj1i1 = 2*D/dx2dy2
-      self.cj0i_2 = D/dx4
-      self.cj0i_1 = -4*D/dx4 - 4*D/dx2dy2
-      self.cj0i0 = 6*D/dx4 + 6*D/dy4 + 8*D/dx2dy2 + drho*g
-      self.cj0i1 = -4*D/dx4 - 4*D/dx2dy2 # Symmetry
-      self.cj0i2 = D/dx4 # Symmetry
-      self.cj_1i_1 = 2*D/dx2dy2 # Symmetry
-      self.cj_1i0 = -4*D/dy4 - 4*D/dx2dy2 # Symmetry
-      self.cj_1i1 = 2*D/dx2dy2 # Symmetry
-      self.cj_2i0 = D/dy4 # Symmetry
-      # Bring up to size
-      self.cj2i0 *= np.ones(self.qs.shape)
-      self.cj1i_1 *= np.ones(self.qs.shape)
-      self.cj1i0 *= np.ones(self.qs.shape)
-      self.cj1i1 *= np.ones(self.qs.shape)
-      self.cj0i_2 *= np.ones(self.qs.shape)
-      self.cj0i_1 *= np.ones(self.qs.shape)
-      self.cj0i0 *= np.ones(self.qs.shape)
-      self.cj0i1 *= np.ones(self.qs.shape)
-      self.cj0i2 *= np.ones(self.qs.shape)
-      self.cj_1i_1 *= np.ones(self.qs.shape)
-      self.cj_1i0 *= np.ones(self.qs.shape)
-      self.cj_1i1 *= np.ones(self.qs.shape)
-      self.cj_2i0 *= np.ones(self.qs.shape)
-      # Create coefficient arrays to manage boundary conditions
-      self.cj2i0_coeff_ij = self.cj2i0.copy()
-      self.cj1i_1_coeff_ij = self.cj1i_1.copy()
-      self.cj1i0_coeff_ij = self.cj1i0.copy()
-      self.cj1i1_coeff_ij = self.cj1i1.copy()
-      self.cj0i_2_coeff_ij = self.cj0i_2.copy()
-      self.cj0i_1_coeff_ij = self.cj0i_1.copy()
-      self.cj0i0_coeff_ij = self.cj0i0.copy()
-      self.cj0i1_coeff_ij = self.cj0i1.copy()
-      self.cj0i2_coeff_ij = self.cj0i2.copy()
-      self.cj_1i_1_coeff_ij = self.cj_1i_1.copy()
-      self.cj_1i0_coeff_ij = self.cj_1i0.copy()
-      self.cj_1i1_coeff_ij = self.cj_1i1.copy()
-      self.cj_2i0_coeff_ij = self.cj_2i0.copy()
+      # D is uniform, so the unaltered coefficients ("_coeff_ij", which are 
+      # only read when applying boundary conditions) are read-only broadcast 
+      # views of single values; only the arrays that the boundary conditions 
+      # modify are full-size
+      D = D.flat[0]
+      shape = self.qs.shape
+      self.cj2i0_coeff_ij = np.broadcast_to(D/dy4, shape)
+      self.cj1i_1_coeff_ij = np.broadcast_to(2*D/dx2dy2, shape)
+      self.cj1i0_coeff_ij = np.broadcast_to(-4*D/dy4 - 4*D/dx2dy2, shape)
+      self.cj1i1_coeff_ij = np.broadcast_to(2*D/dx2dy2, shape)
+      self.cj0i_2_coeff_ij = np.broadcast_to(D/dx4, shape)
+      self.cj0i_1_coeff_ij = np.broadcast_to(-4*D/dx4 - 4*D/dx2dy2, shape)
+      self.cj0i0_coeff_ij = np.broadcast_to(6*D/dx4 + 6*D/dy4 + 8*D/dx2dy2 + drho*g, shape)
+      self.cj0i1_coeff_ij = np.broadcast_to(-4*D/dx4 - 4*D/dx2dy2, shape) # Symmetry
+      self.cj0i2_coeff_ij = np.broadcast_to(D/dx4, shape) # Symmetry
+      self.cj_1i_1_coeff_ij = np.broadcast_to(2*D/dx2dy2, shape) # Symmetry
+      self.cj_1i0_coeff_ij = np.broadcast_to(-4*D/dy4 - 4*D/dx2dy2, shape) # Symmetry
+      self.cj_1i1_coeff_ij = np.broadcast_to(2*D/dx2dy2, shape) # Symmetry
+      self.cj_2i0_coeff_ij = np.broadcast_to(D/dy4, shape) # Symmetry
+      # Full-size coefficient arrays, to which boundary conditions are applied
+      self.cj2i0 = self.cj2i0_coeff_ij.copy()
+      self.cj1i_1 = self.cj1i_1_coeff_ij.copy()
+      self.cj1i0 = self.cj1i0_coeff_ij.copy()
+      self.cj1i1 = self.cj1i1_coeff_ij.copy()
+      self.cj0i_2 = self.cj0i_2_coeff_ij.copy()
+      self.cj0i_1 = self.cj0i_1_coeff_ij.copy()
+      self.cj0i0 = self.cj0i0_coeff_ij.copy()
+      self.cj0i1 = self.cj0i1_coeff_ij.copy()
+      self.cj0i2 = self.cj0i2_coeff_ij.copy()
+      self.cj_1i_1 = self.cj_1i_1_coeff_ij.copy()
+      self.cj_1i0 = self.cj_1i0_coeff_ij.copy()
+      self.cj_1i1 = self.cj_1i1_coeff_ij.copy()
+      self.cj_2i0 = self.cj_2i0_coeff_ij.copy()
       
     elif type(self.Te) == np.ndarray:
     
@@ -1231,236 +1386,342 @@ class F2D(Flexure):
     # The Periodic boundary natively continues the other boundary conditions
     # Nothing to be done here.
 
-  def build_diagonals(self):
-
-    ##########################################################
-    # INCORPORATE BOUNDARY CONDITIONS INTO COEFFICIENT ARRAY #
-    ##########################################################
-
-    # Roll to keep the proper coefficients at the proper places in the
-    # arrays: Python will naturally just do vertical shifts instead of 
-    # diagonal shifts, so this takes into account the horizontal compoent 
-    # to ensure that boundary values are at the right place.
-        
-    # Roll x
-# ASYMMETRIC RESPONSE HERE -- THIS GETS TOWARDS SOURCE OF PROBLEM!
-    self.cj_2i0 = np.roll(self.cj_2i0, -2, 1)
-    self.cj_1i0 = np.roll(self.cj_1i0, -1, 1)
-    self.cj1i0 = np.roll(self.cj1i0, 1, 1)
-    self.cj2i0 = np.roll(self.cj2i0, 2, 1)
-    # Roll y
-    self.cj0i_2 = np.roll(self.cj0i_2, -2, 0)
-    self.cj0i_1 = np.roll(self.cj0i_1, -1, 0)
-    self.cj0i1 = np.roll(self.cj0i1, 1, 0)
-    self.cj0i2 = np.roll(self.cj0i2, 2, 0)
-    # Roll x and y
-    self.cj_1i_1 = np.roll(self.cj_1i_1, -1, 1)
-    self.cj_1i_1 = np.roll(self.cj_1i_1, -1, 0)
-    self.cj_1i1 = np.roll(self.cj_1i1, -1, 1)
-    self.cj_1i1 = np.roll(self.cj_1i1, 1, 0)
-    self.cj1i_1 = np.roll(self.cj1i_1, 1, 1)
-    self.cj1i_1 = np.roll(self.cj1i_1, -1, 0)
-    self.cj1i1 = np.roll(self.cj1i1, 1, 1)
-    self.cj1i1 = np.roll(self.cj1i1, 1, 0)
-
-    coeff_array_list = [self.cj_2i0, self.cj_1i0, self.cj1i0, self.cj2i0, self.cj0i_2, self.cj0i_1, self.cj0i1, self.cj0i2, self.cj_1i_1, self.cj_1i1, self.cj1i_1, self.cj1i1, self.cj0i0]
-    for array in coeff_array_list:
-      array[np.isinf(array)] = 0
-     #array[np.isnan(array)] = 0 # had been used for testing
-    
-    # Reshape to put in solver
-    vec_cj_2i0 = np.reshape(self.cj_2i0, -1, order='C')
-    vec_cj_1i_1 = np.reshape(self.cj_1i_1, -1, order='C')
-    vec_cj_1i0 = np.reshape(self.cj_1i0, -1, order='C')
-    vec_cj_1i1 = np.reshape(self.cj_1i1, -1, order='C')
-    vec_cj0i_2 = np.reshape(self.cj0i_2, -1, order='C')
-    vec_cj0i_1 = np.reshape(self.cj0i_1, -1, order='C')
-    vec_cj0i0 = np.reshape(self.cj0i0, -1, order='C')
-    vec_cj0i1 = np.reshape(self.cj0i1, -1, order='C')
-    vec_cj0i2 = np.reshape(self.cj0i2, -1, order='C')
-    vec_cj1i_1 = np.reshape(self.cj1i_1, -1, order='C')
-    vec_cj1i0 = np.reshape(self.cj1i0, -1, order='C')
-    vec_cj1i1 = np.reshape(self.cj1i1, -1, order='C')
-    vec_cj2i0 = np.reshape(self.cj2i0, -1, order='C')
+  def stencil_diagonals(self):
+    """
+    Returns the diagonals of the coefficient matrix, as (offset, coefficient 
+    array, (y, x) shift), in order of increasing offset. They are made of 
+    the stencil coefficient arrays (with boundary conditions applied) and, 
+    for periodic boundaries, the additional wrap-around arrays.
     
-    # Changed this 6 Nov. 2014 in betahaus Berlin to be x-based
-    Up2 = vec_cj0i2
-    Up1 = np.vstack(( vec_cj_1i1, vec_cj0i1, vec_cj1i1 ))
-    Mid = np.vstack(( vec_cj_2i0, vec_cj_1i0, vec_cj0i0, vec_cj1i0, vec_cj2i0 ))
-    Dn1 = np.vstack(( vec_cj_1i_1, vec_cj0i_1, vec_cj1i_1 ))
-    Dn2 = vec_cj0i_2
+    Each coefficient array lies along one or more diagonals of the matrix, 
+    after it is shifted (as if by np.roll; see shift_diagonal) so that its 
+    values line up with the matrix columns, as spdiags expects.
+    """
 
     # Number of rows and columns for array size and offsets
     self.ny = self.nrowsy
     self.nx = self.ncolsx
+    ny = self.ny
+    nx = self.nx
+    N = ny*nx
+
+    # (coefficient array, (y, x) shift to line it up with matrix columns)
+    Up2 = [(self.cj0i2, (2, 0))]
+    Up1 = [(self.cj_1i1, (1, -1)), (self.cj0i1, (1, 0)), (self.cj1i1, (1, 1))]
+    Mid = [(self.cj_2i0, (0, -2)), (self.cj_1i0, (0, -1)), (self.cj0i0, (0, 0)), 
+           (self.cj1i0, (0, 1)), (self.cj2i0, (0, 2))]
+    Dn1 = [(self.cj_1i_1, (-1, -1)), (self.cj0i_1, (-1, 0)), (self.cj1i_1, (-1, 1))]
+    Dn2 = [(self.cj0i_2, (-2, 0))]
+
+    if self.BC_W == 'Periodic' and self.BC_E == 'Periodic':
+      # Additional wrap-around arrays for periodic b.c.'s in x
+      Right_2i0 = [(self.cj_2i0_Periodic_right, (0, -2))]
+      Right_1i1 = [(self.cj_1i1_Periodic_right, (1, -1))]
+      Left1i_1 = [(self.cj1i_1_Periodic_left, (-1, 1))]
+      Left2i0 = [(self.cj2i0_Periodic_left, (0, 2))]
 
     if (self.BC_N == 'Periodic' and self.BC_S == 'Periodic' and \
         self.BC_W == 'Periodic' and self.BC_E == 'Periodic' ):
-      # Additional vector creation
-      # West
-      # Roll
-      self.cj_2i0_Periodic_right = np.roll(self.cj_2i0_Periodic_right, -2, 1)
-      self.cj_1i1_Periodic_right = np.roll(self.cj_1i1_Periodic_right, -1, 1)
-      self.cj_1i1_Periodic_right = np.roll(self.cj_1i1_Periodic_right, 1, 0)
-      # Reshape
-      vec_cj_2i0_Periodic_right = np.reshape(self.cj_2i0_Periodic_right, -1, order='C')
-      vec_cj_1i1_Periodic_right = np.reshape(self.cj_1i1_Periodic_right, -1, order='C')
-      # East
-      # Roll
-      self.cj1i_1_Periodic_left = np.roll(self.cj1i_1_Periodic_left, 1, 1)
-      self.cj1i_1_Periodic_left = np.roll(self.cj1i_1_Periodic_left, -1, 0)
-      self.cj2i0_Periodic_left = np.roll(self.cj2i0_Periodic_left, 2, 1)
-      # Reshape
-      vec_cj1i_1_Periodic_left = np.reshape(self.cj1i_1_Periodic_left, -1, order='C')
-      vec_cj2i0_Periodic_left = np.reshape(self.cj2i0_Periodic_left, -1, order='C')
-    
-      # Build diagonals with additional entries
-      # I think the fact that everything is rolled will make this work all right
-      # without any additional rolling.
-      # Checked -- and indeed, what would be in my mind the last value for 
-      # Mid[3] is the first value in its array. Hooray, patterns!
-      self.diags = np.vstack(( vec_cj1i_1_Periodic_left,
-                               Up1,
-                               vec_cj_1i1_Periodic_right,
-                               Up2,
-                               Dn2,
-                               vec_cj1i_1_Periodic_left,
-                               Dn1,
-                               vec_cj2i0_Periodic_left,
-                               Mid,
-                               vec_cj_2i0_Periodic_right,
-                               Up1,
-                               vec_cj_1i1_Periodic_right,
-                               Up2,
-                               Dn2,
-                               vec_cj1i_1_Periodic_left,
-                               Dn1,
-                               vec_cj_1i1_Periodic_right ))
-      # Getting too complicated to have everything together
+      diagonals = Left1i_1 + Up1 + Right_1i1 + Up2 + Dn2 + Left1i_1 + Dn1 \
+                  + Left2i0 + Mid + Right_2i0 + Up1 + Right_1i1 + Up2 + Dn2 \
+                  + Left1i_1 + Dn1 + Right_1i1
       self.offsets = [
                       # New: LL corner of LL box
-                      -self.ny*self.nx+1,
+                      -N+1,
                       # Periodic b.c. tridiag
-                      self.nx-self.ny*self.nx-1, self.nx-self.ny*self.nx, self.nx-self.ny*self.nx+1,
+                      nx-N-1, nx-N, nx-N+1,
                       # New: UR corner of LL box
-                      2*self.nx-self.ny*self.nx-1,
+                      2*nx-N-1,
                       # Periodic b.c. single diag
-                      2*self.nx-self.ny*self.nx,
-                      -2*self.nx,
+                      2*nx-N,
+                      -2*nx,
                       # New:
-                      -2*self.nx+1,
-                      # Right term here (-self.nx+1) modified:
-                      -self.nx-1, -self.nx, -self.nx+1,
+                      -2*nx+1,
+                      # Right term here (-nx+1) modified:
+                      -nx-1, -nx, -nx+1,
                       # New:
-                      -self.nx+2,
+                      -nx+2,
                       # -1 and 1 terms here modified:
                       -2, -1, 0, 1, 2,
                       # New:
-                      self.nx-2,
-                      # Left term here (self.nx-1) modified:
-                      self.nx-1, self.nx, self.nx+1,
+                      nx-2,
+                      # Left term here (nx-1) modified:
+                      nx-1, nx, nx+1,
                       # New:
-                      2*self.nx-1,
-                      2*self.nx,
+                      2*nx-1,
+                      2*nx,
                       # Periodic b.c. single diag
-                      self.ny*self.nx-2*self.nx,
+                      N-2*nx,
                       # New: LL corner of UR box
-                      self.ny*self.nx-2*self.nx+1,
+                      N-2*nx+1,
                       # Periodic b.c. tridiag
-                      self.ny*self.nx-self.nx-1, self.ny*self.nx-self.nx, self.ny*self.nx-self.nx+1,
+                      N-nx-1, N-nx, N-nx+1,
                       # New: UR corner of UR box
-                      self.ny*self.nx-1
+                      N-1
                      ]
-
-      # create banded sparse matrix
-      self.coeff_matrix = scipy.sparse.spdiags(self.diags, self.offsets,
-        self.ny*self.nx, self.ny*self.nx, format='csr') 
-    
     elif (self.BC_W == 'Periodic' and self.BC_E == 'Periodic'):
-      # Additional vector creation
-      # West
-      # Roll
-      self.cj_2i0_Periodic_right = np.roll(self.cj_2i0_Periodic_right, -2, 1)
-      self.cj_1i1_Periodic_right = np.roll(self.cj_1i1_Periodic_right, -1, 1)
-      self.cj_1i1_Periodic_right = np.roll(self.cj_1i1_Periodic_right, 1, 0)
-      # Reshape
-      vec_cj_2i0_Periodic_right = np.reshape(self.cj_2i0_Periodic_right, -1, order='C')
-      vec_cj_1i1_Periodic_right = np.reshape(self.cj_1i1_Periodic_right, -1, order='C')
-      # East
-      # Roll
-      self.cj1i_1_Periodic_left = np.roll(self.cj1i_1_Periodic_left, 1, 1)
-      self.cj1i_1_Periodic_left = np.roll(self.cj1i_1_Periodic_left, -1, 0)
-      self.cj2i0_Periodic_left = np.roll(self.cj2i0_Periodic_left, 2, 1)
-      # Reshape
-      vec_cj1i_1_Periodic_left = np.reshape(self.cj1i_1_Periodic_left, -1, order='C')
-      vec_cj2i0_Periodic_left = np.reshape(self.cj2i0_Periodic_left, -1, order='C')
-
-      # Build diagonals with additional entries
-      self.diags = np.vstack(( Dn2,
-                               vec_cj1i_1_Periodic_left,
-                               Dn1,
-                               vec_cj2i0_Periodic_left,
-                               Mid,
-                               vec_cj_2i0_Periodic_right,
-                               Up1,
-                               vec_cj_1i1_Periodic_right,
-                               Up2 ))
-      # Getting too complicated to have everything together
-      self.offsets = [-2*self.nx,
+      diagonals = Dn2 + Left1i_1 + Dn1 + Left2i0 + Mid + Right_2i0 + Up1 \
+                  + Right_1i1 + Up2
+      self.offsets = [-2*nx,
                       # New:
-                      -2*self.nx+1,
-                      # Right term here (-self.nx+1) modified:
-                      -self.nx-1, -self.nx, -self.nx+1,
+                      -2*nx+1,
+                      # Right term here (-nx+1) modified:
+                      -nx-1, -nx, -nx+1,
                       # New:
-                      -self.nx+2,
+                      -nx+2,
                       # -1 and 1 terms here modified:
                       -2, -1, 0, 1, 2,
                       # New:
-                      self.nx-2,
-                      # Left term here (self.nx-1) modified:
-                      self.nx-1, self.nx, self.nx+1,
+                      nx-2,
+                      # Left term here (nx-1) modified:
+                      nx-1, nx, nx+1,
                       # New:
-                      2*self.nx-1,
-                      2*self.nx]
-
-      # create banded sparse matrix
-      self.coeff_matrix = scipy.sparse.spdiags(self.diags, self.offsets,
-        self.ny*self.nx, self.ny*self.nx, format='csr') 
-    
+                      2*nx-1,
+                      2*nx]
     elif (self.BC_N == 'Periodic' and self.BC_S == 'Periodic'):
       # Periodic.
       # If these are periodic, we need to wrap around the ends of the
       # large-scale diagonal structure
-      self.diags = np.vstack(( Up1,
-                               Up2,
-                               Dn2,
-                               Dn1,
-                               Mid,
-                               Up1,
-                               Up2,
-                               Dn2,
-                               Dn1 ))
-      # Create banded sparse matrix
-      # Rows:
-      #      Lower left
-      #      Middle
-      #      Upper right
-      self.coeff_matrix = scipy.sparse.spdiags(self.diags, [self.nx-self.ny*self.nx-1, self.nx-self.ny*self.nx, self.nx-self.ny*self.nx+1, 2*self.nx-self.ny*self.nx,
-                                                            -2*self.nx, -self.nx-1, -self.nx, -self.nx+1, -2, -1, 0, 1, 2, self.nx-1, self.nx, self.nx+1, 2*self.nx,
-                                                            self.ny*self.nx-2*self.nx, self.ny*self.nx-self.nx-1, self.ny*self.nx-self.nx, self.ny*self.nx-self.nx+1],
-                                                            self.ny*self.nx, self.ny*self.nx, format='csr')
-                                                            
+      # Rows: lower left, middle, upper right
+      diagonals = Up1 + Up2 + Dn2 + Dn1 + Mid + Up1 + Up2 + Dn2 + Dn1
+      self.offsets = [nx-N-1, nx-N, nx-N+1, 2*nx-N,
+                      -2*nx, -nx-1, -nx, -nx+1, -2, -1, 0, 1, 2, nx-1, nx, nx+1, 2*nx,
+                      N-2*nx, N-nx-1, N-nx, N-nx+1]
     else:
       # No periodic boundary conditions -- original form of coeff_matrix
       # creator.
-      # Arrange in solver
-      self.diags = np.vstack(( Dn2,
-                               Dn1,
-                               Mid,
-                               Up1,
-                               Up2 ))
-      # Create banded sparse matrix
-      self.coeff_matrix = scipy.sparse.spdiags(self.diags, [-2*self.nx, -self.nx-1, -self.nx, -self.nx+1, -2, -1, 0, 1, 2, self.nx-1, self.nx, self.nx+1, 2*self.nx], self.ny*self.nx, self.ny*self.nx, format='csr') # create banded sparse matrix
+      diagonals = Dn2 + Dn1 + Mid + Up1 + Up2
+      self.offsets = [-2*nx, -nx-1, -nx, -nx+1, -2, -1, 0, 1, 2, nx-1, nx, nx+1, 2*nx]
+
+    order = np.argsort(self.offsets, kind='mergesort')
+    return [(self.offsets[d],) + diagonals[d] for d in order]
+
+  def shift_diagonal(self, array, shift, out):
+    """
+    Writes the coefficient array, shifted by (y, x) = shift to line up with 
+    the matrix columns, into out: np.roll(np.roll(array, sx, 1), sy, 0), 
+    without temporaries
+    """
+    ny, nx = array.shape
+    sy = shift[0] % ny
+    sx = shift[1] % nx
+    out[sy:, sx:] = array[:ny-sy, :nx-sx]
+    out[sy:, :sx] = array[:ny-sy, nx-sx:]
+    out[:sy, sx:] = array[ny-sy:, :nx-sx]
+    out[:sy, :sx] = array[ny-sy:, nx-sx:]
+
+  def build_diagonals(self):
+    """
+    Assembles the sparse coefficient matrix from its diagonals (see 
+    stencil_diagonals). Rather than rolling each array, stacking them, and 
+    converting a DIA matrix (via COO), the shifted values are written once 
+    into a table of diagonals by matrix row, from which the CSR data, column 
+    indices, and row pointers are read directly. Boundary flags (np.inf) and 
+    zeros are not stored, as in the DIA conversion. Coinciding diagonals 
+    (periodic grids with ny < 5), which spdiags rejects, are summed.
+    """
+    diagonals = self.stencil_diagonals()
+    ny = self.ny
+    nx = self.nx
+    N = ny*nx
+    # Values on each diagonal, indexed by matrix row, with the diagonals in 
+    # order of increasing offset: read down the diagonals for each row (in 
+    # C order of the transpose), these are already in CSR order
+    offsets = np.array([k for k, array, shift in diagonals])
+    values = np.zeros((len(offsets), N))
+    # Coefficient array shifted to line up with the columns, reused
+    shifted = np.empty((ny, nx))
+    shifted_vector = shifted.reshape(-1)
+    for d, (k, array, shift) in enumerate(diagonals):
+      if abs(k) >= N:
+        continue
+      self.shift_diagonal(array, shift, shifted)
+      # Entry (row, row + k) takes the value at column row + k
+      values[d, max(0, -k):min(N, N-k)] = shifted_vector[max(0, k):min(N, N+k)]
+    del shifted, shifted_vector, diagonals
+    # np.inf flags off-grid coefficients; zeros are not stored
+    values[np.isinf(values)] = 0
+    stored = values != 0
+    index_type = np.int32 if N < 2**31 else np.int64
+    columns = np.arange(N, dtype=index_type) + offsets.astype(index_type)[:,np.newaxis]
+    indptr = np.zeros(N+1, dtype=index_type)
+    np.cumsum(stored.sum(axis=0), out=indptr[1:])
+    data = values.T[stored.T]
+    del values
+    indices = columns.T[stored.T]
+    del columns, stored
+    from scipy.sparse import csr_matrix
+    self.coeff_matrix = csr_matrix((data, indices, indptr), shape=(N, N))
+    if len(np.unique(offsets)) < len(offsets):
+      # Small periodic grids: the wrap-around diagonals coincide
+      self.coeff_matrix.sum_duplicates()
+
+  def build_stencil_operator(self):
+    """
+    Matrix-free coefficient "matrix" (MatrixFree = True): a 
+    scipy.sparse.linalg.LinearOperator that applies the finite difference 
+    stencil to w, for the iterative solver, without building the sparse 
+    matrix. 
+    
+    The stencil coefficients come from the padded D array, as for the 
+    matrix (get_coeff_values, with boundary conditions applied by 
+    BC_Flexure). Each diagonal (see stencil_diagonals) is kept as one 
+    vector of the coefficients that multiply w, lined up with it; the 
+    product is the sum over the diagonals of these vectors times w, offset 
+    by the diagonal, with off-grid (np.inf) and all-zero diagonals left 
+    out. This is the same product as coeff_matrix.dot(w), for all boundary 
+    conditions, but holds only one grid-sized array per diagonal (13 
+    without periodic boundaries), rather than the matrix's values and 
+    column indices and the arrays used to assemble them. The coefficient 
+    arrays are dropped once the operator is built.
+    
+    Like a sparse matrix, the operator has nnz and diagonal() (used by the 
+    Jacobi preconditioner), and rows(index) returns the given rows as a 
+    sparse matrix (used by the spectral preconditioner).
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.linalg import LinearOperator
+    # Coefficients before the boundary conditions: no longer needed
+    for name in [name for name in vars(self) if name.endswith('_coeff_ij')]:
+      delattr(self, name)
+    diagonals = self.stencil_diagonals()
+    N = self.ny*self.nx
+    shifted = np.empty((self.ny, self.nx))
+    shifted_vector = shifted.reshape(-1)
+    # (offset, values at the columns of rows max(0, -k) to min(N, N-k))
+    stencil = []
+    for k, array, shift in diagonals:
+      if abs(k) >= N:
+        continue
+      self.shift_diagonal(array, shift, shifted)
+      values = shifted_vector[max(0, k):min(N, N+k)].copy()
+      values[np.isinf(values)] = 0
+      if values.any():
+        stencil.append((k, values))
+    del shifted, shifted_vector, diagonals
+    # Nor are the coefficient arrays, now that they are in the stencil
+    for name in [name for name in vars(self) if name.startswith('cj')]:
+      delattr(self, name)
+    product = np.empty(N) # Reused by each matvec
+    def matvec(w):
+      w = w.reshape(-1)
+      out = np.zeros(N)
+      for k, values in stencil:
+        n = len(values)
+        np.multiply(values, w[max(0, k):max(0, k)+n], out=product[:n])
+        out[max(0, -k):max(0, -k)+n] += product[:n]
+      return out
+    def diagonal():
+      out = np.zeros(N)
+      for k, values in stencil:
+        if k == 0:
+          out += values
+      return out
+    def rows(index):
+      index = np.asarray(index)
+      data, row, column = [], [], []
+      for k, values in stencil:
+        # Row i holds values[i - max(0, -k)] in column i + k
+        start = max(0, -k)
+        on_diagonal = np.nonzero((index >= start) & (index < start + len(values)))[0]
+        data.append(values[index[on_diagonal] - start])
+        row.append(on_diagonal)
+        column.append(index[on_diagonal] + k)
+      return csr_matrix((np.concatenate(data), (np.concatenate(row), np.concatenate(column))), 
+                        shape=(len(index), N))
+    self.coeff_matrix = LinearOperator((N, N), matvec=matvec, dtype=float)
+    self.coeff_matrix.nnz = sum(np.count_nonzero(values) for k, values in stencil)
+    self.coeff_matrix.diagonal = diagonal
+    self.coeff_matrix.rows = rows
+
+  def spectral_preconditioner(self):
+    """
+    Spectral preconditioner for the iterative solver (Preconditioner = 
+    'spectral'; see fd_preconditioner): the inverse of the finite 
+    difference operator for a plate of uniform rigidity D0, the geometric 
+    mean of D over the grid,
+    
+      w_hat = q_hat / (D0 (lambda_x + lambda_y)^2 + drho g)
+    
+    in which lambda = 4 sin^2(theta) / dx^2 is the eigenvalue of the 
+    second difference for each wavenumber. Each axis is transformed to suit 
+    its boundary conditions: a discrete sine transform (DST-I) for 
+    0Displacement0Slope, the FFT for Periodic, and a discrete cosine 
+    transform (DCT-I) otherwise. It needs no matrix (so it can be used with 
+    MatrixFree) and takes O(N log N) time to apply.
+    
+    The transforms do not match the 0Slope0Shear and 0Moment0Shear 
+    boundary stencils, so along those sides the spectral solution is 
+    followed by a direct (sparse LU) solve for the residual on a strip of 
+    the grid, 8 cells wide: this costs one more product with the operator 
+    each time the preconditioner is applied.
+    
+    Only the uniform plate is inverted, so this works only while Te varies 
+    over many cells: for constant Te, or smooth variations such as weak 
+    zones several cells wide, the solver converges in a few to a few tens 
+    of iterations. Rough or short-wavelength variations in Te (e.g., from 
+    cell to cell) defeat it, as they do the Jacobi preconditioner, and the 
+    solver stops without converging; so may Periodic boundaries across 
+    which Te jumps, and G2009 with any variable Te, whose operator is 
+    indefinite. These need the matrix and the ILU (or AMG) preconditioner, 
+    or the direct solver.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.linalg import LinearOperator, splu
+    from scipy.fftpack import dct, idct, dst, idst
+    ny, nx = self.qs.shape
+    # Te may be padded with NaN (see BC_Rigidity)
+    Te = np.asarray(self.Te, dtype=float)
+    Te = Te[np.isfinite(Te)]
+    Te = Te[Te > 0]
+    if Te.size:
+      D0 = self.E*np.exp(np.mean(np.log(Te)))**3/(12*(1-self.nu**2))
+    else:
+      D0 = 0.
+    # (eigenvalues of the second difference, forward and inverse transforms)
+    transforms = []
+    for n, spacing, sides in [(ny, self.dy, (self.BC_N, self.BC_S)), 
+                              (nx, self.dx, (self.BC_W, self.BC_E))]:
+      if 'Periodic' in sides or n < 2:
+        theta = np.pi*np.fft.fftfreq(n)
+        forward = lambda x, axis: np.fft.fft(x, axis=axis)
+        inverse = lambda x, axis: np.fft.ifft(x, axis=axis)
+      elif sides == ('0Displacement0Slope', '0Displacement0Slope'):
+        theta = np.pi*np.arange(1, n+1)/(2.*(n+1))
+        forward = lambda x, axis: dst(x, type=1, axis=axis)
+        inverse = lambda x, axis, n=n: idst(x, type=1, axis=axis)/(2.*(n+1))
+      else:
+        theta = np.pi*np.arange(n)/(2.*(n-1))
+        forward = lambda x, axis: dct(x, type=1, axis=axis)
+        inverse = lambda x, axis, n=n: idct(x, type=1, axis=axis)/(2.*(n-1))
+      transforms.append((4*np.sin(theta)**2/spacing**2, forward, inverse))
+    (lambda_y, forward_y, inverse_y), (lambda_x, forward_x, inverse_x) = transforms
+    symbol = D0*(lambda_y[:,np.newaxis] + lambda_x[np.newaxis,:])**2 + self.drho*self.g
+    def spectral(q):
+      q_hat = forward_x(forward_y(q.reshape(ny, nx), 0), 1)
+      return np.real(inverse_x(inverse_y(q_hat/symbol, 0), 1)).reshape(-1)
+    # Strips along the free-edge and 0Slope0Shear sides
+    width = 8
+    strip = np.zeros((ny, nx), dtype=bool)
+    for side, cells in [('BC_N', np.s_[:width,:]), ('BC_S', np.s_[-width:,:]), 
+                        ('BC_W', np.s_[:,:width]), ('BC_E', np.s_[:,-width:])]:
+      if getattr(self, side) in ('0Slope0Shear', '0Moment0Shear'):
+        strip[cells] = True
+    if not strip.any():
+      return LinearOperator((ny*nx, ny*nx), matvec=spectral, dtype=float)
+    index = np.nonzero(strip.reshape(-1))[0]
+    A = self.coeff_matrix
+    try:
+      strip_rows = A.rows(index) # Matrix-free operator
+    except AttributeError:
+      strip_rows = csr_matrix(A)[index]
+    strip_lu = splu(strip_rows[:,index].tocsc())
+    def matvec(q):
+      q = q.reshape(-1)
+      w = spectral(q)
+      w[index] += strip_lu.solve((q - A.dot(w))[index])
+      return w
+    return LinearOperator((ny*nx, ny*nx), matvec=matvec, dtype=float)
 
   def calc_max_flexural_wavelength(self):
     """
@@ -1492,33 +1753,31 @@ class F2D(Flexure):
     Requires the coefficient matrix from "2D.coeff_matrix"
     """
     
-    if self.Debug:
-      try:
-        # Will fail if scalar
-        print 'self.Te', self.Te.shape
-      except:
-        pass
-      print 'self.qs', self.qs.shape
+    if logger.isEnabledFor(logging.DEBUG):
+      # Shape fails if scalar
+      logger.debug('self.Te %s', np.shape(self.Te))
+      logger.debug('self.qs %s', self.qs.shape)
       self.calc_max_flexural_wavelength()
-      print 'maxFlexuralWavelength_ncells: (x, y):', self.maxFlexuralWavelength_ncells_x, self.maxFlexuralWavelength_ncells_y
+      logger.debug('maxFlexuralWavelength_ncells: (x, y): %s %s', 
+                   self.maxFlexuralWavelength_ncells_x, self.maxFlexuralWavelength_ncells_y)
     
     q0vector = self.qs.reshape(-1, order='C')
     if self.Solver == "iterative" or self.Solver == "Iterative":
-      if self.Debug:
-        print "Using generalized minimal residual method for iterative solution"
-      if self.Verbose:
-        print "Converging to a tolerance of", self.iterative_ConvergenceTolerance, "m between iterations"
-      wvector = scipy.sparse.linalg.isolve.lgmres(self.coeff_matrix, q0vector)#, tol=1E-10)#,x0=woldvector)#,x0=wvector,tol=1E-15)    
-      wvector = wvector[0] # Reach into tuple to get my array back
+      # Warm start from the previous solution on this grid, if there is one
+      try:
+        x0 = -self.w.reshape(-1, order='C')
+        if x0.shape != q0vector.shape:
+          x0 = None
+      except:
+        x0 = None
+      wvector = self.fd_iterative_solve(q0vector, x0)
     else:
       if self.Solver == "direct" or self.Solver == "Direct":
-        if self.Debug:
-          print "Using direct solution with UMFpack"
+        logger.debug("Using direct solution with UMFpack")
       else:
-        if self.Quiet == False:
-          print "Solution type not understood:"
-          print "Defaulting to direct solution with UMFpack"
-      wvector = scipy.sparse.linalg.spsolve(self.coeff_matrix, q0vector, use_umfpack=True)
+        logger.warning("Solution type not understood:\n"
+                       "Defaulting to direct solution with UMFpack")
+      wvector = self.fd_direct_solve(q0vector)
 
     # Reshape into grid
     self.w = -wvector.reshape(self.qs.shape)
@@ -0,0 +1,107 @@
+"""
+Functional interface to the finite difference solutions:
+
+  w = solve_fd_1d(qs, Te, dx, E, nu, drho, g, bcs)
+  w = solve_fd_2d(qs, Te, dx, dy, E, nu, drho, g, bcs)
+
+Each call takes all of its inputs as arguments and returns the deflections.
+It works on its own F1D or F2D object, which is discarded afterwards, so it
+neither changes its arguments nor shares any state with other calls or
+with flexure objects; calls can run at the same time in separate threads.
+SciPy's sparse factorization and solution (SuperLU) and most large NumPy
+array operations release the GIL while they run, so concurrent solves of
+large grids can use more than one core.
+
+Unlike initialize(), these do not set the level of the "gflex" logger
+(which is shared by all threads); messages go out at whatever level it has.
+"""
+
+from __future__ import division
+import numpy as np
+from f1d import F1D
+from f2d import F2D
+
+def _sides(bcs, names):
+  """
+  Boundary conditions by side: bcs is one for all sides, or one per side in
+  the order of names
+  """
+  if isinstance(bcs, basestring):
+    bcs = [bcs] * len(names)
+  if len(bcs) != len(names):
+    raise ValueError("Need one boundary condition, or one for each of: "+", ".join(names))
+  return zip(names, [str(bc) for bc in bcs])
+
+def _solve(plate, qs, Te, E, nu, drho, g, bcs, options):
+  plate.Method = 'FD'
+  # Copies, so that the caller's arrays are never changed
+  plate.qs = np.array(qs, dtype=float)
+  if np.isscalar(Te):
+    plate.Te = float(Te)
+  else:
+    plate.Te = np.array(Te, dtype=float)
+  plate.E = E
+  plate.nu = nu
+  plate.g = g
+  plate.rho_m = drho
+  plate.rho_fill = 0.
+  plate.drho = drho
+  for side, bc in bcs:
+    setattr(plate, side, bc)
+  for name, value in options.items():
+    setattr(plate, name, value)
+  plate.run()
+  return plate.w
+
+def solve_fd_1d(qs, Te, dx, E, nu, drho, g, bcs, Solver='direct', **options):
+  """
+  w = solve_fd_1d(qs, Te, dx, E, nu, drho, g, bcs, Solver='direct', **options)
+
+  Finite difference solution for the deflections of a 1D plate.
+
+  qs:     loads (stresses) [Pa], shaped (nx,)
+  Te:     elastic thickness [m]: scalar or shaped (nx,)
+  dx:     grid spacing [m]
+  E, nu:  Young's modulus [Pa] and Poisson's ratio
+  drho:   mantle density minus infill density [kg/m^3]
+  g:      gravitational acceleration [m/s^2]
+  bcs:    boundary condition: one for both sides, or (West, East)
+  Solver: 'direct', 'iterative', or 'banded'
+  options: other settings, as attributes of F1D (e.g., IterativeMethod,
+           Preconditioner, iterative_ConvergenceTolerance, OperatorCacheDir)
+  """
+  plate = F1D()
+  plate.dimension = 1
+  plate.dx = dx
+  plate.Solver = Solver
+  return _solve(plate, qs, Te, E, nu, drho, g, _sides(bcs, ['BC_W', 'BC_E']), options)
+
+def solve_fd_2d(qs, Te, dx, dy, E, nu, drho, g, bcs, PlateSolutionType='vWC1994',
+                Solver='direct', **options):
+  """
+  w = solve_fd_2d(qs, Te, dx, dy, E, nu, drho, g, bcs, PlateSolutionType='vWC1994',
+                  Solver='direct', **options)
+
+  Finite difference solution for the deflections of a 2D plate.
+
+  qs:     loads (stresses) [Pa], shaped (ny, nx)
+  Te:     elastic thickness [m]: scalar or shaped (ny, nx)
+  dx, dy: grid spacing [m]
+  E, nu:  Young's modulus [Pa] and Poisson's ratio
+  drho:   mantle density minus infill density [kg/m^3]
+  g:      gravitational acceleration [m/s^2]
+  bcs:    boundary condition: one for all sides, or (West, East, North, South)
+  PlateSolutionType: 'vWC1994' or 'G2009'
+  Solver: 'direct' or 'iterative'
+  options: other settings, as attributes of F2D (e.g., IterativeMethod,
+           Preconditioner, iterative_ConvergenceTolerance, MatrixFree,
+           OperatorCacheDir)
+  """
+  plate = F2D()
+  plate.dimension = 2
+  plate.dx = dx
+  plate.dy = dy
+  plate.PlateSolutionType = PlateSolutionType
+  plate.Solver = Solver
+  return _solve(plate, qs, Te, E, nu, drho, g,
+                _sides(bcs, ['BC_W', 'BC_E', 'BC_N', 'BC_S']), options)
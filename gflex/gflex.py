@@ -12,6 +12,8 @@ import sys
 from base import *
 from f1d import *
 from f2d import *
+from sweep import sweep
+from functional import solve_fd_1d, solve_fd_2d
 
 """
 Solves flexural isostasy both analytically (for constant flexural rigidity)
@@ -21,6 +23,9 @@ Analytical solutions are by superposition of analytical solutions
 in the spatial domain (i.e. a sum of Green's functions)
 
 Numerical solutions are finite difference by a direct sparse matrix solver.
+
+Spectral solutions (constant flexural rigidity) are by the fast Fourier 
+transform.
 """
 try:
   from _version import __version__
@@ -41,6 +46,10 @@ def displayUsage():
   print 'gflex <<path_to_configuration_file>>  # TO RUN STANDALONE'
   print 'gflex -h  *OR*  gflex --help          # DISPLAY ADDITIONAL HELP'
   print 'gflex -v  *OR*  gflex --version       # DISPLAY VERSION NUMBER'
+  print 'gflex <<path_to_configuration_file>> --sweep Te=v1,v2,... --out w.npy'
+  print '                                      # PARAMETER SWEEP (SEE sweep.py)'
+  print 'gflex --operator-cache <<directory>> [--clear]'
+  print '                                      # LIST (OR CLEAR) CACHED OPERATORS'
   print 'import gflex                          # WITHIN PYTHON SHELL OR SCRIPT'
   print ""
   
@@ -61,6 +70,16 @@ def furtherHelp():
   print ""
 
 def main():
+  # Parameter sweep over a process pool
+  if '--sweep' in sys.argv:
+    from sweep import main as sweep_main
+    sweep_main(sys.argv[1:])
+    return
+  # On-disk operator cache
+  if '--operator-cache' in sys.argv:
+    from operator_cache import main as operator_cache_main
+    operator_cache_main(sys.argv[1:])
+    return
   # Choose how to instantiate
   if len(sys.argv) == 2:
     if sys.argv[1] == '--help' or sys.argv[1] == '-h':
@@ -114,9 +133,13 @@ def main():
   ##       SET MODEL PARAMETERS HERE        ##
   ## (if not defined in configuration file) ##
   ############################################
-  # obj.set_value('method','FD') # for example
+  # obj.set_value('lithosphere__elastic_thickness', Te) # for example
 
-  obj.run()
+  # Self-consistent infill, if there is topography to fill
+  if obj.configGetIfSet("string", "input", "Topography"):
+    obj.run_infill()
+  else:
+    obj.run()
   obj.finalize()
 
   obj.output() # Not part of IRF or BMI: Does standalone plotting and file output
@@ -125,7 +148,7 @@ def main():
   ## GET VALUES HERE ##
   ##   (if desired)  ##
   ##################### 
-  #wout = obj.get_value('Deflection') # for example
+  #wout = obj.get_value('lithosphere_surface__elevation_increment') # for example
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,150 @@
+"""
+On-disk cache of finite difference coefficient matrices, shared between
+runs in separate processes (e.g., a queue of command-line runs of the same
+plate with different loads).
+
+Each operator is stored as a compressed CSR .npz file, named by a hash of
+the inputs that define it (see Flexure.fd_operator_key). The key itself is
+stored in the file and checked on loading. Files are written under a
+temporary name and then renamed, so that concurrent runs never read a
+partial file. Loading a file marks it as used (its modification time);
+after each store, the least recently used files are removed until the
+cache fits within its size limit.
+
+The factorization is not stored: SciPy's SuperLU object cannot be rebuilt
+from its factors, and solving with them separately is slower than
+refactoring.
+
+From the command line:
+  gflex --operator-cache <directory>            # list cached operators
+  gflex --operator-cache <directory> --clear    # remove them
+"""
+
+import sys, os, glob, hashlib, tempfile, time
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Bumped if the layout of the stored files changes
+FORMAT = 1
+
+def entry_path(cache_dir, key):
+  """
+  Path of the cache file for an operator key
+  """
+  name = hashlib.sha1(repr((FORMAT,) + tuple(key))).hexdigest()
+  return os.path.join(cache_dir, name + '.npz')
+
+def load(cache_dir, key):
+  """
+  Returns the cached coefficient matrix for this key, or None if there is
+  none (or it cannot be read)
+  """
+  path = entry_path(cache_dir, key)
+  try:
+    stored = np.load(path)
+    try:
+      if str(stored['key']) != repr(tuple(key)):
+        return None
+      matrix = csr_matrix((stored['data'], stored['indices'], stored['indptr']),
+                          shape=tuple(stored['shape']))
+    finally:
+      stored.close()
+    os.utime(path, None) # Most recently used
+  except (IOError, OSError, KeyError, ValueError):
+    return None
+  return matrix
+
+def store(cache_dir, key, matrix, max_size):
+  """
+  Writes the coefficient matrix to the cache, then evicts the least recently
+  used entries so that the cache is no larger than max_size [bytes]
+  """
+  if not os.path.isdir(cache_dir):
+    os.makedirs(cache_dir)
+  matrix = matrix.tocsr()
+  handle, tmppath = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+  try:
+    with os.fdopen(handle, 'wb') as f:
+      np.savez_compressed(f, data=matrix.data, indices=matrix.indices,
+                          indptr=matrix.indptr, shape=np.array(matrix.shape),
+                          key=np.array(repr(tuple(key))))
+    os.rename(tmppath, entry_path(cache_dir, key))
+  except:
+    try:
+      os.remove(tmppath)
+    except OSError:
+      pass
+    raise
+  evict(cache_dir, max_size)
+
+def entries(cache_dir):
+  """
+  Returns (path, size [bytes], last used [s since epoch]) for each cached
+  operator, most recently used first
+  """
+  out = []
+  for path in glob.glob(os.path.join(cache_dir, '*.npz')):
+    try:
+      info = os.stat(path)
+    except OSError:
+      continue # Removed by another process
+    out.append((path, info.st_size, info.st_mtime))
+  return sorted(out, key=lambda entry: entry[2], reverse=True)
+
+def evict(cache_dir, max_size):
+  """
+  Removes the least recently used operators until the cache is no larger
+  than max_size [bytes]
+  """
+  total = 0
+  for path, size, used in entries(cache_dir):
+    total += size
+    if total > max_size:
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+def clear(cache_dir):
+  """
+  Removes every cached operator
+  """
+  for path, size, used in entries(cache_dir):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+def main(argv):
+  """
+  Command-line inspection of the operator cache:
+  gflex --operator-cache <directory> [--clear]
+  """
+  args = [arg for arg in argv if arg != '--operator-cache']
+  clear_cache = '--clear' in args
+  args = [arg for arg in args if arg != '--clear']
+  if len(args) != 1:
+    sys.exit("Usage: gflex --operator-cache <directory> [--clear]")
+  cache_dir = args[0]
+  if not os.path.isdir(cache_dir):
+    sys.exit("Error: no operator cache at "+cache_dir)
+  if clear_cache:
+    n = len(entries(cache_dir))
+    clear(cache_dir)
+    print "Removed", n, "cached operators from", cache_dir
+    return
+  total = 0
+  print "Size [MB]  Last used            Operator shape  Nonzeros  File"
+  for path, size, used in entries(cache_dir):
+    try:
+      stored = np.load(path)
+      shape = 'x'.join([str(n) for n in stored['shape']])
+      nnz = stored['indptr'][-1]
+      stored.close()
+    except (IOError, OSError, KeyError, ValueError):
+      shape, nnz = '?', '?'
+    print "%9.2f  %s  %14s  %8s  %s" % (size/2.**20,
+          time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(used)), shape, nnz,
+          os.path.basename(path))
+    total += size
+  print "Total: %.2f MB" % (total/2.**20)
@@ -0,0 +1,294 @@
+"""
+Parameter sweeps (ensembles) of gFlex runs, farmed out over a process pool.
+
+The base model is either a configuration file path or a dict of attributes
+to set on a F1D or F2D object (as for a run from a Python script; it must
+include 'dimension'). Each run of the sweep overrides some of these:
+Te, E, nu, g, rho_m, and/or rho_fill.
+
+Arrays (loads, Te grids, and any other array inputs) are placed in shared
+memory once, before the worker processes start, instead of being pickled
+for every run. Each worker writes its deflections straight into a single
+preallocated array of shape (n_runs,) + w.shape, which is held in shared
+memory or, if an output path is given, in an on-disk .npy memmap.
+
+From Python:
+  import gflex
+  w, runs = gflex.sweep('input_f2d', {'Te': [20000, 30000], 'rho_m': [3300, 3400]})
+
+From the command line:
+  gflex input_f2d --sweep Te=20000,30000 --sweep rho_m=3300,3400 --out w.npy
+"""
+
+from __future__ import division
+import sys, os, itertools, ctypes, ConfigParser
+import multiprocessing
+import numpy as np
+from base import Flexure
+from f1d import F1D
+from f2d import F2D
+
+# Parameters that can be swept, and the configuration-file entries that
+# define them
+config_entries = {
+  'Te': ('input', 'ElasticThickness'),
+  'E': ('parameter', 'YoungsModulus'),
+  'nu': ('parameter', 'PoissonsRatio'),
+  'g': ('parameter', 'GravAccel'),
+  'rho_m': ('parameter', 'MantleDensity'),
+  'rho_fill': ('parameter', 'InfillMaterialDensity'),
+}
+
+# Set in each worker by _init_worker
+_worker = {}
+
+def sweep_runs(grid):
+  """
+  Expands a parameter grid into a list of runs (dicts of parameter values).
+  grid is either:
+    * a dict or list of (name, values) pairs: every combination is run,
+      with the last name varying fastest (dict names are sorted), or
+    * a list of dicts: one run per dict.
+  """
+  if isinstance(grid, dict):
+    grid = sorted(grid.items())
+  grid = list(grid)
+  if len(grid) and isinstance(grid[0], dict):
+    runs = [dict(run) for run in grid]
+  else:
+    names = [name for name, values in grid]
+    runs = [dict(zip(names, combination)) for combination in
+            itertools.product(*[values for name, values in grid])]
+  for run in runs:
+    for name in run:
+      if name not in config_entries:
+        sys.exit("Error: cannot sweep over '"+name+"'; options are "+", ".join(sorted(config_entries)))
+  return runs
+
+def _share(array):
+  """
+  Copies an array into shared memory; returns (RawArray, shape)
+  """
+  array = np.asarray(array, dtype=float)
+  raw = multiprocessing.RawArray(ctypes.c_double, max(array.size, 1))
+  np.frombuffer(raw)[:array.size] = array.ravel()
+  return raw, array.shape
+
+def _view(shared):
+  """
+  Read-only array view of an array placed in shared memory by _share
+  """
+  raw, shape = shared
+  view = np.frombuffer(raw)[:int(np.prod(shape))].reshape(shape)
+  view.flags.writeable = False
+  return view
+
+def _init_worker(spec, shared, out):
+  _worker['spec'] = spec
+  _worker['arrays'] = dict((key, _view(value)) for key, value in shared.items())
+  if type(out) == str:
+    _worker['out'] = np.load(out, mmap_mode='r+')
+  elif out is not None:
+    _worker['out'] = _view(out)
+    _worker['out'].flags.writeable = True
+
+def _run_one(i):
+  """
+  Runs the model for run i of the sweep and returns its deflections
+  """
+  spec = _worker['spec']
+  arrays = _worker['arrays']
+  params = spec['runs'][i]
+  if spec['dimension'] == 1:
+    obj = F1D(spec['filename'])
+  else:
+    obj = F2D(spec['filename'])
+  if spec['filename']:
+    # Files named in the configuration file come from shared memory
+    obj.preloaded_files = dict((path, arrays[path]) for path in spec['files'])
+    obj.Quiet = True # Unless the configuration file says otherwise
+    obj.initialize(spec['filename'])
+    obj.Quiet = True
+    obj.Verbose = False
+    obj.Debug = False
+    for name in params:
+      section, option = config_entries[name]
+      key = ('run', i, name)
+      if key in arrays:
+        # Array-valued parameter: point the configuration file at it
+        obj.preloaded_files['<sweep '+str(i)+' '+name+'>'] = arrays[key]
+        obj.config.set(section, option, '<sweep '+str(i)+' '+name+'>')
+        setattr(obj, name, arrays[key])
+      else:
+        obj.config.set(section, option, repr(params[name]))
+        setattr(obj, name, params[name])
+  else:
+    obj.Quiet = True
+    for name, value in spec['attributes'].items():
+      setattr(obj, name, value)
+    for name in spec['array_attributes']:
+      setattr(obj, name, arrays[('base', name)])
+    for name in params:
+      if ('run', i, name) in arrays:
+        setattr(obj, name, arrays[('run', i, name)])
+      else:
+        setattr(obj, name, params[name])
+    obj.initialize()
+  obj.drho = obj.rho_m - obj.rho_fill
+  obj.run()
+  w = obj.w
+  obj.finalize()
+  return w
+
+def _run_into_output(i):
+  """
+  Pool task: runs i and writes the result into the output array.
+  SystemExit (how gFlex reports errors) would kill the worker and hang the
+  pool, so it is passed back as an ordinary exception.
+  """
+  try:
+    w = _run_one(i)
+  except SystemExit as e:
+    raise RuntimeError("Run "+str(i)+" of sweep failed: "+str(e))
+  _worker['out'][i] = w
+  if type(_worker['out']) == np.memmap:
+    _worker['out'].flush()
+
+def sweep(base, grid, out=None, processes=None):
+  """
+  w, runs = sweep(base, grid, out=None, processes=None)
+
+  base: configuration file path, or dict of model attributes (with
+        'dimension' and everything that is otherwise set before
+        initialize(), e.g., 'Method', 'qs', 'dx', 'BC_W', ...)
+  grid: parameter grid; see sweep_runs
+  out: None to collect the deflections in memory, or a path to a .npy file
+       that is written as an on-disk memmap
+  processes: number of worker processes; defaults to the number of CPUs.
+             1 runs everything in this process.
+
+  Returns the deflections, shaped (n_runs,) + w.shape, and the list of
+  parameter dicts for the runs, in the same order.
+  """
+  runs = sweep_runs(grid)
+  if len(runs) == 0:
+    sys.exit("Error: empty parameter sweep")
+  shared = {}
+  # Array values are replaced by placeholders in the runs sent to workers
+  spec = {'runs': [dict(run) for run in runs], 'files': []}
+  loader = Flexure()
+  loader.Verbose = False
+  loader.inpath = os.getcwd() + '/'
+  if type(base) == str:
+    # Load the files named in the configuration file once, here
+    spec['filename'] = base
+    config = ConfigParser.ConfigParser()
+    if not config.read(base):
+      sys.exit("Error: cannot read configuration file "+base)
+    spec['dimension'] = config.getint('mode', 'dimension')
+    loader.inpath = os.path.dirname(os.path.realpath(base)) + '/'
+    for section, option in [('input', 'Loads'), ('input', 'ElasticThickness')]:
+      try:
+        value = config.get(section, option)
+        float(value)
+      except ValueError:
+        array = loader.loadFile(value, close_on_fail=False)
+        if array is not None:
+          shared[value] = _share(array)
+          spec['files'].append(value)
+      except ConfigParser.Error:
+        pass
+  else:
+    spec['filename'] = None
+    try:
+      spec['dimension'] = base['dimension']
+    except KeyError:
+      sys.exit("Error: base attributes for a sweep must include 'dimension'")
+    spec['attributes'] = {}
+    spec['array_attributes'] = []
+    for name, value in base.items():
+      if isinstance(value, np.ndarray):
+        shared[('base', name)] = _share(value)
+        spec['array_attributes'].append(name)
+      else:
+        spec['attributes'][name] = value
+  for i, run in enumerate(spec['runs']):
+    for name, value in run.items():
+      if type(value) == str:
+        # Te grid given as a file path
+        value = loader.loadFile(value)
+      if np.ndim(value) > 0:
+        shared[('run', i, name)] = _share(value)
+        run[name] = None
+
+  # First run here, to find the output shape and catch input errors early
+  _init_worker(spec, shared, None)
+  w0 = _run_one(0)
+  if out is None:
+    output = _share(np.zeros((len(runs),) + w0.shape))
+  else:
+    np.lib.format.open_memmap(out, mode='w+', dtype=float, shape=(len(runs),) + w0.shape).flush()
+    output = out
+  _init_worker(spec, shared, output)
+  _worker['out'][0] = w0
+
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  processes = min(processes, len(runs) - 1)
+  if processes > 1:
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(spec, shared, output))
+    try:
+      pool.map(_run_into_output, range(1, len(runs)))
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    for i in range(1, len(runs)):
+      _run_into_output(i)
+
+  w = _worker['out']
+  if type(w) == np.memmap:
+    w.flush()
+  _worker.clear()
+  return w, runs
+
+def main(argv):
+  """
+  Command-line sweep:
+  gflex <configuration file> --sweep name=v1,v2,... [--sweep ...]
+        --out <output.npy> [--processes N]
+  Values are numbers or, for Te, paths to Te grids. Runs are printed with
+  their index into the first axis of the output array.
+  """
+  filename = None
+  grid = []
+  out = None
+  processes = None
+  args = list(argv)
+  while args:
+    arg = args.pop(0)
+    if arg == '--sweep':
+      name, values = args.pop(0).split('=')
+      parsed = []
+      for value in values.split(','):
+        try:
+          parsed.append(float(value))
+        except ValueError:
+          parsed.append(value)
+      grid.append((name, parsed))
+    elif arg == '--out':
+      out = args.pop(0)
+    elif arg == '--processes':
+      processes = int(args.pop(0))
+    elif filename is None:
+      filename = arg
+    else:
+      sys.exit("Error: unexpected argument "+arg)
+  if filename is None or out is None or len(grid) == 0:
+    sys.exit("Usage: gflex <configuration file> --sweep name=v1,v2,... [--sweep ...] --out <output.npy> [--processes N]")
+  w, runs = sweep(filename, grid, out, processes)
+  names = [name for name, values in grid]
+  print "run", " ".join(names)
+  for i, run in enumerate(runs):
+    print i, " ".join([str(run[name]) for name in names])
+  print "Deflections written to", out, "with shape", w.shape
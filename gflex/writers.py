@@ -0,0 +1,170 @@
+"""
+Output file writers for deflections and other model fields.
+
+Each writer is called as writer(path, fields, dims, coords, attrs), where:
+  fields: OrderedDict of field name --> array (all of the same shape), with
+          the deflections ('w') first
+  dims: names of the dimensions of the fields, e.g., ('y', 'x'), ('x',),
+        or ('point',) for ungridded (SAS_NG) output
+  coords: OrderedDict of coordinate name --> (dimension names, array)
+  attrs: dict of scalar or string model parameters
+
+Writers are chosen by format name; the format comes from the
+DeflectionOutFormat setting or, if that is blank, from the file extension
+(see extensions). Other writers can be added to "writers".
+
+Formats:
+  ascii:  space-delimited text grid of the deflections, written in chunks of
+          rows so that the formatted text is never all held in memory
+  npy:    numpy binary array of the deflections
+  npz:    compressed numpy archive of all fields and coordinates
+  netcdf: NetCDF-3 (64-bit offset) file of all fields, with coordinate
+          variables and the model parameters as global attributes
+  raw:    little-endian float64 binary of all fields and coordinates, one
+          after the other, following a one-line JSON header that gives their
+          names, shapes, and byte offsets (see read_raw)
+"""
+
+from __future__ import division
+import sys, os, json
+from collections import OrderedDict
+import numpy as np
+
+# Units for the netcdf "units" attribute
+units = {'w': 'm', 'qs': 'Pa', 'Te': 'm', 'D': 'N m', 'x': 'm', 'y': 'm'}
+
+# Number of values formatted at a time by the ASCII writer
+ascii_chunk_values = 2**16
+
+def _single_field(fields, name):
+  if len(fields) > 1:
+    sys.exit("Error: "+name+" output holds only the deflections;\n"+
+             "use the npz, netcdf, or raw format to write "+", ".join(fields.keys()))
+  return fields.values()[0]
+
+def write_ascii(path, fields, dims, coords, attrs):
+  values = np.asarray(_single_field(fields, 'ASCII'), dtype=float)
+  # Same layout and formatting as numpy.savetxt(path, w, fmt='%.3f'):
+  # one line per row, or per value for 1D arrays.
+  # Shouldn't need more than mm precision, at very most
+  if values.ndim < 2:
+    values = values.reshape(-1, 1)
+  row = ' '.join(['%.3f'] * values.shape[1]) + '\n'
+  nrows = max(ascii_chunk_values // values.shape[1], 1)
+  with open(path, 'w') as f:
+    for i in range(0, values.shape[0], nrows):
+      chunk = values[i:i+nrows]
+      f.write((row * chunk.shape[0]) % tuple(chunk.ravel().tolist()))
+
+def write_npy(path, fields, dims, coords, attrs):
+  w = _single_field(fields, 'npy')
+  with open(path, 'wb') as f:
+    np.save(f, w)
+
+def write_npz(path, fields, dims, coords, attrs):
+  arrays = OrderedDict(fields)
+  for name, (coord_dims, values) in coords.items():
+    arrays[name] = values
+  with open(path, 'wb') as f:
+    np.savez_compressed(f, **arrays)
+
+def write_netcdf(path, fields, dims, coords, attrs):
+  from scipy.io import netcdf
+  shape = fields.values()[0].shape
+  nc = netcdf.netcdf_file(path, 'w', version=2)
+  try:
+    for dim, length in zip(dims, shape):
+      nc.createDimension(dim, length)
+    for name, (coord_dims, values) in coords.items():
+      var = nc.createVariable(name, 'd', coord_dims)
+      var[:] = values
+      if name in units:
+        var.units = units[name]
+    for name, values in fields.items():
+      var = nc.createVariable(name, 'd', dims)
+      var[:] = values
+      if name in units:
+        var.units = units[name]
+    for key, value in attrs.items():
+      setattr(nc, key, value)
+  finally:
+    nc.close()
+
+def write_raw(path, fields, dims, coords, attrs):
+  arrays = [(name, np.ascontiguousarray(values, dtype='<f8')) for name, values in fields.items()]
+  arrays += [(name, np.ascontiguousarray(values, dtype='<f8')) for name, (coord_dims, values) in coords.items()]
+  header = OrderedDict([('format', 'gflex raw'), ('version', 1), ('dtype', '<f8'),
+                        ('order', 'C'), ('dims', list(dims)),
+                        ('fields', list(fields.keys())), ('arrays', []),
+                        ('attributes', attrs)])
+  offset = 0
+  for name, values in arrays:
+    header['arrays'].append(OrderedDict([('name', name), ('shape', list(values.shape)), ('offset', offset)]))
+    offset += values.nbytes
+  text = json.dumps(header)
+  # Padded so that the data start on a 64-byte boundary
+  text += ' ' * (-(len(text) + 1) % 64) + '\n'
+  with open(path, 'wb') as f:
+    f.write(text)
+    for name, values in arrays:
+      values.tofile(f)
+
+def read_raw(path, mmap=True):
+  """
+  arrays, header = read_raw(path)
+  Reads a file written by write_raw into an OrderedDict of arrays (memory-
+  mapped, unless mmap is False); the header also holds the model parameters
+  ('attributes')
+  """
+  with open(path, 'rb') as f:
+    line = f.readline()
+    header = json.loads(line, object_pairs_hook=OrderedDict)
+    arrays = OrderedDict()
+    for entry in header['arrays']:
+      shape = tuple(entry['shape'])
+      if mmap:
+        arrays[entry['name']] = np.memmap(path, dtype=header['dtype'], mode='r',
+                                          offset=len(line) + entry['offset'], shape=shape)
+      else:
+        f.seek(len(line) + entry['offset'])
+        arrays[entry['name']] = np.fromfile(f, dtype=header['dtype'],
+                                            count=int(np.prod(shape))).reshape(shape)
+  return arrays, header
+
+writers = {
+  'ascii': write_ascii,
+  'npy': write_npy,
+  'npz': write_npz,
+  'netcdf': write_netcdf,
+  'raw': write_raw,
+}
+
+# Formats by file extension; anything else is written as ASCII
+extensions = {
+  '.npy': 'npy',
+  '.npz': 'npz',
+  '.nc': 'netcdf',
+  '.raw': 'raw',
+  '.bin': 'raw',
+}
+
+def output_format(path, fmt=None):
+  """
+  Returns the output format: fmt if it is given, otherwise the one for the
+  file extension
+  """
+  if fmt:
+    fmt = fmt.lower()
+  else:
+    fmt = extensions.get(os.path.splitext(path)[1].lower(), 'ascii')
+  if fmt not in writers:
+    sys.exit("Error: output format must be one of: "+", ".join(sorted(writers)))
+  return fmt
+
+def write(path, fields, dims, coords, attrs, fmt=None):
+  """
+  Writes the fields to path in the chosen format (see output_format)
+  """
+  fmt = output_format(path, fmt)
+  writers[fmt](path, fields, dims, coords, attrs)
+  return fmt